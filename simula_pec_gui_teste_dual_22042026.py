@@ -1,24 +1,55 @@
+import time
+_INICIO = time.perf_counter()
+
+import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import colorsys
-from scipy.stats import chi2
-import pandas as pd
-import time
 import threading
 from typing import List, Dict
-from numba import jit, prange
-from multiprocessing import Pool, cpu_count
-import os
-import plotly.graph_objects as go
-from plotly.offline import plot as plotly_plot
-from plotly.subplots import make_subplots
 
-
-os.environ['NUMBA_NUM_THREADS'] = str(cpu_count())
-rng = np.random.default_rng(seed=42)
+from simulapec_instrumentacao import medido
+
+# Matplotlib, Plotly e o motor (SciPy, Numba) são importados sob demanda:
+# a janela de idioma abre sem esperar por eles e o aquecimento em segundo
+# plano os carrega enquanto o usuário escolhe.
+MEDIR_INICIO = '--tempo-inicio' in sys.argv or bool(os.environ.get('SIMULAPEC_TEMPO_INICIO'))
+TEMPOS_INICIO = {}
+_aquecimento = None
+
+
+def marcar_inicio(etapa):
+    if etapa in TEMPOS_INICIO:
+        return
+    TEMPOS_INICIO[etapa] = time.perf_counter() - _INICIO
+    if MEDIR_INICIO:
+        print(f"[inicio] {etapa}: {TEMPOS_INICIO[etapa]:.3f} s", file=sys.stderr)
+
+def _aquecer():
+    from simulapec_custo import aquecer_kernels, modelo_padrao
+    marcar_inicio('motor_importado')
+    aquecer_kernels()
+    modelo_padrao().carregar()
+    marcar_inicio('kernels_prontos')
+    import plotly.graph_objects
+    import plotly.subplots
+    marcar_inicio('plotly_importado')
+
+def iniciar_aquecimento():
+    global _aquecimento
+    if _aquecimento is None:
+        _aquecimento = threading.Thread(target=_aquecer, daemon=True)
+        _aquecimento.start()
+    return _aquecimento
+
+def aguardar_aquecimento():
+    # Os kernels paralelos do Numba não podem ser lançados por duas threads
+    # ao mesmo tempo.
+    if _aquecimento is not None:
+        _aquecimento.join()
+
+marcar_inicio('modulo_importado')
 
 TRANSLATIONS = {
     'pt': {
@@ -28,9 +59,15 @@ TRANSLATIONS = {
         'intervalo_acima_label': 'Intervalo acima (%)',
         'intervalo_abaixo_label': 'Intervalo abaixo (%)',
         'num_iteracoes_label': 'Nº de iterações',
+        'tolerancia_label': 'Tolerância do IC (± %)',
+        'numeros_comuns_label': 'Mesmos sorteios em todos os níveis',
+        'grade_label': 'Tamanhos de amostra',
+        'grade_opcoes': ['De 5 em 5 até 60% dos PCs', 'Escala logarítmica',
+                         'Logarítmica com refinamento'],
         
         'progresso_label': 'Progresso:',
         'progresso_total_label': 'Progresso total:',
+        'restante_label': 'restante',
         
         'btn_carregar_dados': 'Carregar Dados Reais',
         'btn_confirmar': 'Confirmar',
@@ -63,6 +100,8 @@ TRANSLATIONS = {
         'xlabel_amostra': 'Tamanho da Amostra',
         'ylabel_prm': 'PRM (%)',
         'legenda_dados_reais': 'R (Dados Reais)',
+        'legenda_ic': 'IC',
+        'iteracoes': 'Iterações',
         'tempo_total': 'Tempo total: ',
         
         'sheet_title': 'Resultado SimulaPEC',
@@ -81,9 +120,15 @@ TRANSLATIONS = {
         'intervalo_acima_label': 'Interval above (%)',
         'intervalo_abaixo_label': 'Interval below (%)',
         'num_iteracoes_label': 'Nº of iterations',
+        'tolerancia_label': 'CI tolerance (± %)',
+        'numeros_comuns_label': 'Same draws for every level',
+        'grade_label': 'Sample sizes',
+        'grade_opcoes': ['Every 5 up to 60% of PCs', 'Logarithmic scale',
+                         'Logarithmic with refinement'],
         
         'progresso_label': 'Progress:',
         'progresso_total_label': 'Total progress:',
+        'restante_label': 'remaining',
         
         'btn_carregar_dados': 'Load Real Data',
         'btn_confirmar': 'Confirm',
@@ -116,6 +161,8 @@ TRANSLATIONS = {
         'xlabel_amostra': 'Sample Size',
         'ylabel_prm': 'PRM (%)',
         'legenda_dados_reais': 'R (Real Data)',
+        'legenda_ic': 'CI',
+        'iteracoes': 'Iterations',
         'tempo_total': 'Total time: ',
         
         'sheet_title': 'Results SimulaPEC',
@@ -130,219 +177,6 @@ TRANSLATIONS = {
 }
 
 
-@jit(nopython=True, cache=True)
-def gerar_tabela_base(n_pontos, erro_maximo, percentual_acima):
-    np.random.seed(0)
-    erros = np.zeros(n_pontos, dtype=np.float64)
-    
-    for i in range(n_pontos):
-        u1 = np.random.random()
-        u2 = np.random.random()
-        erros[i] = np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
-    
-    erros_abs = np.abs(erros)
-    erros_ordenados = np.sort(erros_abs)[::-1]
-    
-    index_limite = int(n_pontos * percentual_acima / 100)
-    valor_limite = erros_ordenados[index_limite - 1]
-    k = erro_maximo / valor_limite
-    
-    return erros * k
-
-@jit(nopython=True, parallel=True, cache=True)
-def _simular_batch_numba(base, n, n_iter, erro_padrao_precisao,
-                         erro_admissivel, percentual_limite, qui_tabela,
-                         indices_pool=None):
-    rejeicoes_p = 0
-    rejeicoes_n = 0
-    n_base = len(base)
-    
-    use_pool = indices_pool is not None
-    
-    for i in prange(n_iter):
-        amostra = np.empty(n, dtype=np.float64)
-        
-        if use_pool and len(indices_pool) >= n:
-            for j in range(n):
-                amostra[j] = base[indices_pool[j]]
-        else:
-            for j in range(n):
-                idx = np.random.randint(0, n_base)
-                amostra[j] = base[idx]
-        
-        media = np.sum(amostra) / n
-        desvio_sq = np.sum((amostra - media) ** 2) / (n - 1)
-        
-        qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
-        if qui_calc > qui_tabela:
-            rejeicoes_p += 1
-        
-        acima = np.sum(np.abs(amostra) > erro_admissivel)
-        porcentagem_acima = (acima / n) * 100
-        if porcentagem_acima > percentual_limite:
-            rejeicoes_n += 1
-    
-    return rejeicoes_p, rejeicoes_n
-
-
-def simular_percentual_rejeicao_escalar(
-    base, tamanhos, n_iter, erro_admissivel, percentual_limite,
-    progress_callback=None, tempo_estimado=False, batch_size=100, indices_pool=None):
-    
-    resultado_precisao = []
-    resultado_norma = []
-    
-    start = time.time()
-    erro_padrao_precisao = erro_admissivel / 1.6449
-    
-    qui_tabelas = {n: chi2.ppf(1 - (percentual_limite / 100), df=n - 1) 
-                   for n in tamanhos}
-    
-    if tempo_estimado:
-        n = tamanhos[0]
-        qui_tabela = qui_tabelas[n]
-        tempo_estimado_val = _simular_batch_numba(
-            base, n, batch_size, erro_padrao_precisao,
-            erro_admissivel, percentual_limite, qui_tabela, indices_pool)
-        tempo_batch = time.time() - start
-        tempo_total_estimado = tempo_batch * (n_iter / batch_size) * len(tamanhos)
-        return tempo_total_estimado
-    
-    for idx, n in enumerate(tamanhos):
-        if progress_callback:
-            progress_callback(idx + 1, len(tamanhos))
-        
-        qui_tabela = qui_tabelas[n]
-        
-        num_batches = (n_iter + batch_size - 1) // batch_size
-        rejeicoes_p_total = 0
-        rejeicoes_n_total = 0
-        
-        for batch_idx in range(num_batches):
-            current_batch = min(batch_size, n_iter - (batch_idx * batch_size))
-            
-            rejeicoes_p, rejeicoes_n = _simular_batch_numba(
-                base, n, current_batch, erro_padrao_precisao,
-                erro_admissivel, percentual_limite, qui_tabela, indices_pool)
-            
-            rejeicoes_p_total += rejeicoes_p
-            rejeicoes_n_total += rejeicoes_n
-        
-        resultado_precisao.append((rejeicoes_p_total / n_iter) * 100)
-        resultado_norma.append((rejeicoes_n_total / n_iter) * 100)
-    
-    return resultado_precisao, resultado_norma
-
-def _salvar_planilha_csv(
-    caminho_arquivo: str,
-    percentuais: list[float],
-    amostras: list[int],
-    prm_precisao_list: List[Dict[int, float]],
-    prm_norma_list: List[Dict[int, float]],
-    dados_reais: bool = False,
-    prm_precisao_real: dict[int, float] | None = None,
-    prm_norma_real: dict[int, float] | None = None,
-    lang: str = 'pt'
-) -> None:
-    
-    if lang == 'en':
-        header_sample = "Sample Size"
-        header_precision = "PRM(%) - Accuracy"
-        header_standard = "PRM(%) - Country's Standard"
-        header_real_section = "R-10"
-    else:
-        header_sample = "Tamanho da amostra"
-        header_precision = "PRM(%) - Precisão"
-        header_standard = "PRM(%) - Norma"
-        header_real_section = "R-10"
-    
-    with open(caminho_arquivo, 'w', encoding='utf-8', newline='') as f:
-        for p in percentuais:
-            f.write(f"\n=== {p}% ===\n")
-            f.write(f"{header_sample},{header_precision},{header_standard}\n")
-        
-        for n in amostras:
-            row_values = [str(n)]
-            for i, _perc in enumerate(percentuais):
-                dic_prec = prm_precisao_list[i]
-                dic_norm = prm_norma_list[i]
-                row_values.append(f"{dic_prec.get(n, 0.0):.2f}")
-                row_values.append(f"{dic_norm.get(n, 0.0):.2f}")
-            f.write(",".join(row_values) + "\n")
-        
-        if dados_reais and prm_precisao_real is not None and prm_norma_real is not None:
-            f.write(f"\n=== {header_real_section} ===\n")
-            f.write(f"{header_sample},{header_precision},{header_standard}\n")
-            for n in amostras:
-                prec_val = prm_precisao_real.get(n, 0.0)
-                norm_val = prm_norma_real.get(n, 0.0)
-                f.write(f"{n},{prec_val:.2f},{norm_val:.2f}\n")
-
-def _calcular_estimativa_tempo(base, tamanhos_amostra, n_iter, erro_admissivel, 
-                               perc_base, batch_size, indices_pool):
-    if not tamanhos_amostra:
-        return 0
-    
-    pontos_teste = []
-    if len(tamanhos_amostra) >= 2:
-        pontos_teste = [tamanhos_amostra[0], tamanhos_amostra[len(tamanhos_amostra)//2]]
-    else:
-        pontos_teste = [tamanhos_amostra[0]]
-    
-    iter_estimativa = 10    
-    tempos_medidos = []
-    
-    for n_teste in pontos_teste:
-        qui_tabela = chi2.ppf(1 - (perc_base / 100), df=n_teste - 1)
-        start = time.time()
-        rejeicoes_p, rejeicoes_n = _simular_batch_numba(
-            base, n_teste, iter_estimativa, 
-            erro_admissivel / 1.6449, 
-            erro_admissivel, perc_base, qui_tabela, indices_pool)
-        tempo_gasto = time.time() - start
-        
-        tempos_medidos.append((n_teste, tempo_gasto / iter_estimativa))
-    
-    if len(tempos_medidos) < 2:
-        n_ref, t_ref = tempos_medidos[0]
-        fator_crescimento = (tamanhos_amostra[-1] / n_ref)
-        tempo_medio_por_iter = t_ref * fator_crescimento
-    else:
-        n1, t1 = tempos_medidos[0]
-        n2, t2 = tempos_medidos[1]
-        
-        if n2 == n1:
-            a = 0
-            b = t1
-        else:
-            a = (t2 - t1) / (n2 - n1)
-            b = t1 - a * n1
-        
-        n_medio = sum(tamanhos_amostra) / len(tamanhos_amostra)
-        tempo_medio_por_iter = max(a * n_medio + b, 0.001)
-
-    total_itens = len(tamanhos_amostra)
-    tempo_ciclo = tempo_medio_por_iter * n_iter * total_itens
-    
-    return tempo_ciclo
-
-def _formatar_tempo(segundos):
-    if segundos < 60:
-        return f"{segundos:.2f} s"
-    
-    horas = int(segundos // 3600)
-    minutos = int((segundos % 3600) // 60)
-    seg_rest = segundos % 60
-    
-    partes = []
-    if horas > 0:
-        partes.append(f"{horas}h")
-    if minutos > 0:
-        partes.append(f"{minutos}m")
-    partes.append(f"{seg_rest:.2f}s")
-    
-    return " ".join(partes)
-
 DEFAULT_LINEWIDTH = 2.5
 def _line_width():
     return DEFAULT_LINEWIDTH
@@ -372,16 +206,25 @@ class SimulaPECApp:
         self.amostras = []
         self.prm_precisao = {}
         self.prm_norma = {}
-        self.dados_reais = False
         self.prm_precisao_real = {}
         self.prm_norma_real = {}
         self.prm_precisao_real: Dict[int, float] = {}
         self.prm_norma_real: Dict[int, float] = {}
         self.prm_precisao_list: List[Dict[int, float]] = []
         self.prm_norma_list: List[Dict[int, float]] = []
+        self.resultado = None
+        self.estimativa = None
 
         self._cancel_requested = False
         self._thread_worker = None
+        from simulapec_cache import CacheResultados, CheckpointSimulacao
+        try:
+            self.cache = CacheResultados()
+        except OSError:
+            self.cache = None
+        # Uma simulação cancelada ou interrompida é retomada na próxima
+        # execução com os mesmos parâmetros.
+        self.checkpoint = CheckpointSimulacao()
 
         campos = [
             (self.t['num_pcs_label'], "150"),
@@ -389,7 +232,8 @@ class SimulaPECApp:
             (self.t['perc_pcs_pec_label'], "10"),
             (self.t['intervalo_acima_label'], "5"),
             (self.t['intervalo_abaixo_label'], "2"),
-            (self.t['num_iteracoes_label'], "3000")]
+            (self.t['num_iteracoes_label'], "3000"),
+            (self.t['tolerancia_label'], "")]
 
         for i, (label, default) in enumerate(campos):
             tk.Label(master, text=label).grid(row=i+2, column=0, sticky="e")
@@ -398,34 +242,48 @@ class SimulaPECApp:
             entry.grid(row=i+2, column=1)
             self.entries[label] = entry
 
+        # Números aleatórios comuns: curvas vizinhas diferem só pelo nível,
+        # não pelo ruído de Monte Carlo.
+        self.numeros_comuns = tk.BooleanVar(master, value=False)
+        tk.Checkbutton(master, text=self.t['numeros_comuns_label'],
+                       variable=self.numeros_comuns).grid(row=9, column=0, columnspan=2)
+
+        # Grade de tamanhos de amostra: a linear cresce com N; a logarítmica
+        # tem um número fixo de pontos, e o refinamento acrescenta tamanhos
+        # onde as curvas mudam rápido.
+        tk.Label(master, text=self.t['grade_label']).grid(row=10, column=0, sticky="e")
+        self.grade = ttk.Combobox(master, values=self.t['grade_opcoes'], state='readonly')
+        self.grade.current(0)
+        self.grade.grid(row=10, column=1)
+
         self.label_progresso = tk.Label(master, text=f"{self.t['progresso_label']} 0%")
-        self.label_progresso.grid(row=9, column=0, columnspan=2)
+        self.label_progresso.grid(row=11, column=0, columnspan=2)
 
         self.progress = ttk.Progressbar(master, length=200, mode='determinate')
-        self.progress.grid(row=10, column=0, columnspan=2, pady=5)
+        self.progress.grid(row=12, column=0, columnspan=2, pady=5)
 
         self.label_total = tk.Label(master, text=f"{self.t['progresso_total_label']} 0%")
-        self.label_total.grid(row=11, column=0, columnspan=2)
+        self.label_total.grid(row=13, column=0, columnspan=2)
 
         self.progress_total = ttk.Progressbar(master, length=200,
                                               mode='determinate')
-        self.progress_total.grid(row=12, column=0, columnspan=2, pady=5)
+        self.progress_total.grid(row=14, column=0, columnspan=2, pady=5)
 
         tk.Button(master, text=self.t['btn_carregar_dados'],
-                  command=self.carregar_dados_reais).grid(row=13, column=0)
+                  command=self.carregar_dados_reais).grid(row=15, column=0)
         tk.Button(master, text=self.t['btn_confirmar'],
-                  command=self.executar).grid(row=13, column=1)
+                  command=self.executar).grid(row=15, column=1)
         tk.Button(master, text=self.t['btn_salvar_planilha'],
-                  command=self.exportar_planilha).grid(row=14, column=0)
+                  command=self.exportar_planilha).grid(row=16, column=0)
         tk.Button(master, text=self.t['btn_salvar_grafico'],
-                  command=self.exportar_grafico).grid(row=14, column=1)
+                  command=self.exportar_grafico).grid(row=16, column=1)
         
         tk.Button(master, text=self.t['btn_salvar_grafico_dinamico'],
-                  command=self.exportar_grafico_html).grid(row=15, column=0, columnspan=2, pady=5)
+                  command=self.exportar_grafico_html).grid(row=17, column=0, columnspan=2, pady=5)
 
         self.btn_cancelar = tk.Button(master, text=self.t['btn_cancelar'],
                                       command=self.cancelar, state="disabled")
-        self.btn_cancelar.grid(row=16, column=0, columnspan=2, pady=5)
+        self.btn_cancelar.grid(row=18, column=0, columnspan=2, pady=5)
 
     def disable_ui_during_run(self):
         self.progress_total['value'] = 0
@@ -450,16 +308,42 @@ class SimulaPECApp:
         self._cancel_requested = True
         self.btn_cancelar.configure(state="disabled")
 
+    def _texto_restante(self):
+        from simulapec_engine import _formatar_tempo
+        if self.estimativa is None:
+            return ""
+        taxa = f", {self.estimativa.taxa():,.0f} it/s" if self.estimativa.iteracoes_total else ""
+        return f" ({self.t['restante_label']}: {_formatar_tempo(self.estimativa.restante())}{taxa})"
+
+    @medido('gui')
     def atualizar_progresso(self, valor, total):
         pct = int((valor / total) * 100)
+        if self.estimativa is not None:
+            self.estimativa.tamanho(valor, total)
         self.progress['value'] = pct
         self.label_progresso.config(text=f"{self.t['progresso_label']} {pct}%")
+        self.label_total.config(
+            text=f"{self.t['progresso_total_label']} {int(self.progress_total['value'])}%"
+                 f"{self._texto_restante()}")
         self.master.update_idletasks()
 
+    @medido('gui')
     def atualizar_progresso_total(self, concluido, total):
         pct = int((concluido / total) * 100)
+        if self.estimativa is not None:
+            self.estimativa.curva(concluido, total)
         self.progress_total['value'] = pct
-        self.label_total.config(text=f"{self.t['progresso_total_label']} {pct}%")
+        self.label_total.config(
+            text=f"{self.t['progresso_total_label']} {pct}%{self._texto_restante()}")
+        self.master.update_idletasks()
+
+    @medido('gui')
+    def atualizar_iteracoes(self, feitas, total):
+        if self.estimativa is not None:
+            self.estimativa.iteracoes(feitas, total)
+        self.label_total.config(
+            text=f"{self.t['progresso_total_label']} {int(self.progress_total['value'])}%"
+                 f"{self._texto_restante()}")
         self.master.update_idletasks()
 
     def _gerar_cores_personalizadas(self, percentuais, perc_base):
@@ -488,15 +372,12 @@ class SimulaPECApp:
         return cores
 
     def carregar_dados_reais(self):
-        caminho = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
+        caminho = filedialog.askopenfilename(filetypes=[
+            ("Text files", "*.txt *.csv *.tsv"), ("NumPy", "*.npy")])
         if caminho:
+            from simulapec_engine import carregar_dados_reais_txt
             try:
-                with open(caminho, "r") as f:
-                    linhas = f.readlines()
-                    self.dados_reais = [
-                        float(l.strip().replace(",", "."))
-                        for l in linhas if l.strip()
-                    ]
+                self.dados_reais = carregar_dados_reais_txt(caminho)
                 messagebox.showinfo(self.t['msg_sucesso'],
                                     f"{len(self.dados_reais)} {self.t['msg_erros_carregados']}")
             except Exception as e:
@@ -513,6 +394,7 @@ class SimulaPECApp:
         self._continue_resp = None
 
         def _callback():
+            from simulapec_engine import _formatar_tempo
             msg_tempo = tempo_formatado if isinstance(tempo_formatado, str) else _formatar_tempo(tempo_formatado)
             resp = messagebox.askyesno(
                 self.t['msg_tempo_estimado'],
@@ -535,118 +417,127 @@ class SimulaPECApp:
         self.master.after(0, _restore)
 
     def _processar_simulacao(self):
+        aguardar_aquecimento()
+        from simulapec_custo import EstimativaAoVivo, modelo_padrao
+        from simulapec_engine import (
+            SimulacaoCancelada,
+            _formatar_tempo,
+            curvas_para_dicionarios,
+            estimar_tempo,
+            executar_simulacao,
+            normalizar_cenario,
+            planejar_simulacao,
+        )
         try:
-            N = int(self.entries[self.t['num_pcs_label']].get())
-            erro_admissivel = float(self.entries[self.t['erro_pec_label']].get())
-            self.erro_admissivel = erro_admissivel
-            perc_base = float(self.entries[self.t['perc_pcs_pec_label']].get())
-            self.perc_base = perc_base
-            intervalo_acima = float(self.entries[self.t['intervalo_acima_label']].get())
-            intervalo_abaixo = float(self.entries[self.t['intervalo_abaixo_label']].get())
-            n_iter = int(self.entries[self.t['num_iteracoes_label']].get())
-
-            if N <= 0 or erro_admissivel <= 0 or perc_base <= 0 or \
-                intervalo_acima <= 0 or intervalo_abaixo <= 0 or n_iter <= 0:
-                raise ValueError()
-
-            self.tamanhos_amostra = list(range(5, int(N * 0.6) + 1, 5))
-            self.percentuais = []
-
-            perc = perc_base - intervalo_abaixo
-            while perc > 0:
-                self.percentuais.append(perc)
-                perc -= intervalo_abaixo
-            self.percentuais.append(perc_base)
-            perc = perc_base + intervalo_acima
-            while perc <= 40:
-                self.percentuais.append(perc)
-                perc += intervalo_acima
-            self.percentuais.sort()
-
-            max_tamanho = max(self.tamanhos_amostra)
-            indices_pool = None
-
-            if N > 100000:
-                indices_pool = rng.choice(N, size=max_tamanho, replace=False)
-            else:
-                indices_pool = None
-            
-            base_teste = gerar_tabela_base(N, erro_admissivel, perc_base)
-            if N > 200000:
-                batch_size = 50
-            elif N > 100000:
-                batch_size = 100
-            else:
-                batch_size = 200
-            
-            tempo_ciclo_estimado = _calcular_estimativa_tempo(
-                base_teste, self.tamanhos_amostra,
-                n_iter, erro_admissivel,
-                perc_base, batch_size, indices_pool)
-            tempo_total_segundos = tempo_ciclo_estimado
+            cenario = normalizar_cenario({
+                'N': self.entries[self.t['num_pcs_label']].get(),
+                'erro_admissivel': self.entries[self.t['erro_pec_label']].get(),
+                'perc_base': self.entries[self.t['perc_pcs_pec_label']].get(),
+                'intervalo_acima': self.entries[self.t['intervalo_acima_label']].get(),
+                'intervalo_abaixo': self.entries[self.t['intervalo_abaixo_label']].get(),
+                'n_iter': self.entries[self.t['num_iteracoes_label']].get(),
+                'tolerancia': self.entries[self.t['tolerancia_label']].get().strip(),
+                'numeros_comuns': self.numeros_comuns.get(),
+                'grade': [None, {'tipo': 'log'},
+                          {'tipo': 'log', 'refinar': True}][self.grade.current()],
+                'engine': 'batch',
+            })
+            self.erro_admissivel = cenario['erro_admissivel']
+            self.perc_base = cenario['perc_base']
+
+            plano = planejar_simulacao(cenario)
+            self.tamanhos_amostra = plano['tamanhos_amostra']
+            self.percentuais = plano['percentuais']
+
+            curvas_reais = int(self.dados_reais is not None)
+            modelo = modelo_padrao()
+            tempo_total_segundos = estimar_tempo(cenario, plano, curvas_reais)
             tempo_formatado = _formatar_tempo(tempo_total_segundos)
 
             if not self._ask_continue(tempo_formatado):
                 self._finalizar_thread(cancelado=True)
                 return
             
-            self.inicio_processamento = time.time()
             self.curvas_precisao.clear()
             self.curvas_norma.clear()
             self.prm_precisao_list.clear()
             self.prm_norma_list.clear()
             self.prm_precisao_real.clear()
             self.prm_norma_real.clear()
-
-            for idx, perc in enumerate(self.percentuais):
-                if self._cancel_requested:
-                    self._finalizar_thread(cancelado=True)
-                    return
-                
-                base = gerar_tabela_base(N, erro_admissivel, perc)
-                if N > 100000:
-                    base = base.astype(np.float32)
-                pr_p, pr_n = simular_percentual_rejeicao_escalar(
-                    base, self.tamanhos_amostra, n_iter,
-                    erro_admissivel, perc,
-                    progress_callback=self.atualizar_progresso,
-                    batch_size=batch_size,
-                    indices_pool=indices_pool)
-                self.curvas_precisao.append(pr_p)
-                self.curvas_norma.append(pr_n)
-
-                dic_prec = {n: round(v, 2) for n, v in zip(self.tamanhos_amostra, pr_p)}
-                dic_norm = {n: round(v, 2) for n, v in zip(self.tamanhos_amostra, pr_n)}
-                self.prm_precisao_list.append(dic_prec)
-                self.prm_norma_list.append(dic_norm)
-                self.atualizar_progresso_total(concluido=idx + 1, total=len(self.percentuais))
+            self.curva_precisao_R = None
+            self.curva_norma_R = None
+
+            self.estimativa = EstimativaAoVivo(
+                modelo.custos_por_tamanho(cenario, plano, curvas_reais),
+                len(self.percentuais) + curvas_reais)
+            resultado = executar_simulacao(
+                cenario,
+                dados_reais=self.dados_reais,
+                plano=plano,
+                progress_callback=self.atualizar_progresso,
+                progress_total_callback=self.atualizar_progresso_total,
+                progress_iteracoes_callback=self.atualizar_iteracoes,
+                cancel_callback=lambda: self._cancel_requested,
+                cache=self.cache,
+                checkpoint=self.checkpoint)
+            # Com refinamento, a grade final só é conhecida no resultado.
+            self.tamanhos_amostra = resultado['tamanhos_amostra']
+
+            self.curvas_precisao.extend(resultado['curvas_precisao'])
+            self.curvas_norma.extend(resultado['curvas_norma'])
+            self.prm_precisao_list.extend(
+                curvas_para_dicionarios(self.tamanhos_amostra, resultado['curvas_precisao']))
+            self.prm_norma_list.extend(
+                curvas_para_dicionarios(self.tamanhos_amostra, resultado['curvas_norma']))
+
+            if resultado['curva_precisao_R'] is not None:
+                self.curva_precisao_R = resultado['curva_precisao_R']
+                self.curva_norma_R = resultado['curva_norma_R']
+                self.prm_precisao_real.update(curvas_para_dicionarios(
+                    self.tamanhos_amostra, [self.curva_precisao_R])[0])
+                self.prm_norma_real.update(curvas_para_dicionarios(
+                    self.tamanhos_amostra, [self.curva_norma_R])[0])
             
-            if self.dados_reais:
-                base_real = np.array(self.dados_reais)
-                if len(base_real) > 100000:
-                    base_real = base_real.astype(np.float32)
-                pr_p_r, pr_n_r = simular_percentual_rejeicao_escalar(
-                    base_real, self.tamanhos_amostra, n_iter,
-                    erro_admissivel, perc_base,
-                    progress_callback=self.atualizar_progresso,
-                    batch_size=batch_size)
-                self.curva_precisao_R = pr_p_r
-                self.curva_norma_R = pr_n_r
-
-                self.prm_precisao_real = {n: round(v, 2) for n, v in zip(self.tamanhos_amostra, pr_p_r)}
-                self.prm_norma_real = {n: round(v, 2) for n, v in zip(self.tamanhos_amostra, pr_n_r)}
-                self.atualizar_progresso_total(concluido=len(self.percentuais) + 1,total=len(self.percentuais) + 1)
-            
-            self.tempo_processamento = time.time() - self.inicio_processamento
+            self.resultado = resultado
+            self.tempo_processamento = resultado['tempo_processamento']
+            self.estimativa = None
+            if resultado['cache']['celulas_reaproveitadas'] == 0 and \
+                    not resultado['checkpoint']['retomado']:
+                modelo.registrar(cenario, plano, self.tempo_processamento, curvas_reais)
             self.master.after(0, self.plotar)
             self._finalizar_thread(cancelado=False)
+
+        except SimulacaoCancelada:
+            self.estimativa = None
+            self._finalizar_thread(cancelado=True)
         
         except Exception as exc:
             self.master.after(0, lambda: messagebox.showerror(
                 self.t['msg_erro'], f"{self.t['msg_erro_inesperado']}{exc}"))
             self._finalizar_thread(cancelado=True)
 
+    def _intervalo_curva(self, chave, i=None):
+        if not self.resultado or self.resultado.get(chave) is None:
+            return None
+        intervalos = self.resultado[chave] if i is None else self.resultado[chave][i]
+        inferior, superior = zip(*intervalos)
+        return list(inferior), list(superior)
+
+    def _iteracoes_curva(self, i=None):
+        if not self.resultado or self.resultado.get('iteracoes') is None:
+            return None
+        return self.resultado['iteracoes_R'] if i is None else self.resultado['iteracoes'][i]
+
+    def _plotar_intervalo(self, ax, intervalo, cor):
+        if intervalo is not None:
+            ax.fill_between(self.tamanhos_amostra, intervalo[0], intervalo[1],
+                            color=cor, alpha=0.15, linewidth=0)
+
+    @medido('gui')
     def plotar(self):
+        import matplotlib.pyplot as plt
+        import matplotlib.ticker as ticker
+        from simulapec_engine import _formatar_tempo
         fig, ax = plt.subplots(1, 2, figsize=(14, 6))
         perc_base = self.perc_base
         n_curvas = len(self.percentuais)
@@ -662,8 +553,10 @@ class SimulaPECApp:
         for i, (perc, curva) in enumerate(zip(self.percentuais, self.curvas_precisao)):
             ax[0].plot(self.tamanhos_amostra, curva,
                        label=f"{perc}%", color=cores[i], linewidth=_line_width())
+            self._plotar_intervalo(ax[0], self._intervalo_curva('ic_precisao', i), cores[i])
 
         if self.curva_precisao_R is not None:
+            self._plotar_intervalo(ax[0], self._intervalo_curva('ic_precisao_R'), 'black')
             ax[0].plot(self.tamanhos_amostra, self.curva_precisao_R,
                        label=self.t['legenda_dados_reais'], 
                        linewidth=_line_width() * 1.5,
@@ -678,8 +571,10 @@ class SimulaPECApp:
         for i, (perc, curva) in enumerate(zip(self.percentuais, self.curvas_norma)):
             ax[1].plot(self.tamanhos_amostra, curva,
                        label=f"{perc}%", color=cores[i], linewidth=_line_width())
+            self._plotar_intervalo(ax[1], self._intervalo_curva('ic_norma', i), cores[i])
 
         if self.curva_norma_R is not None:
+            self._plotar_intervalo(ax[1], self._intervalo_curva('ic_norma_R'), 'black')
             ax[1].plot(self.tamanhos_amostra, self.curva_norma_R,
                        label=self.t['legenda_dados_reais'], 
                        linewidth=_line_width() * 1.5,
@@ -692,8 +587,13 @@ class SimulaPECApp:
         ax[1].grid(True)
 
         plt.tight_layout()
-        ax[0].xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
-        ax[1].xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+        grade = (self.resultado or {}).get('cenario', {}).get('grade') or {}
+        if grade.get('tipo') == 'log':
+            ax[0].set_xscale('log')
+            ax[1].set_xscale('log')
+        else:
+            ax[0].xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+            ax[1].xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
 
         fig.text(0.58, 0.98,
                  f"{self.t['tempo_total']}{tempo_formatado}",
@@ -704,6 +604,29 @@ class SimulaPECApp:
         plt.show(block=False)
         self.figura = fig
 
+    def _adicionar_intervalo_plotly(self, fig, intervalo, cor, col):
+        import plotly.graph_objects as go
+        if intervalo is None:
+            return
+        fig.add_trace(go.Scatter(
+            x=list(self.tamanhos_amostra) + list(self.tamanhos_amostra)[::-1],
+            y=intervalo[1] + intervalo[0][::-1],
+            fill='toself',
+            fillcolor=cor,
+            opacity=0.15,
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False,
+            name=self.t['legenda_ic']), row=1, col=col)
+
+    def _hover_iteracoes(self, i=None):
+        iteracoes = self._iteracoes_curva(i)
+        if iteracoes is None:
+            return {}
+        return dict(customdata=iteracoes,
+                    hovertemplate=f"%{{y:.2f}}% ({self.t['iteracoes']}: %{{customdata}})")
+
+    @medido('gui')
     def exportar_grafico_html(self):
         if not self.figura:
             messagebox.showwarning(self.t['msg_aviso'],
@@ -716,6 +639,8 @@ class SimulaPECApp:
         if not caminho:
             return
         
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
         try:
             fig = go.Figure()
             fig = make_subplots(
@@ -729,34 +654,46 @@ class SimulaPECApp:
             cores = self._gerar_cores_personalizadas(self.percentuais, perc_base)
 
             for i, (perc, curva) in enumerate(zip(self.percentuais, self.curvas_precisao)):
+                self._adicionar_intervalo_plotly(
+                    fig, self._intervalo_curva('ic_precisao', i), cores[i], 1)
                 fig.add_trace(go.Scatter(
                     x=self.tamanhos_amostra,
                     y=curva,
                     mode='lines',
                     name=f"{perc}%",
-                    line=dict(color=cores[i], width=2.5)), row=1, col=1)
+                    line=dict(color=cores[i], width=2.5),
+                    **self._hover_iteracoes(i)), row=1, col=1)
             if self.curva_precisao_R is not None:
+                self._adicionar_intervalo_plotly(
+                    fig, self._intervalo_curva('ic_precisao_R'), 'black', 1)
                 fig.add_trace(go.Scatter(
                     x=self.tamanhos_amostra,
                     y=self.curva_precisao_R,
                     mode='lines',
                     name=self.t['legenda_dados_reais'],
-                    line=dict(color='black', width=3, dash='dash')), row=1, col=1)
+                    line=dict(color='black', width=3, dash='dash'),
+                    **self._hover_iteracoes()), row=1, col=1)
             
             for i, (perc, curva) in enumerate(zip(self.percentuais, self.curvas_norma)):
+                self._adicionar_intervalo_plotly(
+                    fig, self._intervalo_curva('ic_norma', i), cores[i], 2)
                 fig.add_trace(go.Scatter(
                     x=self.tamanhos_amostra,
                     y=curva,
                     mode='lines',
                     name=f"{perc}%",
-                    line=dict(color=cores[i], width=2.5)), row=1, col=2)
+                    line=dict(color=cores[i], width=2.5),
+                    **self._hover_iteracoes(i)), row=1, col=2)
             if self.curva_norma_R is not None:
+                self._adicionar_intervalo_plotly(
+                    fig, self._intervalo_curva('ic_norma_R'), 'black', 2)
                 fig.add_trace(go.Scatter(
                     x=self.tamanhos_amostra,
                     y=self.curva_norma_R,
                     mode='lines',
                     name=self.t['legenda_dados_reais'],
-                    line=dict(color='black', width=3, dash='dash')), row=1, col=2)
+                    line=dict(color='black', width=3, dash='dash'),
+                    **self._hover_iteracoes()), row=1, col=2)
             
             fig.update_xaxes(title_text=self.t['xlabel_amostra'], row=1, col=1)
             fig.update_yaxes(title_text=self.t['ylabel_prm'], row=1, col=1)
@@ -779,6 +716,7 @@ class SimulaPECApp:
             messagebox.showerror(self.t['msg_erro'],
                                  f"{self.t['msg_falha_grafico']}{exc}")
     
+    @medido('gui')
     def exportar_planilha(self):
         if not self.curvas_precisao:
             messagebox.showwarning(self.t['msg_aviso'],
@@ -787,10 +725,21 @@ class SimulaPECApp:
         
         caminho = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv")])
+            filetypes=[("CSV files", "*.csv"), ("Parquet", "*.parquet"), ("NumPy (NPZ)", "*.npz")])
         if not caminho:
             return
-        
+
+        if caminho.lower().endswith(('.parquet', '.npz')):
+            from simulapec_exportacao import salvar_tabela
+            try:
+                salvar_tabela({'simulapec': self.resultado}, caminho)
+            except (ValueError, OSError) as exc:
+                messagebox.showerror(self.t['msg_erro'], str(exc))
+                return
+            messagebox.showinfo(self.t['msg_exportacao'], self.t['msg_planilha_salva'])
+            return
+
+        from simulapec_engine import _salvar_planilha_csv
         amostras = self.tamanhos_amostra
         _salvar_planilha_csv(
             caminho_arquivo=caminho,
@@ -798,13 +747,14 @@ class SimulaPECApp:
             amostras=amostras,
             prm_precisao_list=self.prm_precisao_list,
             prm_norma_list=self.prm_norma_list,
-            dados_reais=self.dados_reais,
+            dados_reais=self.dados_reais is not None,
             prm_precisao_real=self.prm_precisao_real,
             prm_norma_real=self.prm_norma_real,
             lang=self.lang)
         
         messagebox.showinfo(self.t['msg_exportacao'], self.t['msg_planilha_salva'])
 
+    @medido('gui')
     def exportar_grafico(self):
         if not self.figura:
             messagebox.showwarning(self.t['msg_aviso'], self.t['msg_executar_simulacao'])
@@ -864,6 +814,8 @@ def main():
     root = tk.Tk()
     selector = LanguageSelector(root)
     app_instance = [None] 
+    root.after_idle(marcar_inicio, 'seletor_exibido')
+    iniciar_aquecimento()
     
     def on_lang_selected(event):
         if selector.selected_lang:
@@ -873,6 +825,7 @@ def main():
             new_root.title(f"SimulaPEC {'Teste' if selector.selected_lang == 'pt' else 'Test'} 22/04/2026")
             
             app_instance[0] = SimulaPECApp(new_root, lang=selector.selected_lang)
+            new_root.after_idle(marcar_inicio, 'janela_principal_exibida')
             
             new_root.mainloop()
     
@@ -0,0 +1,318 @@
+import atexit
+import json
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from simulapec_cache import pasta_cache_padrao
+from simulapec_custo import identificacao_maquina
+from simulapec_engine import BACKENDS, _simular_batch_numba, _simular_batch_serial
+from simulapec_rng import indices_reamostragem_vetorizado
+
+# Aumentar quando os backends, os lotes testados ou as classes de célula
+# mudarem: as decisões gravadas deixam de valer.
+VERSAO_AJUSTE = 2
+# Lotes (iterações por chamada) testados pelo ajuste automático.
+LOTES_AJUSTE = (25, 100, 400, 1600)
+# Um candidato está medido após CHAMADAS_SONDAGEM lotes ou TEMPO_SONDAGEM
+# segundos (pelo menos dois lotes, sem contar o primeiro uso de cada backend,
+# que inclui compilação ou a criação dos processos).
+TEMPO_SONDAGEM = 0.01
+CHAMADAS_SONDAGEM = 16
+# Duração máxima prevista (s) de um lote: o cancelamento e o progresso são
+# atendidos entre lotes, também nas células grandes.
+DURACAO_MAXIMA_LOTE = 0.25
+# Elementos (iterações × n) por bloco do backend NumPy: limita a memória.
+ELEMENTOS_NUMPY = 1 << 20
+# Esperas máximas (s) do backend 'processos': a partida dos processos (que
+# importam os módulos e carregam os kernels) e cada lote. Um processo que
+# morre não devolve sua tarefa; sem limite, a espera não terminaria.
+TEMPO_INICIO_PROCESSOS = 120
+TEMPO_LOTE_PROCESSOS = 600
+
+
+def _simular_lote_numpy(base, n, n_iter, erro_padrao_precisao, erro_admissivel,
+                        percentual_limite, qui_tabela, reposicao=True, semente=0,
+                        curva_id=0, iter_inicio=0, escala=1.0):
+    if not reposicao:
+        raise ValueError("O backend 'numpy' requer amostragem com reposição.")
+    rejeicoes_p = 0
+    rejeicoes_n = 0
+    por_bloco = max(1, ELEMENTOS_NUMPY // n)
+    for inicio in range(0, n_iter, por_bloco):
+        iteracoes = np.arange(iter_inicio + inicio, iter_inicio + min(inicio + por_bloco, n_iter))
+        amostras = base[indices_reamostragem_vetorizado(
+            n, iteracoes, curva_id, semente, len(base))] * escala
+
+        # Somas sequenciais (cumsum), na ordem do kernel Numba: as decisões
+        # são idênticas às dos outros backends.
+        media = np.cumsum(amostras, axis=1)[:, -1] / n
+        desvio_sq = np.cumsum((amostras - media[:, None]) ** 2, axis=1)[:, -1] / (n - 1)
+        qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
+        rejeicoes_p += int(np.count_nonzero(qui_calc > qui_tabela))
+
+        acima = np.count_nonzero(np.abs(amostras) > erro_admissivel, axis=1)
+        rejeicoes_n += int(np.count_nonzero((acima / n) * 100 > percentual_limite))
+    return rejeicoes_p, rejeicoes_n
+
+
+# Pool de processos: cada processo roda o kernel serial sobre uma faixa
+# contígua de iterações. A base vai para um arquivo temporário, mapeado em
+# memória pelos processos, uma única vez por base.
+_pool = None
+_arquivos_base = {}
+_bases_processo = {}
+
+def _iniciar_processo():
+    import numba
+    numba.set_num_threads(1)
+
+def _processo_pronto(_):
+    return os.getpid()
+
+def _lote_processo(caminho, argumentos):
+    if caminho not in _bases_processo:
+        _bases_processo.clear()
+        _bases_processo[caminho] = np.asarray(np.load(caminho, mmap_mode='r'))
+    return _simular_batch_serial(_bases_processo[caminho], *argumentos)
+
+def _arquivo_base(base):
+    # Indexado por id(base): a referência guardada impede que o id seja
+    # reutilizado por outro array enquanto o arquivo existir.
+    chave = id(base)
+    if chave not in _arquivos_base:
+        while len(_arquivos_base) >= 2:
+            _, caminho = _arquivos_base.pop(next(iter(_arquivos_base)))
+            _remover(caminho)
+        descritor, caminho = tempfile.mkstemp(suffix='.npy')
+        with os.fdopen(descritor, 'wb') as f:
+            np.save(f, np.ascontiguousarray(base, dtype=np.float64))
+        _arquivos_base[chave] = (base, caminho)
+    return _arquivos_base[chave][1]
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+def _encerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+    for _, caminho in _arquivos_base.values():
+        _remover(caminho)
+    _arquivos_base.clear()
+
+def _criar_pool(processos):
+    # O contexto 'spawn' reimporta o módulo principal em cada processo: num
+    # script sem "if __name__ == '__main__':" os processos falham ao partir
+    # e o Pool os recria indefinidamente. A primeira tarefa confirma que
+    # eles partiram.
+    pool = multiprocessing.get_context('spawn').Pool(processos, initializer=_iniciar_processo)
+    try:
+        pool.map_async(_processo_pronto, range(processos)).get(TEMPO_INICIO_PROCESSOS)
+    except multiprocessing.TimeoutError:
+        pool.terminate()
+        raise RuntimeError(
+            f"Os processos do backend 'processos' não partiram em {TEMPO_INICIO_PROCESSOS} s. "
+            "O script principal precisa proteger a simulação com "
+            "\"if __name__ == '__main__':\" (ou use outro backend).") from None
+    return pool
+
+# Registrado uma única vez: o pool pode ser recriado (após um lote que não
+# terminou), e _encerrar_pool não faz nada sem pool nem arquivos.
+atexit.register(_encerrar_pool)
+
+def _simular_lote_processos(base, n, n_iter, erro_padrao_precisao, erro_admissivel,
+                            percentual_limite, qui_tabela, reposicao=True, semente=0,
+                            curva_id=0, iter_inicio=0, escala=1.0):
+    global _pool
+    processos = os.cpu_count() or 1
+    if _pool is None:
+        _pool = _criar_pool(processos)
+    caminho = _arquivo_base(base)
+    limites = np.linspace(0, n_iter, min(processos, n_iter) + 1).astype(np.int64)
+    tarefas = [(caminho, (n, int(fim - inicio), erro_padrao_precisao, erro_admissivel,
+                          percentual_limite, qui_tabela, reposicao, semente, curva_id,
+                          iter_inicio + int(inicio), escala))
+               for inicio, fim in zip(limites[:-1], limites[1:])]
+    try:
+        parciais = _pool.starmap_async(_lote_processo, tarefas).get(TEMPO_LOTE_PROCESSOS)
+    except multiprocessing.TimeoutError:
+        _encerrar_pool()
+        raise RuntimeError(
+            f"Um lote do backend 'processos' não terminou em {TEMPO_LOTE_PROCESSOS} s: "
+            "um processo foi encerrado ou travou.") from None
+    return sum(p for p, _ in parciais), sum(r for _, r in parciais)
+
+
+_FUNCOES = {
+    'paralelo': _simular_batch_numba,
+    'serial': _simular_batch_serial,
+    'numpy': _simular_lote_numpy,
+    'processos': _simular_lote_processos,
+}
+
+def simular_lote(backend, base, n, n_iter, *argumentos):
+    # Mesma assinatura de _simular_batch_numba; todos os backends devolvem
+    # as mesmas contagens de rejeição.
+    return _FUNCOES[backend](base, n, n_iter, *argumentos)
+
+def backends_disponiveis(reposicao=True) -> list:
+    # Candidatos do ajuste automático. 'processos' só é usado quando pedido
+    # explicitamente: ele exige a proteção do módulo principal (ver
+    # _criar_pool), que o 'auto' não pode supor.
+    backends = [b for b in BACKENDS if b not in ('auto', 'processos')]
+    if not reposicao:
+        backends.remove('numpy')
+    return backends
+
+def classe_celula(n, n_base, reposicao) -> str:
+    # Células da mesma classe (n na mesma potência de 2, base na mesma
+    # potência de 10) compartilham a decisão.
+    return (f"reposicao={int(bool(reposicao))},n=2^{int(n).bit_length() - 1},"
+            f"base=10^{len(str(int(n_base))) - 1}")
+
+
+class AjusteBackend:
+    # Escolhe, para cada classe de célula, o backend e o lote de maior vazão
+    # (elementos sorteados por segundo) medida nesta máquina. As medições
+    # usam os próprios lotes da simulação, já que o resultado não depende do
+    # backend nem do lote; as vazões de cada classe decidida ficam gravadas
+    # em ajuste_backend.json, na pasta de cache. Com persistente=False, as
+    # decisões valem só neste processo: nada é lido nem gravado.
+    def __init__(self, caminho=None, persistente=True):
+        self.caminho = caminho or os.path.join(pasta_cache_padrao(), 'ajuste_backend.json')
+        self.persistente = persistente
+        self.maquina = None
+        self.decisoes = {}
+        self.medicoes = {}
+        self.aquecidos = set()
+
+    def _chave(self):
+        return json.dumps(self.maquina, sort_keys=True)
+
+    def carregar(self):
+        maquina = dict(identificacao_maquina(), versao=VERSAO_AJUSTE)
+        if maquina == self.maquina:
+            return
+        self.maquina = maquina
+        self.medicoes = {}
+        self.decisoes = {}
+        if not self.persistente:
+            return
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                self.decisoes = json.load(f).get(self._chave(), {})
+        except (OSError, ValueError):
+            self.decisoes = {}
+
+    def salvar(self):
+        if not self.persistente:
+            return
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                perfis = json.load(f)
+        except (OSError, ValueError):
+            perfis = {}
+        perfis[self._chave()] = self.decisoes
+
+        try:
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            descritor, temporario = tempfile.mkstemp(
+                dir=os.path.dirname(self.caminho) or '.', suffix='.tmp')
+            with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+                json.dump(perfis, f, indent=2)
+            os.replace(temporario, self.caminho)
+        except OSError:
+            pass
+
+    def escolher(self, n, n_base, reposicao):
+        # (backend, lote) para o próximo lote de uma célula: um candidato
+        # ainda não medido, enquanto a classe não estiver decidida.
+        classe = classe_celula(n, n_base, reposicao)
+        if classe in self.decisoes:
+            return _melhor(self.decisoes[classe], n)
+
+        medicoes = self.medicoes.setdefault(classe, {})
+        for backend in backends_disponiveis(reposicao):
+            for lote in LOTES_AJUSTE:
+                candidato = f"{backend}:{lote}"
+                medido = medicoes.get(candidato)
+                if medido and medido[2] >= 2 and (medido[1] >= TEMPO_SONDAGEM or
+                                                  medido[2] >= CHAMADAS_SONDAGEM):
+                    continue
+                if _duracao_prevista(medicoes, backend, lote, n) > DURACAO_MAXIMA_LOTE:
+                    # Lotes maiores do mesmo backend seriam ainda mais longos.
+                    break
+                return backend, lote
+
+        self.decisoes[classe] = {candidato: elementos / tempo
+                                 for candidato, (elementos, tempo, _) in medicoes.items()
+                                 if tempo > 0}
+        del self.medicoes[classe]
+        self.salvar()
+        return _melhor(self.decisoes[classe], n)
+
+    def vazao(self, n, n_base, reposicao):
+        # Vazão (elementos por segundo) do candidato que escolher() usará
+        # numa classe já decidida; None enquanto a classe estiver em teste.
+        taxas = self.decisoes.get(classe_celula(n, n_base, reposicao))
+        if not taxas:
+            return None
+        backend, lote = _melhor(taxas, n)
+        return taxas[f"{backend}:{lote}"]
+
+    def registrar(self, n, n_base, reposicao, backend, lote, iteracoes, duracao):
+        if backend not in self.aquecidos:
+            self.aquecidos.add(backend)
+            return
+        classe = classe_celula(n, n_base, reposicao)
+        if classe in self.decisoes:
+            return
+        medido = self.medicoes.setdefault(classe, {}).setdefault(f"{backend}:{lote}", [0, 0.0, 0])
+        medido[0] += int(iteracoes) * int(n)
+        medido[1] += duracao
+        medido[2] += 1
+
+def _duracao_prevista(medicoes, backend, lote, n):
+    # Pela melhor vazão já medida do backend na classe (0 se nenhuma).
+    taxas = [elementos / tempo for candidato, (elementos, tempo, _) in medicoes.items()
+             if candidato.split(':')[0] == backend and tempo > 0]
+    return lote * n / max(taxas) if taxas else 0.0
+
+def _melhor(taxas, n):
+    # Maior vazão entre os candidatos cujo lote cabe em DURACAO_MAXIMA_LOTE;
+    # se nenhum couber, o de lote mais curto.
+    candidatos = [(candidato.split(':')[0], int(candidato.split(':')[1]), taxa)
+                  for candidato, taxa in taxas.items()]
+    if not candidatos:
+        return 'paralelo', LOTES_AJUSTE[0]
+    cabem = [c for c in candidatos if c[1] * n / c[2] <= DURACAO_MAXIMA_LOTE]
+    if cabem:
+        backend, lote, _ = max(cabem, key=lambda c: c[2])
+    else:
+        backend, lote, _ = min(candidatos, key=lambda c: c[1] * n / c[2])
+    return backend, lote
+
+
+_ajuste_padrao = None
+
+def ajuste_padrao() -> AjusteBackend:
+    global _ajuste_padrao
+    if _ajuste_padrao is None:
+        _ajuste_padrao = AjusteBackend()
+    return _ajuste_padrao
+
+def configurar_ajuste_padrao(pasta=None, persistente=True) -> AjusteBackend:
+    # Ajuste usado pela engine batch com backend 'auto': na pasta de cache
+    # informada (padrão: pasta_cache_padrao()) ou, sem persistência, só em
+    # memória.
+    global _ajuste_padrao
+    caminho = os.path.join(pasta, 'ajuste_backend.json') if pasta else None
+    _ajuste_padrao = AjusteBackend(caminho, persistente=persistente)
+    return _ajuste_padrao
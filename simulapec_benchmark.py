@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numba
+from scipy.stats import chi2
+
+from simulapec_backends import simular_lote
+from simulapec_cache import pasta_cache_padrao
+from simulapec_custo import aquecer_kernels, identificacao_maquina
+from simulapec_engine import (
+    _formatar_tempo,
+    executar_simulacao,
+    gerar_tabela_base,
+    gerar_tamanhos_amostra,
+    id_curva,
+    normalizar_cenario,
+    planejar_simulacao,
+    simular_percentual_rejeicao_escalar,
+)
+
+# Aumentar quando os casos mudarem de forma incompatível com o histórico.
+VERSAO_BENCHMARK = 1
+TAMANHOS_BASE = (150, 10_000, 100_000, 1_000_000)
+AMOSTRAS_CELULA = (30, 1_000)
+ITERACOES_CELULA = (1_000, 10_000)
+# Backends medidos na célula isolada, além do paralelo (sem campo backend,
+# comparável ao histórico).
+BACKENDS_CELULA = ('serial', 'numpy')
+# Tamanhos de amostra da curva completa (laço Python por lotes).
+PONTOS_CURVA = 24
+# (engine, N máximo, iterações) das varreduras completas: o custo de batch
+# e fused cresce com N², e acima de ~10 mil PCs só a nested cabe aqui.
+VARREDURAS = (
+    ('batch', 10_000, (20,)),
+    ('fused', 10_000, (20,)),
+    ('nested', 1_000_000, (10, 100)),
+)
+# O backend da batch fica fixo no paralelo com o lote padrão: com 'auto', o
+# tempo dependeria do estado do ajuste (sondagens na primeira repetição) e
+# deixaria de ser comparável ao histórico.
+CENARIO_VARREDURA = {'erro_admissivel': 1.0, 'perc_base': 10.0,
+                     'intervalo_acima': 10.0, 'intervalo_abaixo': 5.0,
+                     'backend': 'paralelo'}
+TOLERANCIA_PADRAO = 0.10
+# Diferença mínima (s) para acusar variação: casos de microssegundos oscilam
+# muito mais que a tolerância relativa por ruído do sistema.
+DIFERENCA_MINIMA = 0.005
+
+
+def casos_benchmark(tamanhos_base=TAMANHOS_BASE, iteracoes=ITERACOES_CELULA,
+                    grupos=('base', 'celula', 'curva', 'varredura')) -> list:
+    casos = []
+    for N in tamanhos_base:
+        if 'base' in grupos:
+            casos.append({'caso': 'base', 'N': N})
+        if 'celula' in grupos:
+            for n in sorted({min(n, int(N * 0.6)) for n in AMOSTRAS_CELULA}):
+                for n_iter in iteracoes:
+                    casos.append({'caso': 'celula', 'N': N, 'n': n, 'n_iter': n_iter})
+                    casos.extend({'caso': 'celula', 'N': N, 'n': n, 'n_iter': n_iter,
+                                  'backend': backend} for backend in BACKENDS_CELULA)
+        if 'curva' in grupos and N <= 10_000:
+            casos.append({'caso': 'curva', 'N': N, 'n_iter': iteracoes[0]})
+        if 'varredura' in grupos:
+            for engine, n_maximo, lista in VARREDURAS:
+                if N <= n_maximo:
+                    casos.extend({'caso': 'varredura', 'N': N, 'engine': engine, 'n_iter': n_iter}
+                                 for n_iter in lista)
+    return casos
+
+def chave_caso(registro) -> tuple:
+    return tuple(registro.get(campo) for campo in
+                 ('caso', 'N', 'n', 'n_iter', 'engine', 'backend', 'threads'))
+
+def _preparar(caso):
+    # Devolve (função cronometrada, iterações de célula por chamada).
+    N = caso['N']
+    if caso['caso'] == 'base':
+        return lambda: gerar_tabela_base(N, 1.0, 10.0), 0
+
+    base = gerar_tabela_base(N, 1.0, 10.0)
+    if caso['caso'] == 'celula':
+        n, n_iter = caso['n'], caso['n_iter']
+        qui = chi2.ppf(0.9, df=n - 1)
+        backend = caso.get('backend', 'paralelo')
+        return (lambda: simular_lote(backend, base, n, n_iter, 1 / 1.6449, 1.0, 10.0, qui,
+                                     True, 0, id_curva(10.0), 0, 1.0)), n_iter
+
+    if caso['caso'] == 'curva':
+        tamanhos = gerar_tamanhos_amostra(N)
+        tamanhos = tamanhos[::max(1, len(tamanhos) // PONTOS_CURVA)]
+        return (lambda: simular_percentual_rejeicao_escalar(
+            base, tamanhos, caso['n_iter'], 1.0, 10.0, batch_size=200,
+            curva_id=id_curva(10.0))), len(tamanhos) * caso['n_iter']
+
+    cenario = normalizar_cenario(dict(CENARIO_VARREDURA, N=N, n_iter=caso['n_iter'],
+                                      engine=caso['engine']))
+    plano = planejar_simulacao(cenario)
+    iteracoes = len(plano['percentuais']) * len(plano['tamanhos_amostra']) * caso['n_iter']
+    return lambda: executar_simulacao(cenario, plano=plano), iteracoes
+
+def executar_benchmark(casos, threads=None, repeticoes=3, progresso=None) -> list:
+    # Os kernels são compilados (ou carregados do cache) antes de qualquer
+    # medição; cada caso é repetido e registra o mínimo e a mediana.
+    aquecer_kernels()
+    threads = threads or sorted({1, numba.config.NUMBA_NUM_THREADS})
+    maquina = identificacao_maquina()
+    registros = []
+    for n_threads in threads:
+        numba.set_num_threads(n_threads)
+        for caso in casos:
+            funcao, iteracoes = _preparar(caso)
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append(time.perf_counter() - inicio)
+            registro = dict(caso, threads=n_threads, repeticoes=repeticoes,
+                            tempo_min=min(tempos), tempo_mediana=statistics.median(tempos),
+                            maquina=maquina)
+            if iteracoes:
+                registro['iteracoes_por_s'] = iteracoes / min(tempos)
+            registros.append(registro)
+            if progresso:
+                progresso(registro)
+    numba.set_num_threads(numba.config.NUMBA_NUM_THREADS)
+    return registros
+
+def _commit_atual():
+    try:
+        saida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return saida.stdout.strip() or None
+
+def salvar_historico(registros, caminho, rotulo=None):
+    # Uma linha JSON por caso medido, acrescentada ao histórico.
+    execucao = {'versao': VERSAO_BENCHMARK, 'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'commit': _commit_atual(), 'rotulo': rotulo}
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    with open(caminho, 'a', encoding='utf-8') as f:
+        for registro in registros:
+            f.write(json.dumps(dict(registro, **execucao), ensure_ascii=False) + "\n")
+
+def carregar_historico(caminho) -> list:
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+def comparar(registros, linha_base, tolerancia=TOLERANCIA_PADRAO) -> list:
+    # Compara o tempo mínimo de cada caso com o da linha de base (mesma
+    # máquina); variação acima da tolerância é regressão ou melhora.
+    referencia = {chave_caso(r): r for r in linha_base
+                  if r.get('versao', VERSAO_BENCHMARK) == VERSAO_BENCHMARK}
+    comparacoes = []
+    for registro in registros:
+        base = referencia.get(chave_caso(registro))
+        if base is None or base.get('maquina') != registro['maquina']:
+            continue
+        razao = registro['tempo_min'] / base['tempo_min']
+        situacao = 'estavel'
+        if abs(registro['tempo_min'] - base['tempo_min']) >= DIFERENCA_MINIMA:
+            situacao = ('regressao' if razao > 1 + tolerancia else
+                        'melhora' if razao < 1 / (1 + tolerancia) else 'estavel')
+        comparacoes.append({'registro': registro, 'razao': razao,
+                            'situacao': situacao, 'commit_base': base.get('commit')})
+    return comparacoes
+
+def _descrever(registro):
+    partes = [registro['caso'], f"N={registro['N']}"]
+    for campo in ('engine', 'backend', 'n', 'n_iter'):
+        if registro.get(campo) is not None:
+            partes.append(f"{campo}={registro[campo]}")
+    partes.append(f"threads={registro['threads']}")
+    return " ".join(partes)
+
+def _criar_parser():
+    pasta = pasta_cache_padrao()
+    parser = argparse.ArgumentParser(
+        prog='simulapec-benchmark',
+        description='Mede os kernels e as varreduras completas do SimulaPEC.')
+    parser.add_argument('--N', type=int, nargs='+', default=list(TAMANHOS_BASE),
+                        help='Números de PCs das tabelas base.')
+    parser.add_argument('--iteracoes', type=int, nargs='+', default=list(ITERACOES_CELULA),
+                        help='Iterações das medições de célula.')
+    parser.add_argument('--threads', type=int, nargs='+', default=None,
+                        help='Números de threads do Numba (padrão: 1 e todos os núcleos).')
+    parser.add_argument('--grupos', nargs='+', default=['base', 'celula', 'curva', 'varredura'],
+                        choices=('base', 'celula', 'curva', 'varredura'),
+                        help='Grupos de casos a medir.')
+    parser.add_argument('--repeticoes', type=int, default=3,
+                        help='Repetições de cada caso (registra mínimo e mediana).')
+    parser.add_argument('--historico', default=os.path.join(pasta, 'benchmark_historico.jsonl'),
+                        help='Arquivo JSON Lines onde as medições são acrescentadas.')
+    parser.add_argument('--linha-base', default=os.path.join(pasta, 'benchmark_linha_base.json'),
+                        help='Medições de referência para detectar regressões.')
+    parser.add_argument('--salvar-linha-base', action='store_true',
+                        help='Grava as medições desta execução como nova linha de base.')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help='Aumento relativo do tempo tolerado antes de acusar regressão.')
+    parser.add_argument('--rotulo', default=None,
+                        help='Rótulo gravado no histórico (ex.: nome do ramo ou da mudança).')
+    return parser
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+    casos = casos_benchmark(args.N, args.iteracoes, args.grupos)
+    inicio = time.time()
+
+    def progresso(registro):
+        taxa = (f" – {registro['iteracoes_por_s']:,.0f} it/s"
+                if 'iteracoes_por_s' in registro else "")
+        print(f"{_descrever(registro)}: {registro['tempo_min'] * 1000:.2f} ms"
+              f" (mediana {registro['tempo_mediana'] * 1000:.2f} ms){taxa}", flush=True)
+
+    registros = executar_benchmark(casos, args.threads, args.repeticoes, progresso)
+    salvar_historico(registros, args.historico, args.rotulo)
+
+    regressoes = []
+    if os.path.exists(args.linha_base):
+        with open(args.linha_base, 'r', encoding='utf-8') as f:
+            comparacoes = comparar(registros, json.load(f), args.tolerancia)
+        for comparacao in comparacoes:
+            if comparacao['situacao'] != 'estavel':
+                print(f"{comparacao['situacao'].upper()}: {_descrever(comparacao['registro'])}"
+                      f" – {comparacao['razao']:.2f}x a linha de base")
+        regressoes = [c for c in comparacoes if c['situacao'] == 'regressao']
+        print(f"{len(comparacoes)} casos comparados, {len(regressoes)} regressões.")
+
+    if args.salvar_linha_base:
+        registros_base = [dict(r, versao=VERSAO_BENCHMARK, commit=_commit_atual())
+                          for r in registros]
+        os.makedirs(os.path.dirname(os.path.abspath(args.linha_base)), exist_ok=True)
+        with open(args.linha_base, 'w', encoding='utf-8') as f:
+            json.dump(registros_base, f, ensure_ascii=False, indent=2)
+        print(f"Linha de base gravada em {args.linha_base}")
+
+    print(f"Tempo total: {_formatar_tempo(time.time() - inicio)}")
+    return 1 if regressoes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import time
+
+# Aumentar sempre que uma mudança nos kernels alterar os resultados.
+VERSAO_CACHE = 2
+LIMITE_PADRAO_BYTES = 256 * 1024 * 1024
+# Intervalo mínimo (s) entre gravações do checkpoint.
+INTERVALO_CHECKPOINT = 60.0
+
+
+def pasta_cache_padrao():
+    if os.environ.get('SIMULAPEC_CACHE_DIR'):
+        return os.environ['SIMULAPEC_CACHE_DIR']
+    if sys.platform.startswith('win'):
+        raiz = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        return os.path.join(raiz, 'SimulaPEC', 'cache')
+    if sys.platform == 'darwin':
+        return os.path.expanduser('~/Library/Caches/SimulaPEC')
+    raiz = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(raiz, 'simulapec')
+
+def chave_cache(identidade: dict) -> str:
+    texto = json.dumps(dict(identidade, versao=VERSAO_CACHE), sort_keys=True)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class CacheResultados:
+    def __init__(self, pasta=None, limite_bytes=LIMITE_PADRAO_BYTES):
+        self.pasta = pasta or pasta_cache_padrao()
+        self.limite_bytes = limite_bytes
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def _caminho(self, identidade):
+        return os.path.join(self.pasta, f"{chave_cache(identidade)}.json")
+
+    def carregar(self, identidade) -> dict:
+        caminho = self._caminho(identidade)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                conteudo = json.load(f)
+            os.utime(caminho)
+        except (OSError, ValueError):
+            return {}
+
+        tamanhos = conteudo['tamanhos']
+        campos = [k for k in conteudo['celulas']]
+        return {n: {campo: conteudo['celulas'][campo][i] for campo in campos}
+                for i, n in enumerate(tamanhos)}
+
+    def salvar(self, identidade, celulas: dict) -> None:
+        tamanhos = sorted(celulas)
+        campos = celulas[tamanhos[0]].keys() if tamanhos else []
+        conteudo = {
+            'identidade': identidade,
+            'versao': VERSAO_CACHE,
+            'tamanhos': tamanhos,
+            'celulas': {campo: [celulas[n][campo] for n in tamanhos] for campo in campos},
+        }
+
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+                json.dump(conteudo, f)
+            os.replace(temporario, self._caminho(identidade))
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+
+        self._podar()
+
+    def _podar(self):
+        arquivos = []
+        for nome in os.listdir(self.pasta):
+            if not nome.endswith('.json'):
+                continue
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                estado = os.stat(caminho)
+            except OSError:
+                continue
+            arquivos.append((estado.st_mtime, estado.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except OSError:
+                pass
+
+    def limpar(self):
+        for nome in os.listdir(self.pasta):
+            if nome.endswith('.json'):
+                os.remove(os.path.join(self.pasta, nome))
+
+
+class CacheMemoria:
+    # Mesma interface de CacheResultados, sem persistência: reaproveita
+    # curvas entre as simulações de um mesmo processo.
+    def __init__(self):
+        self.celulas = {}
+
+    def carregar(self, identidade) -> dict:
+        return {n: dict(c) for n, c in self.celulas.get(chave_cache(identidade), {}).items()}
+
+    def salvar(self, identidade, celulas: dict) -> None:
+        self.celulas[chave_cache(identidade)] = {n: dict(c) for n, c in celulas.items()}
+
+    def limpar(self):
+        self.celulas.clear()
+
+
+class CheckpointSimulacao:
+    # Contadores brutos (rejeições e iterações) de cada célula (curva,
+    # tamanho), concluída ou em andamento, gravados num arquivo por cenário
+    # a cada `intervalo` segundos. As curvas usam a mesma chave do cache.
+    CAMPOS = ('rejeicoes_precisao', 'rejeicoes_norma', 'iteracoes', 'concluida')
+
+    def __init__(self, pasta=None, intervalo=INTERVALO_CHECKPOINT):
+        self.pasta = pasta or os.path.join(pasta_cache_padrao(), 'checkpoints')
+        self.intervalo = intervalo
+        self.caminho = None
+        self.curvas = {}
+        self.ultimo = time.time()
+
+    def abrir(self, identidades):
+        chaves = sorted(chave_cache(identidade) for identidade in identidades)
+        self.caminho = os.path.join(self.pasta, f"{chave_cache({'curvas': chaves})}.json")
+        self.curvas = {}
+        self.ultimo = time.time()
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                conteudo = json.load(f)
+        except (OSError, ValueError):
+            return
+        if conteudo.get('versao') != VERSAO_CACHE:
+            return
+        for chave, colunas in conteudo['curvas'].items():
+            self.curvas[chave] = {n: {campo: colunas[campo][i] for campo in self.CAMPOS}
+                                  for i, n in enumerate(colunas['tamanhos'])}
+
+    def celulas(self, identidade) -> dict:
+        return self.curvas.get(chave_cache(identidade), {})
+
+    def registrar(self, identidade, n, rejeicoes_precisao, rejeicoes_norma, iteracoes,
+                  concluida):
+        self.curvas.setdefault(chave_cache(identidade), {})[n] = {
+            'rejeicoes_precisao': int(rejeicoes_precisao),
+            'rejeicoes_norma': int(rejeicoes_norma),
+            'iteracoes': int(iteracoes),
+            'concluida': bool(concluida),
+        }
+        if time.time() - self.ultimo >= self.intervalo:
+            self.salvar()
+
+    def salvar(self):
+        self.ultimo = time.time()
+        if self.caminho is None or not self.curvas:
+            return
+        conteudo = {'versao': VERSAO_CACHE, 'curvas': {}}
+        for chave, celulas in self.curvas.items():
+            tamanhos = sorted(celulas)
+            colunas = {campo: [celulas[n][campo] for n in tamanhos] for campo in self.CAMPOS}
+            conteudo['curvas'][chave] = dict(colunas, tamanhos=tamanhos)
+
+        try:
+            os.makedirs(self.pasta, exist_ok=True)
+            descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+                json.dump(conteudo, f)
+            os.replace(temporario, self.caminho)
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def concluir(self):
+        # A simulação terminou: os resultados estão no cache/na saída.
+        self.curvas = {}
+        if self.caminho is not None and os.path.exists(self.caminho):
+            os.remove(self.caminho)
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from simulapec_cache import CacheMemoria
+from simulapec_engine import executar_simulacao, normalizar_cenario, planejar_simulacao
+from simulapec_instrumentacao import medido
+
+# PEC-PCD (Decreto 89.817/1984 e ET-CQDG): (PEC, EP) por classe. No
+# planimétrico os valores estão em mm na escala da carta; no altimétrico,
+# em fração da equidistância das curvas de nível.
+TABELA_PEC_PCD = {
+    'A': {'planimetrico': (0.28, 0.17), 'altimetrico': (0.27, 1 / 6)},
+    'B': {'planimetrico': (0.50, 0.30), 'altimetrico': (0.50, 1 / 3)},
+    'C': {'planimetrico': (0.80, 0.50), 'altimetrico': (0.60, 0.40)},
+    'D': {'planimetrico': (1.00, 0.60), 'altimetrico': (0.75, 0.50)},
+}
+EQUIDISTANCIAS = {1000: 1.0, 2000: 1.0, 5000: 2.0, 10000: 5.0,
+                  25000: 10.0, 50000: 20.0, 100000: 50.0}
+ESCALAS = tuple(EQUIDISTANCIAS)
+CLASSES = tuple(TABELA_PEC_PCD)
+COMPONENTES = ('planimetrico', 'altimetrico')
+
+
+def pec_pcd(escala, classe, componente):
+    if classe not in TABELA_PEC_PCD:
+        raise ValueError(f"Classe desconhecida: {classe} (opções: {', '.join(CLASSES)})")
+    if componente not in COMPONENTES:
+        raise ValueError(f"Componente desconhecida: {componente} "
+                         f"(opções: {', '.join(COMPONENTES)})")
+
+    pec, ep = TABELA_PEC_PCD[classe][componente]
+    if componente == 'planimetrico':
+        return pec * escala / 1000, ep * escala / 1000
+    if escala not in EQUIDISTANCIAS:
+        raise ValueError(f"Equidistância não tabelada para a escala 1:{escala}.")
+    return pec * EQUIDISTANCIAS[escala], ep * EQUIDISTANCIAS[escala]
+
+def formatar_escala(escala):
+    return f"1:{escala:,}".replace(',', '.')
+
+def combinacoes_catalogo(escalas=None, classes=None, componentes=None):
+    return [(int(escala), classe, componente)
+            for componente in (componentes or COMPONENTES)
+            for escala in (escalas or ESCALAS)
+            for classe in (classes or CLASSES)]
+
+def _classificar(dados, pec, ep, perc_base):
+    erros = np.abs(np.asarray(dados, dtype=np.float64))
+    perc_acima = float(np.count_nonzero(erros > pec) / len(erros) * 100)
+    rmse = float(np.sqrt(np.mean(erros ** 2)))
+    return {'perc_acima': perc_acima, 'rmse': rmse,
+            'aprovado': perc_acima <= perc_base and rmse <= ep}
+
+def executar_catalogo(cenario: dict, dados_reais=None, escalas=None, classes=None,
+                      componentes=None, cache=None, progress_total_callback=None) -> dict:
+    # dados_reais: {componente: erros}; componentes sem dados usam só as
+    # curvas fictícias.
+    dados_reais = dados_reais or {}
+    cenario = normalizar_cenario(dict(cenario, erro_admissivel=cenario.get('erro_admissivel', 1.0)))
+    combinacoes = combinacoes_catalogo(escalas, classes, componentes)
+
+    # As curvas fictícias não dependem do PEC: com o cache (em memória, se
+    # nenhum for informado) elas são simuladas uma única vez para o catálogo.
+    cache = cache if cache is not None else CacheMemoria()
+    plano = planejar_simulacao(cenario)
+    inicio = time.time()
+
+    resultados = {}
+    itens = []
+    for i, (escala, classe, componente) in enumerate(combinacoes):
+        pec, ep = pec_pcd(escala, classe, componente)
+        dados = dados_reais.get(componente)
+        chave = (pec, componente if dados is not None else None)
+        if chave not in resultados:
+            resultados[chave] = executar_simulacao(
+                dict(cenario, erro_admissivel=pec), dados_reais=dados,
+                plano=plano, cache=cache)
+
+        item = {'escala': escala, 'classe': classe, 'componente': componente,
+                'pec': pec, 'ep': ep, 'resultado': resultados[chave]}
+        if dados is not None:
+            item.update(_classificar(dados, pec, ep, cenario['perc_base']))
+        itens.append(item)
+
+        if progress_total_callback:
+            progress_total_callback(i + 1, len(combinacoes))
+
+    return {
+        'cenario': {k: v for k, v in cenario.items() if k != 'erro_admissivel'},
+        'combinacoes': itens,
+        'simulacoes': len(resultados),
+        'tempo_processamento': time.time() - inicio,
+    }
+
+def relatorio_catalogo(catalogo: dict) -> list:
+    linhas = []
+    for item in catalogo['combinacoes']:
+        resultado = item['resultado']
+        linha = {'escala': formatar_escala(item['escala']), 'classe': item['classe'],
+                 'componente': item['componente'], 'pec': item['pec'], 'ep': item['ep']}
+        if 'aprovado' in item:
+            # PRM dos dados reais no maior tamanho de amostra simulado.
+            linha.update({k: item[k] for k in ('perc_acima', 'rmse', 'aprovado')})
+            linha['prm_precisao_R'] = resultado['curva_precisao_R'][-1]
+            linha['prm_norma_R'] = resultado['curva_norma_R'][-1]
+        linhas.append(linha)
+    return linhas
+
+@medido('exportacao')
+def salvar_catalogo(catalogo: dict, pasta_saida, nome, lang='pt'):
+    os.makedirs(pasta_saida, exist_ok=True)
+    linhas = relatorio_catalogo(catalogo)
+
+    if lang == 'en':
+        cabecalhos = {'escala': 'Scale', 'classe': 'Class', 'componente': 'Component',
+                      'pec': 'PEC (m)', 'ep': 'SE (m)', 'perc_acima': '% above PEC',
+                      'rmse': 'RMSE (m)', 'aprovado': 'Approved',
+                      'prm_precisao_R': 'PRM(%) - Accuracy R',
+                      'prm_norma_R': "PRM(%) - Country's Standard R"}
+    else:
+        cabecalhos = {'escala': 'Escala', 'classe': 'Classe', 'componente': 'Componente',
+                      'pec': 'PEC (m)', 'ep': 'EP (m)', 'perc_acima': '% acima do PEC',
+                      'rmse': 'REQM (m)', 'aprovado': 'Aprovado',
+                      'prm_precisao_R': 'PRM(%) - Precisão R',
+                      'prm_norma_R': 'PRM(%) - Norma R'}
+
+    colunas = [c for c in cabecalhos if any(c in linha for linha in linhas)]
+    caminho_csv = os.path.join(pasta_saida, f"{nome}_catalogo.csv")
+    with open(caminho_csv, 'w', encoding='utf-8', newline='') as f:
+        f.write(",".join(cabecalhos[c] for c in colunas) + "\n")
+        for linha in linhas:
+            valores = []
+            for c in colunas:
+                valor = linha.get(c, '')
+                if isinstance(valor, bool):
+                    valor = ('yes' if valor else 'no') if lang == 'en' else ('sim' if valor else 'não')
+                elif isinstance(valor, float):
+                    valor = f"{valor:.4f}" if c in ('pec', 'ep', 'rmse') else f"{valor:.2f}"
+                valores.append(str(valor))
+            f.write(",".join(valores) + "\n")
+
+    caminho_json = os.path.join(pasta_saida, f"{nome}_catalogo.json")
+    with open(caminho_json, 'w', encoding='utf-8') as f:
+        json.dump(catalogo, f, ensure_ascii=False, indent=2)
+
+    return caminho_csv, caminho_json
@@ -0,0 +1,382 @@
+import argparse
+import os
+import sys
+import time
+
+import numba
+
+from simulapec_backends import configurar_ajuste_padrao
+from simulapec_cache import CacheResultados, CheckpointSimulacao
+from simulapec_custo import (
+    EstimativaAoVivo,
+    aquecer_kernels,
+    configurar_modelo_padrao,
+    modelo_padrao,
+)
+from simulapec_catalogo import executar_catalogo, salvar_catalogo
+from simulapec_eixos import executar_eixos, salvar_resultado_eixos
+from simulapec_exportacao import FORMATOS_TABELA, salvar_tabela, salvar_tabela_resultado
+import simulapec_instrumentacao as instrumentacao
+from simulapec_lote import executar_lote, listar_conjuntos, salvar_lote
+from simulapec_tamanho import salvar_tamanho_minimo, tamanho_minimo
+from simulapec_engine import (
+    BACKENDS,
+    ENGINES,
+    GRADES,
+    SimulacaoCancelada,
+    _formatar_tempo,
+    carregar_cenarios,
+    carregar_dados_reais_txt,
+    executar_simulacao,
+    normalizar_cenario,
+    planejar_simulacao,
+    salvar_resultado,
+)
+
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        prog='simulapec',
+        description='Executa cenários do SimulaPEC sem interface gráfica.')
+    parser.add_argument('cenarios', nargs='*',
+                        help='Arquivos de cenário (.json ou .toml).')
+    parser.add_argument('-o', '--saida', default='resultados',
+                        help='Pasta onde os resultados serão gravados.')
+    parser.add_argument('--tabela', action='append', choices=FORMATOS_TABELA, default=[],
+                        help='Grava também a tabela longa de cada cenário (<nome>.parquet / '
+                             '<nome>.npz), com os metadados do cenário. Pode ser repetida.')
+    parser.add_argument('--tabela-combinada', default=None, metavar='ARQUIVO',
+                        help='Grava todos os cenários executados numa única tabela longa '
+                             '(.parquet ou .npz).')
+    parser.add_argument('--lang', choices=('pt', 'en'), default='pt',
+                        help='Idioma dos cabeçalhos da planilha.')
+    parser.add_argument('--engine', choices=ENGINES, default=None,
+                        help='Engine de simulação (padrão: a do cenário, ou "fused").')
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help='Como os lotes da engine batch são executados: "auto" (padrão) '
+                             'escolhe, por tamanho de amostra, o backend e o lote mais rápidos '
+                             'nesta máquina; os demais fixam o backend, com o lote padrão.')
+    parser.add_argument('--semente', type=int, default=None,
+                        help='Semente do gerador aleatório (padrão: a do cenário, ou 0).')
+    parser.add_argument('--numeros-comuns', action='store_true',
+                        help='Usa os mesmos sorteios em todos os níveis de rejeição e na curva '
+                             'real: curvas suaves e ordenadas com menos iterações.')
+    parser.add_argument('--grade', choices=GRADES, default=None,
+                        help='Espaçamento dos tamanhos de amostra: "linear" (de 5 em 5 até 60%% '
+                             'de N, padrão) ou "log" (60 pontos em escala logarítmica).')
+    parser.add_argument('--refinar', action='store_true',
+                        help='Acrescenta tamanhos de amostra onde as curvas variam muito entre '
+                             'pontos vizinhos, até 4 rodadas.')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Número de threads do Numba (padrão: todos os núcleos).')
+    parser.add_argument('--sem-cache', action='store_true',
+                        help='Não usa nem grava o cache de resultados nem o ajuste dos backends.')
+    parser.add_argument('--pasta-cache', default=None,
+                        help='Pasta do cache de resultados, dos checkpoints, do perfil de custo '
+                             'e do ajuste dos backends (padrão: cache do usuário).')
+    parser.add_argument('--sem-checkpoint', action='store_true',
+                        help='Não grava checkpoints; uma execução interrompida recomeça do zero.')
+    parser.add_argument('--estimar', action='store_true',
+                        help='Apenas exibe o tempo previsto de cada cenário, sem executar.')
+    parser.add_argument('--precompilar', action='store_true',
+                        help='Compila os kernels e calibra o modelo de custo no cache em disco, '
+                             'para que a primeira execução (CLI ou interface) não espere pelo JIT.')
+    parser.add_argument('--perfil', default=None, metavar='ARQUIVO',
+                        help='Registra onde o tempo é gasto (geração da base, tabelas do '
+                             'qui-quadrado, kernels, laços por lote, exportação) e grava um '
+                             'trace JSON para chrome://tracing ou Perfetto.')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Não exibe o progresso.')
+    return parser
+
+def _gravar_perfil(caminho, quiet):
+    caminho = instrumentacao.salvar(caminho)
+    if quiet:
+        return
+    resumo = instrumentacao.resumo()
+    print(f"Perfil gravado em {caminho}")
+    for etapa in resumo['etapas'][:8]:
+        print(f"  {etapa['categoria']:>12} {etapa['nome']:<28} {etapa['chamadas']:>7}x "
+              f"{_formatar_tempo(etapa['tempo_total'])}")
+    if resumo['utilizacao_kernels'] is not None:
+        print(f"  Utilização das threads nos kernels: {resumo['utilizacao_kernels']:.0%}")
+    if resumo['iteracoes_por_s_celulas']:
+        taxas = resumo['iteracoes_por_s_celulas']
+        print(f"  Iterações/s por célula: mín. {taxas['minimo']:,.0f}, "
+              f"mediana {taxas['mediana']:,.0f}, máx. {taxas['maximo']:,.0f}")
+
+def _progresso_terminal(nome, quiet, estimativa=None):
+    if quiet:
+        return None, None, None
+
+    # Sem modelo de custo (modo de três eixos, ou máquina ainda sem perfil),
+    # o tempo restante vem só do ritmo observado.
+    estimativa = estimativa or EstimativaAoVivo([0.0], 1)
+    estado = {'curva': 0, 'total': 0, 'amostra': None}
+
+    def escrever():
+        partes = []
+        if estado['amostra'] is not None:
+            partes.append(f"curva {estado['curva'] + 1}/{estado['total'] or '?'}"
+                          f" – amostra {estado['amostra']}")
+        else:
+            partes.append(f"{estimativa.fracao() * 100:.0f}%")
+        if estimativa.iteracoes_total:
+            partes.append(f"{estimativa.taxa():,.0f} it/s")
+        if estimativa.previsto > 0 or estimativa.fracao() > 0:
+            partes.append(f"restante {_formatar_tempo(estimativa.restante())}")
+        sys.stderr.write(f"\r[{nome}] " + " – ".join(partes) + "   ")
+        sys.stderr.flush()
+
+    def progresso(valor, total):
+        estimativa.tamanho(valor, total)
+        estado['amostra'] = f"{valor}/{total}"
+        escrever()
+
+    def progresso_total(concluido, total):
+        estado['curva'] = concluido
+        estado['total'] = total
+        estimativa.curva(concluido, total)
+
+    def progresso_iteracoes(feitas, total):
+        estimativa.iteracoes(feitas, total)
+        escrever()
+
+    return progresso, progresso_total, progresso_iteracoes
+
+def executar_catalogo_arquivo(cenario, args, cache=None):
+    nome = cenario['nome']
+    opcoes = cenario['catalogo'] if isinstance(cenario['catalogo'], dict) else {}
+    try:
+        dados_reais = {componente: carregar_dados_reais_txt(caminho, **cenario.get('leitura', {}))
+                       for componente, caminho in (cenario.get('dados_reais') or {}).items()}
+
+        def progresso_total(concluido, total):
+            if not args.quiet:
+                sys.stderr.write(f"\r[{nome}] combinação {concluido}/{total}   ")
+                sys.stderr.flush()
+
+        catalogo = executar_catalogo(
+            cenario, dados_reais=dados_reais, escalas=opcoes.get('escalas'),
+            classes=opcoes.get('classes'), componentes=opcoes.get('componentes'),
+            cache=cache, progress_total_callback=progresso_total)
+        caminho_csv, caminho_json = salvar_catalogo(catalogo, args.saida, nome, lang=args.lang)
+    except (ValueError, OSError, AttributeError, SimulacaoCancelada) as exc:
+        print(f"\n[{nome}] erro: {exc}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        sys.stderr.write("\n")
+    print(f"[{nome}] {len(catalogo['combinacoes'])} combinações, "
+          f"{catalogo['simulacoes']} simulações, "
+          f"{_formatar_tempo(catalogo['tempo_processamento'])}"
+          f" -> {caminho_csv}, {caminho_json}")
+    return 0
+
+def executar_eixos_arquivo(cenario, args):
+    nome = cenario['nome']
+    try:
+        dados_reais = None
+        if cenario.get('dados_reais'):
+            leitura = dict({'colunas': [0, 1, 2]}, **cenario.get('leitura', {}))
+            dados_reais = carregar_dados_reais_txt(cenario['dados_reais'], **leitura)
+        _, _, progresso_iteracoes = _progresso_terminal(nome, args.quiet)
+        resultado = executar_eixos(cenario, dados_reais=dados_reais,
+                                   progress_iteracoes_callback=progresso_iteracoes)
+        caminhos = salvar_resultado_eixos(resultado, args.saida, nome, lang=args.lang)
+    except (ValueError, OSError) as exc:
+        print(f"\n[{nome}] erro: {exc}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        sys.stderr.write("\n")
+    print(f"[{nome}] {_formatar_tempo(resultado['tempo_processamento'])}"
+          f" -> {len(caminhos)} arquivos em {args.saida}")
+    return 0
+
+def executar_lote_arquivo(cenario, args, cache=None):
+    nome = cenario['nome']
+    try:
+        conjuntos = listar_conjuntos(cenario['lote'], cenario.get('leitura'))
+        lote = executar_lote(cenario, conjuntos, risco=float(cenario.get('risco', 5.0)),
+                             cache=cache)
+        caminho_csv, caminho_json = salvar_lote(lote, args.saida, nome, lang=args.lang)
+    except (ValueError, OSError, KeyError) as exc:
+        print(f"[{nome}] erro: {exc}", file=sys.stderr)
+        return 1
+
+    aprovados = sum(c['aprovado'] for c in lote['conjuntos'])
+    print(f"[{nome}] {aprovados}/{len(lote['conjuntos'])} conjuntos aprovados, "
+          f"{_formatar_tempo(lote['tempo_processamento'])} -> {caminho_csv}, {caminho_json}")
+    return 0
+
+def executar_tamanho_arquivo(cenario, args):
+    nome = cenario['nome']
+    opcoes = cenario['tamanho_minimo']
+    opcoes = dict(opcoes) if isinstance(opcoes, dict) else {'risco': opcoes}
+    try:
+        dados_reais = None
+        if cenario.get('dados_reais'):
+            dados_reais = carregar_dados_reais_txt(cenario['dados_reais'],
+                                                   **cenario.get('leitura', {}))
+        resultado = tamanho_minimo(cenario, opcoes.pop('risco', 5.0), dados_reais=dados_reais,
+                                   **opcoes)
+        caminho_csv, caminho_json = salvar_tamanho_minimo(resultado, args.saida, nome,
+                                                          lang=args.lang)
+    except (ValueError, OSError, TypeError, SimulacaoCancelada) as exc:
+        print(f"[{nome}] erro: {exc}", file=sys.stderr)
+        return 1
+
+    print(f"[{nome}] {resultado['afirmacao']} {len(resultado['avaliacoes'])} tamanhos, "
+          f"{resultado['iteracoes_total']} iterações, "
+          f"{_formatar_tempo(resultado['tempo_processamento'])} -> {caminho_csv}, {caminho_json}")
+    return 0
+
+def executar_arquivo(caminho, args, cache=None, resultados=None):
+    falhas = 0
+    checkpoint = None
+    if not args.sem_checkpoint:
+        checkpoint = CheckpointSimulacao(
+            os.path.join(args.pasta_cache, 'checkpoints') if args.pasta_cache else None)
+    for cenario in carregar_cenarios(caminho):
+        nome = cenario['nome']
+        if args.engine:
+            cenario['engine'] = args.engine
+        if args.backend:
+            cenario['backend'] = args.backend
+        if args.semente is not None:
+            cenario['semente'] = args.semente
+        if args.numeros_comuns:
+            cenario['numeros_comuns'] = True
+        if args.grade or args.refinar:
+            grade = cenario.get('grade') or {}
+            grade = {'tipo': grade} if isinstance(grade, str) else dict(grade)
+            if args.grade:
+                grade['tipo'] = args.grade
+            if args.refinar:
+                grade['refinar'] = grade.get('refinar') or True
+            cenario['grade'] = grade
+        if cenario.get('catalogo'):
+            falhas += executar_catalogo_arquivo(cenario, args, cache)
+            continue
+        if cenario.get('lote'):
+            falhas += executar_lote_arquivo(cenario, args, cache)
+            continue
+        if cenario.get('eixos'):
+            falhas += executar_eixos_arquivo(cenario, args)
+            continue
+        if cenario.get('tamanho_minimo'):
+            falhas += executar_tamanho_arquivo(cenario, args)
+            continue
+        try:
+            cenario_norm = normalizar_cenario(cenario)
+            dados_reais = None
+            if cenario.get('dados_reais'):
+                dados_reais = carregar_dados_reais_txt(cenario['dados_reais'],
+                                                       **cenario.get('leitura', {}))
+
+            plano = planejar_simulacao(cenario_norm)
+            curvas_reais = int(dados_reais is not None)
+            modelo = modelo_padrao()
+            if args.estimar:
+                print(f"[{nome}] engine {cenario_norm['engine']}: tempo previsto "
+                      f"{_formatar_tempo(modelo.prever(cenario_norm, plano, curvas_reais))}")
+                continue
+
+            # A previsão só alimenta o progresso no terminal, e só quando a
+            # máquina já tem perfil: sem ele, o tempo restante vem do ritmo
+            # observado, sem calibrar antes da simulação.
+            estimativa = None
+            if not args.quiet and modelo.carregar(calibrar_ausente=False) is not None:
+                estimativa = EstimativaAoVivo(
+                    modelo.custos_por_tamanho(cenario_norm, plano, curvas_reais),
+                    len(plano['percentuais']) + curvas_reais)
+            progresso, progresso_total, progresso_iteracoes = _progresso_terminal(
+                nome, args.quiet, estimativa)
+            resultado = executar_simulacao(
+                cenario_norm, dados_reais=dados_reais, plano=plano,
+                progress_callback=progresso,
+                progress_total_callback=progresso_total,
+                progress_iteracoes_callback=progresso_iteracoes,
+                cache=cache, checkpoint=checkpoint)
+            retomado = resultado.get('checkpoint', {}).get('retomado')
+            if retomado and not args.quiet:
+                sys.stderr.write(f"\n[{nome}] execução retomada do checkpoint")
+            if resultado['cache']['celulas_reaproveitadas'] == 0 and not retomado:
+                modelo.registrar(cenario_norm, plano, resultado['tempo_processamento'],
+                                 curvas_reais)
+            caminho_csv, caminho_json = salvar_resultado(
+                resultado, args.saida, nome, lang=args.lang)
+            salvar_tabela_resultado(resultado, args.saida, nome, args.tabela)
+            if resultados is not None:
+                resultados[nome] = resultado
+        except (ValueError, OSError, SimulacaoCancelada) as exc:
+            falhas += 1
+            print(f"\n[{nome}] erro: {exc}", file=sys.stderr)
+            continue
+
+        if not args.quiet:
+            sys.stderr.write("\n")
+        refinamento = ""
+        if 'refinamento' in resultado:
+            refinamento = (f", {len(resultado['tamanhos_amostra'])} tamanhos"
+                           f" (+{resultado['refinamento']['tamanhos_acrescentados']} no refinamento)")
+        print(f"[{nome}] {_formatar_tempo(resultado['tempo_processamento'])}{refinamento}"
+              f" -> {caminho_csv}, {caminho_json}")
+    return falhas
+
+def main(argv=None):
+    parser = _criar_parser()
+    args = parser.parse_args(argv)
+    if not args.cenarios and not args.precompilar:
+        parser.error('informe ao menos um arquivo de cenário ou --precompilar.')
+    if args.threads:
+        numba.set_num_threads(args.threads)
+    if args.perfil:
+        instrumentacao.ativar()
+    # O perfil de custo e o ajuste dos backends seguem a pasta de cache; com
+    # --sem-cache, o ajuste vale só nesta execução.
+    configurar_modelo_padrao(args.pasta_cache)
+    configurar_ajuste_padrao(args.pasta_cache, persistente=not args.sem_cache)
+
+    if args.precompilar:
+        inicio = time.time()
+        aquecer_kernels()
+        modelo_padrao().carregar()
+        print(f"Kernels compilados em {_formatar_tempo(time.time() - inicio)}")
+        if not args.cenarios:
+            return 0
+
+    cache = None if args.sem_cache else CacheResultados(args.pasta_cache)
+
+    inicio = time.time()
+    falhas = 0
+    resultados = {}
+    try:
+        for caminho in args.cenarios:
+            if not os.path.exists(caminho):
+                print(f"Arquivo não encontrado: {caminho}", file=sys.stderr)
+                falhas += 1
+                continue
+            falhas += executar_arquivo(caminho, args, cache, resultados)
+    except KeyboardInterrupt:
+        print("\nInterrompido." + ("" if args.sem_checkpoint else
+                                    " O progresso foi salvo no checkpoint."), file=sys.stderr)
+        if args.perfil:
+            _gravar_perfil(args.perfil, args.quiet)
+        return 130
+
+    if args.tabela_combinada and resultados:
+        try:
+            print(f"Tabela combinada: {salvar_tabela(resultados, args.tabela_combinada)}")
+        except (ValueError, OSError) as exc:
+            print(f"Tabela combinada: erro: {exc}", file=sys.stderr)
+            falhas += 1
+
+    print(f"Tempo total: {_formatar_tempo(time.time() - inicio)}")
+    if args.perfil:
+        _gravar_perfil(args.perfil, args.quiet)
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
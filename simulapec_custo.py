@@ -0,0 +1,307 @@
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+from scipy.stats import chi2
+import numba
+
+from simulapec_cache import pasta_cache_padrao
+from simulapec_eixos import contar_rejeicoes_eixos
+from simulapec_engine import (
+    _simular_batch_numba,
+    _simular_batch_serial,
+    contar_rejeicoes_grade,
+    gerar_erros_normais,
+    simular_percentual_rejeicao_escalar,
+)
+from simulapec_exact import prm_norma_exata, prm_precisao_aproximada
+
+# Aumentar quando a forma do modelo ou a grade de calibração mudar.
+VERSAO_PERFIL = 1
+# Tamanhos de tabela base medidos: o custo por elemento cresce com a base
+# (acessos aleatórios fora da cache) e é interpolado em log(N) entre eles.
+BASES_CALIBRACAO = (1000, 1000000)
+# Peso das novas medições reais na correção de cada engine.
+PESO_CORRECAO = 0.3
+
+
+def identificacao_maquina() -> dict:
+    return {
+        'host': platform.node(),
+        'processador': platform.processor() or platform.machine(),
+        'nucleos': os.cpu_count(),
+        'threads': numba.get_num_threads(),
+        'numba': numba.__version__,
+        'versao': VERSAO_PERFIL,
+    }
+
+def aquecer_kernels():
+    # Compila (ou carrega do cache do Numba) todos os kernels com entradas
+    # mínimas, para que nenhuma medição inclua tempo de compilação. Também
+    # usada para preencher o cache em disco antes do primeiro uso.
+    base = gerar_erros_normais(50, 0)
+    simular_percentual_rejeicao_escalar(base, [5], 2, 1.0, 10.0, batch_size=2)
+    _simular_batch_serial(base, 5, 2, 1 / 1.6449, 1.0, 10.0, 1.0, True, 0, 0, 0, 1.0)
+    for aninhado in (False, True):
+        contar_rejeicoes_grade([base], [5, 10], 2, 1.0, [10.0], aninhado=aninhado)
+        contar_rejeicoes_grade([base], [5, 10], 2, 1.0, [10.0, 20.0], curvas_id=[0, 0],
+                               base_curva=[0, 0], aninhado=aninhado)
+    contar_rejeicoes_eixos([np.column_stack([base] * 3)], [5, 10], 2, [10.0], [[1.0, 1.0]])
+    prm_norma_exata(base, [5], 1.0, 10.0)
+    prm_precisao_aproximada(base, [5], 1.0, 10.0)
+
+def _medir(funcao, repeticoes=3):
+    melhor = math.inf
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+def _ajustar(trabalhos, tempos):
+    # tempo = a + b * trabalho, mínimos quadrados com a, b >= 0.
+    x = np.asarray(trabalhos, dtype=np.float64)
+    y = np.asarray(tempos, dtype=np.float64)
+    b, a = np.polyfit(x, y, 1)
+    if a < 0:
+        a, b = 0.0, float(np.sum(x * y) / np.sum(x * x))
+    return [max(float(a), 0.0), max(float(b), 1e-12)]
+
+def calibrar() -> dict:
+    aquecer_kernels()
+    coeficientes = {'batch': {}, 'fused': {}, 'nested': {}}
+
+    for n_base in BASES_CALIBRACAO:
+        base = gerar_erros_normais(n_base, 0)
+
+        pontos = []
+        for n in (5, 100, 1000):
+            qui = chi2.ppf(0.9, df=n - 1)
+            for lote in (20, 500):
+                tempo = _medir(lambda: _simular_batch_numba(
+                    base, n, lote, 1 / 1.6449, 1.0, 10.0, qui, True, 0, 0, 0, 1.0))
+                pontos.append((n * lote, tempo))
+        coeficientes['batch'][str(n_base)] = _ajustar(*zip(*pontos))
+
+        for engine, aninhado in (('fused', False), ('nested', True)):
+            pontos = []
+            for tamanhos in ([5, 50], [5, 100, 400]):
+                for n_iter in (40, 400):
+                    tempo = _medir(lambda: contar_rejeicoes_grade(
+                        [base], tamanhos, n_iter, 1.0, [10.0, 20.0], base_curva=[0, 0],
+                        aninhado=aninhado))
+                    trabalho = 2 * n_iter * (max(tamanhos) if aninhado else sum(tamanhos))
+                    pontos.append((trabalho, tempo))
+            coeficientes[engine][str(n_base)] = _ajustar(*zip(*pontos))
+
+    base = gerar_erros_normais(BASES_CALIBRACAO[0], 0)
+    tamanhos = list(range(5, 605, 5))
+    tempo = _medir(lambda: (prm_norma_exata(base, tamanhos, 1.0, 10.0),
+                            prm_precisao_aproximada(base, tamanhos, 1.0, 10.0)))
+    coeficientes['exact'] = {str(n): [0.0, tempo / len(tamanhos)] for n in BASES_CALIBRACAO}
+
+    return {
+        'maquina': identificacao_maquina(),
+        'coeficientes': coeficientes,
+        'correcao': {engine: 1.0 for engine in coeficientes if engine != 'batch'},
+        'calibrado_em': time.time(),
+    }
+
+
+class ModeloCusto:
+    def __init__(self, caminho=None, perfil=None):
+        self.caminho = caminho or os.path.join(pasta_cache_padrao(), 'perfil_custo.json')
+        self.perfil = perfil
+
+    def _chave(self):
+        return json.dumps(identificacao_maquina(), sort_keys=True)
+
+    def carregar(self, calibrar_ausente=True):
+        # Sem perfil gravado para esta máquina, calibra (o que leva alguns
+        # segundos) ou, com calibrar_ausente=False, retorna None.
+        if self.perfil is not None and self.perfil['maquina'] == identificacao_maquina():
+            return self.perfil
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                self.perfil = json.load(f).get(self._chave())
+        except (OSError, ValueError):
+            self.perfil = None
+        if self.perfil is None and calibrar_ausente:
+            self.perfil = calibrar()
+            self.salvar()
+        return self.perfil
+
+    def salvar(self):
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                perfis = json.load(f)
+        except (OSError, ValueError):
+            perfis = {}
+        perfis[self._chave()] = self.perfil
+
+        try:
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            descritor, temporario = tempfile.mkstemp(
+                dir=os.path.dirname(self.caminho) or '.', suffix='.tmp')
+            with os.fdopen(descritor, 'w', encoding='utf-8') as f:
+                json.dump(perfis, f, indent=2)
+            os.replace(temporario, self.caminho)
+        except OSError:
+            pass
+
+    def _coeficientes(self, engine, n_base):
+        pontos = self.carregar()['coeficientes'][engine]
+        menor, maior = BASES_CALIBRACAO
+        peso = np.clip(math.log(max(n_base, 1) / menor) / math.log(maior / menor), 0, 1)
+        a0, b0 = pontos[str(menor)]
+        a1, b1 = pontos[str(maior)]
+        return a0 + (a1 - a0) * peso, b0 * (b1 / b0) ** peso
+
+    def _custos_batch(self, cenario, plano, tamanhos, curvas):
+        # Com 'auto', as células de classe já decidida pelo ajuste
+        # (simulapec_backends) custam pela vazão medida do backend e do lote
+        # escolhidos; as demais, pelo kernel paralelo calibrado.
+        from simulapec_backends import ajuste_padrao
+
+        n_iter = cenario['n_iter']
+        backend = cenario.get('backend') or 'paralelo'
+        a, b = self._coeficientes('batch', cenario['N'])
+        lotes = math.ceil(n_iter / plano.get('batch_size', 100))
+        modelo = curvas * (lotes * a + b * tamanhos * n_iter)
+        if backend != 'auto':
+            return modelo * self._correcao(cenario)
+
+        ajuste = ajuste_padrao()
+        ajuste.carregar()
+        vazoes = [ajuste.vazao(int(n), cenario['N'], cenario['reposicao']) for n in tamanhos]
+        return np.array([curvas * n * n_iter / vazao if vazao else custo * self._correcao(cenario)
+                         for n, vazao, custo in zip(tamanhos, vazoes, modelo)])
+
+    def _chave_correcao(self, cenario):
+        # A engine batch tem uma correção por backend: cada um tem seu custo
+        # próprio. Com 'auto', as células não decididas usam o paralelo.
+        if cenario['engine'] != 'batch':
+            return cenario['engine']
+        backend = cenario.get('backend') or 'paralelo'
+        return f"batch:{'paralelo' if backend == 'auto' else backend}"
+
+    def _correcao(self, cenario):
+        return self.carregar()['correcao'].get(self._chave_correcao(cenario), 1.0)
+
+    def custos_por_tamanho(self, cenario, plano, curvas_reais=0) -> np.ndarray:
+        # Tempo previsto de cada tamanho de amostra, somado sobre as curvas.
+        engine = cenario['engine']
+        tamanhos = np.asarray(plano['tamanhos_amostra'], dtype=np.float64)
+        n_iter = cenario['n_iter']
+        n_sinteticas = len(plano['percentuais'])
+        n_base = cenario['N']
+
+        curvas = n_sinteticas + curvas_reais
+        if engine == 'batch':
+            return self._custos_batch(cenario, plano, tamanhos, curvas)
+        elif engine == 'fused':
+            a, b = self._coeficientes('fused', n_base)
+            custos = a / len(tamanhos) + b * curvas * n_iter * tamanhos
+        elif engine == 'nested':
+            # Uma amostra do maior tamanho por iteração, dividida entre os
+            # tamanhos pelos incrementos do prefixo.
+            a, b = self._coeficientes('nested', n_base)
+            incrementos = np.diff(np.concatenate([[0.0], np.sort(tamanhos)]))
+            custos = a / len(tamanhos) + b * curvas * n_iter * incrementos
+        else:
+            a, b = self._coeficientes('exact', n_base)
+            custos = np.full(len(tamanhos), a / len(tamanhos) + b * curvas)
+        return custos * self._correcao(cenario)
+
+    def prever(self, cenario, plano, curvas_reais=0) -> float:
+        return float(np.sum(self.custos_por_tamanho(cenario, plano, curvas_reais)))
+
+    def registrar(self, cenario, plano, tempo_real, curvas_reais=0):
+        # Ajusta a correção da engine (na batch, a do backend) pela razão
+        # entre o tempo medido e o previsto pelo modelo (média geométrica
+        # exponencial). Com o backend 'auto', o tempo depende do estado do
+        # ajuste, que já mede a vazão de cada classe: nada é corrigido.
+        # Sem perfil, não calibra só para registrar.
+        if cenario['engine'] == 'batch' and cenario.get('backend') == 'auto':
+            return
+        if self.carregar(calibrar_ausente=False) is None:
+            return
+        chave = self._chave_correcao(cenario)
+        previsto = self.prever(cenario, plano, curvas_reais)
+        correcao = self.perfil['correcao'].get(chave, 1.0)
+        if previsto <= 0 or tempo_real <= 0:
+            return
+        razao = tempo_real / (previsto / correcao)
+        self.perfil['correcao'][chave] = float(math.exp(
+            (1 - PESO_CORRECAO) * math.log(correcao) + PESO_CORRECAO * math.log(razao)))
+        self.salvar()
+
+
+class EstimativaAoVivo:
+    # Combina a previsão do modelo com o ritmo observado; o peso da
+    # observação cresce com a fração de trabalho concluída.
+    def __init__(self, custos_por_tamanho, n_curvas):
+        custos = np.asarray(custos_por_tamanho, dtype=np.float64)
+        self.previsto = float(custos.sum())
+        self.acumulado = np.concatenate([[0.0], np.cumsum(custos)]) / max(custos.sum(), 1e-12)
+        self.n_curvas = max(n_curvas, 1)
+        self.curvas = 0
+        self.dentro = 0.0
+        self.por_tamanho = False
+        self.iteracoes_feitas = 0
+        self.iteracoes_total = 0
+        self.inicio = time.time()
+
+    def tamanho(self, valor, total):
+        # valor é anunciado antes de calcular o tamanho valor - 1 (base 0).
+        self.por_tamanho = True
+        self.dentro = self.acumulado[min(max(valor - 1, 0), len(self.acumulado) - 1)]
+
+    def iteracoes(self, feitas, total):
+        # Progresso relatado de dentro dos kernels. Com fused/nested, que não
+        # anunciam tamanhos, é ele que mede a fração concluída.
+        self.iteracoes_feitas = feitas
+        self.iteracoes_total = total
+
+    def taxa(self):
+        return self.iteracoes_feitas / max(time.time() - self.inicio, 1e-9)
+
+    def curva(self, concluido, total):
+        self.n_curvas = max(total, 1)
+        self.curvas = concluido
+        self.dentro = 0.0
+
+    def fracao(self):
+        if not self.por_tamanho and self.iteracoes_total:
+            return min(self.iteracoes_feitas / self.iteracoes_total, 1.0)
+        return min((self.curvas + self.dentro) / self.n_curvas, 1.0)
+
+    def restante(self):
+        decorrido = time.time() - self.inicio
+        modelo = max(self.previsto - decorrido, 0.0)
+        fracao = self.fracao()
+        if fracao <= 0:
+            return modelo
+        observado = decorrido / fracao * (1 - fracao)
+        peso = min(1.0, fracao / 0.2) if self.previsto > 0 else 1.0
+        return peso * observado + (1 - peso) * modelo
+
+
+_modelo_padrao = None
+
+def modelo_padrao() -> ModeloCusto:
+    global _modelo_padrao
+    if _modelo_padrao is None:
+        _modelo_padrao = ModeloCusto()
+    return _modelo_padrao
+
+def configurar_modelo_padrao(pasta=None) -> ModeloCusto:
+    # Perfil usado pelas estimativas: perfil_custo.json na pasta de cache
+    # informada (padrão: pasta_cache_padrao()).
+    global _modelo_padrao
+    _modelo_padrao = ModeloCusto(os.path.join(pasta, 'perfil_custo.json') if pasta else None)
+    return _modelo_padrao
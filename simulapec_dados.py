@@ -0,0 +1,98 @@
+import io
+import re
+
+import numpy as np
+
+SEPARADORES = {'tab': '\t', 'virgula': ',', 'ponto-e-virgula': ';', 'espaco': None}
+
+
+def _numerico(campo):
+    try:
+        float(campo.strip('"\'').replace(',', '.'))
+        return True
+    except ValueError:
+        return False
+
+def _detectar_separador(linha):
+    for separador in ('\t', ';'):
+        if separador in linha:
+            return separador
+    # "1,5" sozinho é decimal com vírgula; "1.5,2.5" e "1,5,2" são colunas.
+    if ',' in linha and len(linha.split()) == 1 and ('.' in linha or linha.count(',') > 1):
+        return ','
+    return None
+
+def _resolver_colunas(colunas, nomes):
+    indices = []
+    for coluna in colunas:
+        if isinstance(coluna, str) and not coluna.isdigit():
+            if nomes is None or coluna not in nomes:
+                raise ValueError(f"Coluna não encontrada: {coluna}")
+            indices.append(nomes.index(coluna))
+        else:
+            indices.append(int(coluna))
+    return indices
+
+def carregar_tabela(caminho, colunas=None, separador=None, decimal=None, mmap=False):
+    # colunas: índices ou nomes do cabeçalho (detectado automaticamente). O
+    # texto é lido de uma vez pelo parser em C do NumPy; .npy pode ser
+    # mapeado em memória (mmap=True) sem cópia.
+    if str(caminho).lower().endswith('.npy'):
+        tabela = np.load(caminho, mmap_mode='r' if mmap else None)
+        tabela = tabela.reshape(len(tabela), -1)
+        if colunas is None:
+            return tabela
+        indices = _resolver_colunas(colunas, None)
+        return tabela if indices == list(range(tabela.shape[1])) else tabela[:, indices]
+
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    linhas = conteudo.decode('utf-8-sig', errors='replace').strip().splitlines()[:2]
+    if not linhas:
+        raise ValueError(f"Arquivo vazio: {caminho}")
+
+    campos = [c for c in re.split(r'[\t;,\s]+', linhas[0].strip()) if c]
+    tem_cabecalho = not all(map(_numerico, campos))
+    linha_dados = linhas[1] if tem_cabecalho and len(linhas) > 1 else linhas[0]
+
+    separador = SEPARADORES.get(separador, separador)
+    if separador is None:
+        separador = _detectar_separador(linha_dados.strip())
+    nomes = None
+    if tem_cabecalho:
+        nomes = [c.strip().strip('"\'') for c in (linhas[0].split(separador) if separador
+                                                  else linhas[0].split())]
+
+    if decimal is None:
+        decimal = ',' if separador != ',' and ',' in linha_dados else '.'
+    if decimal == ',':
+        if separador == ',':
+            raise ValueError("A vírgula não pode ser separador de colunas e decimal ao mesmo tempo.")
+        conteudo = conteudo.replace(b',', b'.')
+    if conteudo.startswith(b'\xef\xbb\xbf'):
+        conteudo = conteudo[3:]
+
+    indices = None if colunas is None else _resolver_colunas(colunas, nomes)
+    usecols = None if indices is None else sorted(set(indices))
+    tabela = np.loadtxt(io.BytesIO(conteudo), delimiter=separador, dtype=np.float64,
+                        skiprows=int(tem_cabecalho), usecols=usecols, ndmin=2,
+                        comments=None, encoding='utf-8')
+    if indices is not None and indices != usecols:
+        tabela = tabela[:, [usecols.index(i) for i in indices]]
+    return tabela
+
+def carregar_erros(caminho, colunas=None, referencia=None, separador=None,
+                   decimal=None, mmap=False) -> np.ndarray:
+    # colunas: coordenadas medidas (ou erros já calculados); com referencia,
+    # erro = medida - referência. Uma coluna resulta em array 1-D; várias, em (N, k).
+    colunas = [0] if colunas is None else list(colunas)
+    referencia = [] if referencia is None else list(referencia)
+    if referencia and len(referencia) != len(colunas):
+        raise ValueError("As colunas de referência devem corresponder às colunas medidas.")
+
+    tabela = carregar_tabela(caminho, colunas + referencia, separador, decimal, mmap)
+    k = len(colunas)
+    erros = tabela[:, :k] - tabela[:, k:] if referencia else tabela
+    if k == 1:
+        erros = erros[:, 0]
+    return np.ascontiguousarray(erros, dtype=np.float64)
@@ -0,0 +1,264 @@
+import time
+
+import numpy as np
+from scipy.stats import chi2
+import numba
+from numba import jit, prange
+
+from simulapec_engine import (
+    _ler_controle,
+    _verificar_sem_reposicao,
+    executar_monitorado,
+    fatores_escala,
+    gerar_erros_normais,
+    id_curva_cenario,
+    montar_resultado,
+    normalizar_cenario,
+    planejar_simulacao,
+    salvar_resultado,
+)
+from simulapec_instrumentacao import medido, medir
+from simulapec_rng import criar_tabela_permutacao, indice_amostra
+
+# E e N por eixo (PEC/√2), planimétrico (resultante XY), altimétrico (H) e
+# planialtimétrico (rejeita quando o planimétrico ou o altimétrico rejeita).
+COMPONENTES_EIXOS = ('E', 'N', 'planimetrico', 'altimetrico', 'planialtimetrico')
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _simular_eixos_numba(bases, n_bases, tamanhos, n_iter, n_blocos,
+                         percentuais_limite, qui_eixo, qui_plani, reposicao,
+                         semente, curvas_id, base_curva, escalas, deslocamentos,
+                         iter_inicio, controle, progresso):
+    # bases (linhas, pontos, 3) em unidades do PEC de cada componente; um
+    # único índice por posição é usado nos três eixos. tamanhos crescentes.
+    n_curvas = len(base_curva)
+    n_tamanhos = len(tamanhos)
+    n_max = tamanhos[n_tamanhos - 1]
+    n_tarefas = n_curvas * n_blocos
+    iter_por_bloco = (n_iter + n_blocos - 1) // n_blocos
+    contagens = np.zeros((n_tarefas, n_tamanhos, 5, 2), dtype=np.int64)
+
+    limite_eixo = 1.0 / np.sqrt(2.0)
+    variancia_alt = (1.0 / 1.6449) ** 2
+    variancia_eixo = variancia_alt / 2.0
+
+    for t in prange(n_tarefas):
+        c = t // n_blocos
+        b = t % n_blocos
+
+        linha = base_curva[c]
+        escala_p = escalas[c, 0]
+        escala_h = escalas[c, 1]
+        n_base = n_bases[linha]
+        percentual_limite = percentuais_limite[c]
+        inicio = iter_inicio + b * iter_por_bloco
+        fim = min(iter_inicio + n_iter, inicio + iter_por_bloco)
+        palavras = np.empty(4, dtype=np.uint64)
+        chaves, valores = criar_tabela_permutacao(n_max, reposicao)
+        curva_id = curvas_id[c]
+        soma = np.zeros(3)
+        soma_q = np.zeros(3)
+        acima = np.zeros(4, dtype=np.int64)
+
+        for i in range(inicio, fim):
+            if _ler_controle(controle) != 0:
+                break
+            if not reposicao:
+                chaves[:] = -1
+            soma[:] = 0.0
+            soma_q[:] = 0.0
+            acima[:] = 0
+            s = 0
+
+            for j in range(n_max):
+                idx = indice_amostra(j, i, curva_id, semente, n_base, palavras,
+                                     reposicao, chaves, valores)
+                e = bases[linha, idx, 0] * escala_p
+                n_ = bases[linha, idx, 1] * escala_p
+                h = bases[linha, idx, 2] * escala_h
+
+                d = e - deslocamentos[c, 0]
+                soma[0] += d
+                soma_q[0] += d * d
+                d = n_ - deslocamentos[c, 1]
+                soma[1] += d
+                soma_q[1] += d * d
+                d = h - deslocamentos[c, 2]
+                soma[2] += d
+                soma_q[2] += d * d
+
+                if np.abs(e) > limite_eixo:
+                    acima[0] += 1
+                if np.abs(n_) > limite_eixo:
+                    acima[1] += 1
+                if e * e + n_ * n_ > 1.0:
+                    acima[2] += 1
+                if np.abs(h) > 1.0:
+                    acima[3] += 1
+
+                while s < n_tamanhos and tamanhos[s] == j + 1:
+                    n = j + 1
+                    qui_e = (soma_q[0] - soma[0] * soma[0] / n) / variancia_eixo
+                    qui_n = (soma_q[1] - soma[1] * soma[1] / n) / variancia_eixo
+                    qui_h = (soma_q[2] - soma[2] * soma[2] / n) / variancia_alt
+
+                    rejeita_p_plani = qui_e + qui_n > qui_plani[c, s]
+                    rejeita_p_alt = qui_h > qui_eixo[c, s]
+                    rejeita_n_plani = (acima[2] / n) * 100 > percentual_limite
+                    rejeita_n_alt = (acima[3] / n) * 100 > percentual_limite
+
+                    if qui_e > qui_eixo[c, s]:
+                        contagens[t, s, 0, 0] += 1
+                    if qui_n > qui_eixo[c, s]:
+                        contagens[t, s, 1, 0] += 1
+                    if (acima[0] / n) * 100 > percentual_limite:
+                        contagens[t, s, 0, 1] += 1
+                    if (acima[1] / n) * 100 > percentual_limite:
+                        contagens[t, s, 1, 1] += 1
+                    if rejeita_p_plani:
+                        contagens[t, s, 2, 0] += 1
+                    if rejeita_n_plani:
+                        contagens[t, s, 2, 1] += 1
+                    if rejeita_p_alt:
+                        contagens[t, s, 3, 0] += 1
+                    if rejeita_n_alt:
+                        contagens[t, s, 3, 1] += 1
+                    if rejeita_p_plani or rejeita_p_alt:
+                        contagens[t, s, 4, 0] += 1
+                    if rejeita_n_plani or rejeita_n_alt:
+                        contagens[t, s, 4, 1] += 1
+                    s += 1
+            progresso[t, 0] += n_tamanhos
+
+    return contagens
+
+
+def normalizar_cenario_eixos(cenario: dict) -> dict:
+    normalizado = normalizar_cenario(cenario)
+    if normalizado['engine'] == 'exact' or normalizado['tolerancia'] is not None:
+        raise ValueError("O modo de três eixos requer Monte Carlo com número fixo de iterações.")
+    if (normalizado['grade'] or {}).get('refinar'):
+        raise ValueError("O modo de três eixos não aceita o refinamento automático da grade.")
+    normalizado['erro_admissivel_h'] = float(cenario.get('erro_admissivel_h')
+                                             or normalizado['erro_admissivel'])
+    if normalizado['erro_admissivel_h'] <= 0:
+        raise ValueError("Valores negativos ou nulos não são aceitos.")
+    return normalizado
+
+def normalizar_erros_eixos(dados_reais, cenario):
+    if dados_reais is None:
+        return None
+    erros = np.asarray(dados_reais, dtype=np.float64)
+    if erros.ndim != 2 or erros.shape[1] != 3:
+        raise ValueError("Os dados reais de três eixos devem ter as colunas E, N e H.")
+    pec = cenario['erro_admissivel']
+    return np.ascontiguousarray(erros / np.array([pec, pec, cenario['erro_admissivel_h']]))
+
+def planejar_eixos(cenario: dict) -> dict:
+    # O eixo E é a mesma tabela base do modo de um eixo.
+    plano = planejar_simulacao(cenario)
+    with medir('gerar_erros_normais', 'base', N=cenario['N'], eixos=2):
+        erros = np.column_stack([plano['erros_base'],
+                                 gerar_erros_normais(cenario['N'], cenario['semente'], 1),
+                                 gerar_erros_normais(cenario['N'], cenario['semente'], 2)])
+    percentuais = plano['percentuais']
+    plano['erros_eixos'] = erros
+    plano['fatores_eixos'] = np.column_stack([
+        fatores_escala(np.hypot(erros[:, 0], erros[:, 1]), 1.0, percentuais),
+        fatores_escala(erros[:, 2], 1.0, percentuais)]).tolist()
+    return plano
+
+def contar_rejeicoes_eixos(bases, tamanhos, n_iter, percentuais_limite, escalas,
+                           reposicao=True, semente=0, curvas_id=None,
+                           base_curva=None, iter_inicio=0,
+                           progress_iteracoes_callback=None, cancel_callback=None):
+    n_curvas = len(percentuais_limite)
+    tamanhos = np.asarray(tamanhos, dtype=np.int64)
+    ordem = np.argsort(tamanhos, kind='stable')
+    n_bases = np.array([len(b) for b in bases], dtype=np.int64)
+
+    matriz = np.zeros((len(bases), n_bases.max(), 3), dtype=np.float64)
+    for linha, base in enumerate(bases):
+        matriz[linha, :len(base)] = base
+
+    base_curva = np.arange(n_curvas) if base_curva is None else np.asarray(base_curva)
+    base_curva = base_curva.astype(np.int64)
+    escalas = np.asarray(escalas, dtype=np.float64).reshape(n_curvas, 2)
+    deslocamentos = np.array([bases[linha].mean(axis=0) for linha in base_curva])
+    deslocamentos = deslocamentos * escalas[:, [0, 0, 1]]
+
+    percentuais_limite = np.asarray(percentuais_limite, dtype=np.float64)
+    alfa = 1 - percentuais_limite[:, None] / 100
+    graus = tamanhos[ordem][None, :] - 1
+    with medir('qui_quadrado', 'qui_quadrado', celulas=2 * n_curvas * len(tamanhos)):
+        qui_eixo = chi2.ppf(alfa, df=graus)
+        qui_plani = chi2.ppf(alfa, df=2 * graus)
+
+    _verificar_sem_reposicao([bases[linha] for linha in set(base_curva.tolist())],
+                             tamanhos, reposicao)
+    if curvas_id is None:
+        curvas_id = np.arange(n_curvas)
+
+    n_blocos = max(1, min((n_iter + 15) // 16,
+                          -(-4 * numba.get_num_threads() // n_curvas)))
+    contagens = executar_monitorado(_simular_eixos_numba, (
+        matriz, n_bases, tamanhos[ordem], n_iter, n_blocos,
+        percentuais_limite, qui_eixo, qui_plani,
+        bool(reposicao),
+        np.int64(semente), np.asarray(curvas_id, dtype=np.int64),
+        base_curva, escalas, deslocamentos, np.int64(iter_inicio)),
+        n_curvas * n_blocos, n_curvas * len(tamanhos) * n_iter,
+        progress_iteracoes_callback, cancel_callback)
+    contagens = contagens.reshape(n_curvas, n_blocos, len(tamanhos), 5, 2).sum(axis=1)
+    contagens[:, ordem] = contagens.copy()
+    return contagens
+
+def executar_eixos(cenario: dict, dados_reais=None, plano=None,
+                   progress_iteracoes_callback=None, cancel_callback=None) -> dict:
+    cenario = normalizar_cenario_eixos(cenario)
+    if plano is None:
+        plano = planejar_eixos(cenario)
+    percentuais = plano['percentuais']
+    inicio = time.time()
+    base_real = normalizar_erros_eixos(dados_reais, cenario)
+
+    bases = [plano['erros_eixos']]
+    base_curva = [0] * len(percentuais)
+    escalas = list(plano['fatores_eixos'])
+    limites = list(percentuais)
+    curvas_id = [id_curva_cenario(cenario, perc) for perc in percentuais]
+    if base_real is not None:
+        bases.append(base_real)
+        base_curva.append(1)
+        escalas.append([1.0, 1.0])
+        limites.append(cenario['perc_base'])
+        curvas_id.append(id_curva_cenario(cenario))
+
+    contagens = contar_rejeicoes_eixos(
+        bases, plano['tamanhos_amostra'], cenario['n_iter'], limites, escalas,
+        reposicao=cenario['reposicao'],
+        semente=cenario['semente'], curvas_id=curvas_id, base_curva=base_curva,
+        progress_iteracoes_callback=progress_iteracoes_callback,
+        cancel_callback=cancel_callback)
+    prm = contagens / cenario['n_iter'] * 100
+    tempo = time.time() - inicio
+
+    iteracoes = [cenario['n_iter']] * len(plano['tamanhos_amostra'])
+    componentes = {}
+    for k, componente in enumerate(COMPONENTES_EIXOS):
+        registros = [{'precisao': prm[c, :, k, 0].tolist(), 'norma': prm[c, :, k, 1].tolist(),
+                      'iteracoes': iteracoes} for c in range(len(limites))]
+        registro_R = registros.pop() if base_real is not None else None
+        componentes[componente] = montar_resultado(cenario, plano, registros, registro_R, {
+            'componente': componente,
+            'tempo_processamento': tempo,
+        })
+        componentes[componente]['cenario']['erro_admissivel_h'] = cenario['erro_admissivel_h']
+
+    return {'componentes': componentes, 'tempo_processamento': tempo}
+
+@medido('exportacao')
+def salvar_resultado_eixos(resultado: dict, pasta_saida, nome, lang='pt'):
+    return [caminho for componente, parcial in resultado['componentes'].items()
+            for caminho in salvar_resultado(parcial, pasta_saida, f"{nome}_{componente}", lang=lang)]
@@ -0,0 +1,1480 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from multiprocessing import cpu_count
+from typing import List, Dict
+
+os.environ.setdefault('NUMBA_NUM_THREADS', str(cpu_count()))
+
+import numpy as np
+from scipy.stats import chi2, norm
+import numba
+from numba import jit, prange, types
+from numba.extending import intrinsic
+
+from simulapec_cache import CacheMemoria
+from simulapec_dados import carregar_erros
+from simulapec_exact import prm_norma_exata, prm_precisao_aproximada
+from simulapec_instrumentacao import acumular, ativo, celula_concluida, medido, medir
+from simulapec_rng import (
+    DOMINIO_BASE,
+    criar_tabela_permutacao,
+    indice_amostra,
+    indice_reamostragem,
+    indice_sem_reposicao,
+    indice_uniforme,
+    palavra_reamostragem,
+    philox4x32,
+    sortear_palavras,
+    uniforme_53,
+)
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+
+PARAMETROS_CENARIO = ('N', 'erro_admissivel', 'perc_base',
+                      'intervalo_acima', 'intervalo_abaixo', 'n_iter')
+PARAMETROS_OPCIONAIS = ('engine', 'reposicao', 'tolerancia', 'confianca', 'semente',
+                        'numeros_comuns', 'grade', 'backend')
+ENGINES = ('batch', 'fused', 'nested', 'exact')
+# Como cada lote da engine batch é executado (simulapec_backends); 'auto'
+# escolhe o backend e o lote pela vazão medida nesta máquina.
+BACKENDS = ('auto', 'paralelo', 'serial', 'numpy', 'processos')
+GRADES = ('linear', 'log')
+# Padrões da grade de tamanhos de amostra: número de pontos da grade
+# logarítmica e, no refinamento automático, a variação do PRM (pontos
+# percentuais) entre vizinhos que pede um ponto intermediário, o número de
+# rodadas e o total máximo de tamanhos.
+PONTOS_GRADE_LOG = 60
+REFINAMENTO_PADRAO = {'limiar': 5.0, 'rodadas': 4, 'pontos_max': 400}
+ID_CURVA_REAL = 0xFFFFFFFF
+# Com números aleatórios comuns, todas as curvas (inclusive a real) usam a
+# mesma sequência de reamostragem.
+ID_CURVA_COMUM = 0xFFFFFFFE
+# Intervalo (s) entre consultas ao cancelamento e relatos de progresso.
+INTERVALO_MONITOR = 0.1
+
+
+class SimulacaoCancelada(Exception):
+    pass
+
+
+@intrinsic
+def _ler_controle(typingctx, controle):
+    # Leitura atômica de controle[0]: o valor muda fora do kernel e uma
+    # leitura comum seria tirada do laço pelo LLVM.
+    def codegen(context, builder, assinatura, argumentos):
+        vetor = context.make_array(assinatura.args[0])(context, builder, argumentos[0])
+        return builder.load_atomic(vetor.data, 'monotonic', 8)
+    return types.int64(controle), codegen
+
+@jit(nopython=True, parallel=True, cache=True)
+def gerar_erros_normais(n_pontos, semente=0, eixo=0):
+    erros = np.zeros(n_pontos, dtype=np.float64)
+
+    for i in prange(n_pontos):
+        p0, p1, p2, p3 = philox4x32(i, eixo, 0, DOMINIO_BASE,
+                                    semente & 0xFFFFFFFF, semente >> 32)
+        u1 = 1.0 - uniforme_53(p0, p1)
+        u2 = uniforme_53(p2, p3)
+        erros[i] = np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+    return erros
+
+def fatores_escala(erros, erro_maximo, percentuais_acima):
+    n_pontos = len(erros)
+    # Posição crescente equivalente a sort(|erros|)[::-1][index_limite - 1].
+    posicoes = [(n_pontos - int(n_pontos * perc / 100)) % n_pontos
+                for perc in percentuais_acima]
+    erros_abs = np.partition(np.abs(erros), sorted(set(posicoes)))
+    return np.array([erro_maximo / erros_abs[pos] for pos in posicoes])
+
+def gerar_tabela_base(n_pontos, erro_maximo, percentual_acima, semente=0):
+    with medir('gerar_erros_normais', 'base', N=n_pontos):
+        erros = gerar_erros_normais(n_pontos, semente)
+    return erros * fatores_escala(erros, erro_maximo, [percentual_acima])[0]
+
+@jit(nopython=True, cache=True, inline='always')
+def _iteracao_batch(base, n, iteracao, erro_padrao_precisao, erro_admissivel,
+                    percentual_limite, qui_tabela, reposicao, semente, curva_id, escala,
+                    amostra, palavras, chaves, valores):
+    # Uma iteração da engine batch: (rejeita precisão, rejeita norma). Os
+    # buffers vêm de quem chama; sem reposição, a tabela é reiniciada aqui.
+    n_base = len(base)
+    # O teste de reposição fica fora do laço dos sorteios: dentro dele, só o
+    # pipeline paralelo do Numba o otimizava, e o kernel serial era ~6x
+    # mais lento.
+    if reposicao:
+        for j in range(n):
+            idx = indice_reamostragem(j, iteracao, curva_id, semente, n_base, palavras)
+            amostra[j] = base[idx] * escala
+    else:
+        chaves[:] = -1
+        for j in range(n):
+            palavra = palavra_reamostragem(j, iteracao, curva_id, semente, palavras)
+            idx = indice_sem_reposicao(j, palavra, n_base, chaves, valores)
+            amostra[j] = base[idx] * escala
+
+    # Laços explícitos, somando na mesma ordem de np.sum, sem arrays
+    # temporários (que só o pipeline paralelo eliminava).
+    soma = 0.0
+    for j in range(n):
+        soma += amostra[j]
+    media = soma / n
+    soma_desvios = 0.0
+    acima = 0
+    for j in range(n):
+        desvio = amostra[j] - media
+        soma_desvios += desvio * desvio
+        if abs(amostra[j]) > erro_admissivel:
+            acima += 1
+    desvio_sq = soma_desvios / (n - 1)
+
+    qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
+    rejeita_p = 1 if qui_calc > qui_tabela else 0
+
+    porcentagem_acima = (acima / n) * 100
+    rejeita_n = 1 if porcentagem_acima > percentual_limite else 0
+    return rejeita_p, rejeita_n
+
+@jit(nopython=True, parallel=True, cache=True)
+def _simular_batch_numba(base, n, n_iter, erro_padrao_precisao,
+                         erro_admissivel, percentual_limite, qui_tabela,
+                         reposicao=True, semente=0, curva_id=0, iter_inicio=0,
+                         escala=1.0):
+    rejeicoes_p = 0
+    rejeicoes_n = 0
+    for i in prange(n_iter):
+        amostra = np.empty(n, dtype=np.float64)
+        palavras = np.empty(4, dtype=np.uint64)
+        chaves, valores = criar_tabela_permutacao(n, reposicao)
+        rejeita_p, rejeita_n = _iteracao_batch(
+            base, n, iter_inicio + i, erro_padrao_precisao, erro_admissivel,
+            percentual_limite, qui_tabela, reposicao, semente, curva_id, escala,
+            amostra, palavras, chaves, valores)
+        rejeicoes_p += rejeita_p
+        rejeicoes_n += rejeita_n
+    return rejeicoes_p, rejeicoes_n
+
+@jit(nopython=True, cache=True)
+def _simular_batch_serial(base, n, n_iter, erro_padrao_precisao,
+                          erro_admissivel, percentual_limite, qui_tabela,
+                          reposicao=True, semente=0, curva_id=0, iter_inicio=0,
+                          escala=1.0):
+    # Mesmo lote numa única thread: sem o custo de despertar as threads do
+    # Numba, que domina em células pequenas. Os buffers são alocados uma
+    # vez por lote.
+    rejeicoes_p = 0
+    rejeicoes_n = 0
+    amostra = np.empty(n, dtype=np.float64)
+    palavras = np.empty(4, dtype=np.uint64)
+    chaves, valores = criar_tabela_permutacao(n, reposicao)
+    for i in range(n_iter):
+        rejeita_p, rejeita_n = _iteracao_batch(
+            base, n, iter_inicio + i, erro_padrao_precisao, erro_admissivel,
+            percentual_limite, qui_tabela, reposicao, semente, curva_id, escala,
+            amostra, palavras, chaves, valores)
+        rejeicoes_p += rejeita_p
+        rejeicoes_n += rejeita_n
+    return rejeicoes_p, rejeicoes_n
+
+
+def _verificar_sem_reposicao(bases, tamanhos, reposicao):
+    if not reposicao and max(tamanhos) > min(len(b) for b in bases):
+        raise ValueError("Sem reposição, o tamanho de amostra não pode exceder o número "
+                         "de pontos da base.")
+
+@medido('python')
+def simular_percentual_rejeicao_escalar(
+    base, tamanhos, n_iter, erro_admissivel, percentual_limite,
+    progress_callback=None, batch_size=100, reposicao=True,
+    cancel_callback=None, tolerancia=None, confianca=0.95, detalhes=None,
+    semente=0, curva_id=0, escala=1.0, progress_iteracoes_callback=None,
+    estado_inicial=None, registrar_celula=None, backend='paralelo'):
+    from simulapec_backends import ajuste_padrao, simular_lote
+
+    resultado_precisao = []
+    resultado_norma = []
+    iteracoes = []
+    contagens_p = []
+    contagens_n = []
+
+    _verificar_sem_reposicao([base], tamanhos, reposicao)
+    erro_padrao_precisao = erro_admissivel / 1.6449
+
+    with medir('qui_quadrado', 'qui_quadrado', celulas=len(tamanhos)):
+        qui_tabelas = {n: chi2.ppf(1 - (percentual_limite / 100), df=n - 1)
+                       for n in tamanhos}
+
+    total_iteracoes = len(tamanhos) * n_iter
+    ultimo_relato = time.time()
+    perfil = ativo()
+    ajuste = None
+    if backend == 'auto':
+        ajuste = ajuste_padrao()
+        ajuste.carregar()
+
+    for idx, n in enumerate(tamanhos):
+        if progress_callback:
+            progress_callback(idx + 1, len(tamanhos))
+
+        qui_tabela = qui_tabelas[n]
+
+        # Retomada de um checkpoint: as iterações seguem do ponto salvo, que
+        # é sempre uma fronteira de lote, e os sorteios dependem só do índice
+        # da iteração.
+        inicial = (estado_inicial or {}).get(n)
+        feitas = inicial['iteracoes'] if inicial else 0
+        rejeicoes_p_total = inicial['rejeicoes_precisao'] if inicial else 0
+        rejeicoes_n_total = inicial['rejeicoes_norma'] if inicial else 0
+        concluida = bool(inicial and inicial['concluida'])
+        feitas_antes, inicio_celula, tempos_kernel, lotes = feitas, time.perf_counter(), {}, 0
+
+        while feitas < n_iter and not concluida:
+            # Cada lote é curto (batch_size iterações): o cancelamento é
+            # atendido entre lotes, também no meio de um tamanho de amostra.
+            if cancel_callback is not None and cancel_callback():
+                raise SimulacaoCancelada()
+            if registrar_celula is not None and feitas:
+                registrar_celula(n, rejeicoes_p_total, rejeicoes_n_total, feitas, False)
+            if progress_iteracoes_callback and time.time() - ultimo_relato >= INTERVALO_MONITOR:
+                ultimo_relato = time.time()
+                progress_iteracoes_callback(idx * n_iter + feitas, total_iteracoes)
+
+            if ajuste is not None:
+                backend_lote, lote = ajuste.escolher(n, len(base), reposicao)
+            else:
+                backend_lote, lote = backend, batch_size
+            current_batch = min(lote, n_iter - feitas)
+            if tolerancia is not None:
+                # O critério de parada é avaliado a cada batch_size iterações,
+                # qualquer que seja o lote executado: o resultado não depende
+                # do ajuste.
+                current_batch = min(current_batch, batch_size - feitas % batch_size)
+
+            inicio_lote = time.perf_counter()
+            rejeicoes_p, rejeicoes_n = simular_lote(
+                backend_lote, base, n, current_batch, erro_padrao_precisao,
+                erro_admissivel, percentual_limite, qui_tabela, reposicao,
+                semente, curva_id, feitas, escala)
+            duracao_lote = time.perf_counter() - inicio_lote
+            if ajuste is not None:
+                ajuste.registrar(n, len(base), reposicao, backend_lote, lote,
+                                 current_batch, duracao_lote)
+            if perfil:
+                tempos_kernel[backend_lote] = tempos_kernel.get(backend_lote, 0.0) + duracao_lote
+                lotes += 1
+
+            rejeicoes_p_total += rejeicoes_p
+            rejeicoes_n_total += rejeicoes_n
+            feitas += current_batch
+
+            if tolerancia is not None and feitas < n_iter and feitas % batch_size == 0:
+                semiamplitude = max(
+                    np.diff(intervalo_wilson(rejeicoes_p_total, feitas, confianca))[0],
+                    np.diff(intervalo_wilson(rejeicoes_n_total, feitas, confianca))[0]) / 2
+                if semiamplitude <= tolerancia:
+                    break
+
+        if perfil and feitas > feitas_antes:
+            # O tempo fora do kernel é o do laço Python entre os lotes.
+            duracao = time.perf_counter() - inicio_celula
+            for backend_lote, tempo_kernel in tempos_kernel.items():
+                acumular(f"lote_{backend_lote}", tempo_kernel, chamadas=lotes)
+            acumular('laco_lotes', duracao - sum(tempos_kernel.values()), categoria='python')
+            celula_concluida('real' if curva_id == ID_CURVA_REAL else percentual_limite,
+                             n, feitas - feitas_antes, duracao)
+        if registrar_celula is not None:
+            registrar_celula(n, rejeicoes_p_total, rejeicoes_n_total, feitas, True)
+        resultado_precisao.append((rejeicoes_p_total / feitas) * 100)
+        resultado_norma.append((rejeicoes_n_total / feitas) * 100)
+        iteracoes.append(feitas)
+        contagens_p.append(rejeicoes_p_total)
+        contagens_n.append(rejeicoes_n_total)
+
+    if progress_iteracoes_callback:
+        progress_iteracoes_callback(total_iteracoes, total_iteracoes)
+
+    if detalhes is not None:
+        detalhes['iteracoes'] = iteracoes
+        detalhes['ic_precisao'] = _intervalos_lista(contagens_p, iteracoes, confianca)
+        detalhes['ic_norma'] = _intervalos_lista(contagens_n, iteracoes, confianca)
+
+    return resultado_precisao, resultado_norma
+
+def intervalo_wilson(rejeicoes, iteracoes, confianca=0.95):
+    z = norm.ppf(0.5 + confianca / 2)
+    k = np.asarray(rejeicoes, dtype=np.float64)
+    n = np.asarray(iteracoes, dtype=np.float64)
+
+    p = k / n
+    denominador = 1 + z ** 2 / n
+    centro = (p + z ** 2 / (2 * n)) / denominador
+    semiamplitude = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominador
+    return (centro - semiamplitude) * 100, (centro + semiamplitude) * 100
+
+def _intervalos_lista(rejeicoes, iteracoes, confianca):
+    inferior, superior = intervalo_wilson(rejeicoes, iteracoes, confianca)
+    return [(round(float(lo), 4), round(float(hi), 4))
+            for lo, hi in zip(np.atleast_1d(inferior), np.atleast_1d(superior))]
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _simular_grade_numba(bases, n_bases, tamanhos, n_iter, n_blocos,
+                         erro_padrao_precisao, erro_admissivel,
+                         percentuais_limite, qui_tabelas, reposicao,
+                         semente, curvas_id, base_curva, escalas, iter_inicio,
+                         controle, progresso):
+    n_curvas = len(base_curva)
+    n_tamanhos = len(tamanhos)
+    tarefas_por_curva = n_tamanhos * n_blocos
+    n_tarefas = n_curvas * tarefas_por_curva
+    iter_por_bloco = (n_iter + n_blocos - 1) // n_blocos
+    contagens = np.zeros((n_tarefas, 2), dtype=np.int64)
+
+    for t in prange(n_tarefas):
+        c = t // tarefas_por_curva
+        s = (t % tarefas_por_curva) // n_blocos
+        b = t % n_blocos
+
+        n = tamanhos[s]
+        linha = base_curva[c]
+        escala = escalas[c]
+        n_base = n_bases[linha]
+        qui_tabela = qui_tabelas[c, s]
+        percentual_limite = percentuais_limite[c]
+        inicio = iter_inicio + b * iter_por_bloco
+        fim = min(iter_inicio + n_iter, inicio + iter_por_bloco)
+
+        amostra = np.empty(n, dtype=np.float64)
+        palavras = np.empty(4, dtype=np.uint64)
+        chaves, valores = criar_tabela_permutacao(n, reposicao)
+        curva_id = curvas_id[c]
+        rejeicoes_p = 0
+        rejeicoes_n = 0
+
+        for i in range(inicio, fim):
+            if _ler_controle(controle) != 0:
+                break
+            if not reposicao:
+                chaves[:] = -1
+            for j in range(n):
+                amostra[j] = bases[linha, indice_amostra(
+                    j, i, curva_id, semente, n_base, palavras,
+                    reposicao, chaves, valores)] * escala
+
+            media = np.sum(amostra) / n
+            desvio_sq = np.sum((amostra - media) ** 2) / (n - 1)
+
+            qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
+            if qui_calc > qui_tabela:
+                rejeicoes_p += 1
+
+            acima = np.sum(np.abs(amostra) > erro_admissivel)
+            porcentagem_acima = (acima / n) * 100
+            if porcentagem_acima > percentual_limite:
+                rejeicoes_n += 1
+            progresso[t, 0] += 1
+
+        contagens[t, 0] = rejeicoes_p
+        contagens[t, 1] = rejeicoes_n
+
+    return contagens
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _simular_aninhado_numba(bases, n_bases, tamanhos, n_iter, n_blocos,
+                            erro_padrao_precisao, erro_admissivel,
+                            percentuais_limite, qui_tabelas, reposicao,
+                            semente, curvas_id, base_curva, escalas, deslocamentos,
+                            iter_inicio, controle, progresso):
+    # tamanhos em ordem crescente: uma amostra de tamanho max(tamanhos) por
+    # iteração, e cada n da grade é lido das somas acumuladas do prefixo.
+    n_curvas = len(base_curva)
+    n_tamanhos = len(tamanhos)
+    n_max = tamanhos[n_tamanhos - 1]
+    n_tarefas = n_curvas * n_blocos
+    iter_por_bloco = (n_iter + n_blocos - 1) // n_blocos
+    contagens = np.zeros((n_tarefas, n_tamanhos, 2), dtype=np.int64)
+
+    for t in prange(n_tarefas):
+        c = t // n_blocos
+        b = t % n_blocos
+
+        linha = base_curva[c]
+        escala = escalas[c]
+        n_base = n_bases[linha]
+        percentual_limite = percentuais_limite[c]
+        deslocamento = deslocamentos[c]
+        inicio = iter_inicio + b * iter_por_bloco
+        fim = min(iter_inicio + n_iter, inicio + iter_por_bloco)
+        palavras = np.empty(4, dtype=np.uint64)
+        chaves, valores = criar_tabela_permutacao(n_max, reposicao)
+        curva_id = curvas_id[c]
+
+        for i in range(inicio, fim):
+            if _ler_controle(controle) != 0:
+                break
+            if not reposicao:
+                chaves[:] = -1
+            soma = 0.0
+            soma_q = 0.0
+            acima = 0
+            s = 0
+
+            for j in range(n_max):
+                x = bases[linha, indice_amostra(
+                    j, i, curva_id, semente, n_base, palavras,
+                    reposicao, chaves, valores)] * escala
+                d = x - deslocamento
+                soma += d
+                soma_q += d * d
+                if np.abs(x) > erro_admissivel:
+                    acima += 1
+
+                while s < n_tamanhos and tamanhos[s] == j + 1:
+                    n = j + 1
+                    desvio_sq = (soma_q - soma * soma / n) / (n - 1)
+                    qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
+                    if qui_calc > qui_tabelas[c, s]:
+                        contagens[t, s, 0] += 1
+
+                    porcentagem_acima = (acima / n) * 100
+                    if porcentagem_acima > percentual_limite:
+                        contagens[t, s, 1] += 1
+                    s += 1
+            progresso[t, 0] += n_tamanhos
+
+    return contagens
+
+@jit(nopython=True, cache=True, inline='always')
+def _indices_comuns(palavras, n, n_base, reposicao, chaves, valores, indices):
+    # Índices de uma base a partir dos sorteios comuns da iteração.
+    if reposicao:
+        for j in range(n):
+            indices[j] = indice_uniforme(palavras[j], n_base)
+    else:
+        chaves[:] = -1
+        for j in range(n):
+            indices[j] = indice_sem_reposicao(j, palavras[j], n_base, chaves, valores)
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _simular_grade_comum_numba(bases, n_bases, tamanhos, n_iter, n_blocos,
+                               erro_padrao_precisao, erro_admissivel,
+                               percentuais_limite, qui_tabelas, reposicao,
+                               semente, curva_id, base_curva, escalas, iter_inicio,
+                               controle, progresso):
+    # Todas as curvas com a mesma sequência: os sorteios de cada iteração são
+    # gerados uma vez por tarefa (tamanho × bloco) e aplicados a cada base.
+    # As contagens são idênticas às de _simular_grade_numba com curvas_id
+    # iguais.
+    n_curvas = len(base_curva)
+    n_tarefas = len(tamanhos) * n_blocos
+    iter_por_bloco = (n_iter + n_blocos - 1) // n_blocos
+    contagens = np.zeros((n_curvas, n_tarefas, 2), dtype=np.int64)
+
+    for t in prange(n_tarefas):
+        s = t // n_blocos
+        b = t % n_blocos
+        n = tamanhos[s]
+        inicio = iter_inicio + b * iter_por_bloco
+        fim = min(iter_inicio + n_iter, inicio + iter_por_bloco)
+
+        amostra = np.empty(n, dtype=np.float64)
+        palavras = np.empty(n, dtype=np.uint64)
+        indices = np.empty(n, dtype=np.int64)
+        chaves, valores = criar_tabela_permutacao(n, reposicao)
+
+        for i in range(inicio, fim):
+            if _ler_controle(controle) != 0:
+                break
+            sortear_palavras(n, i, curva_id, semente, palavras)
+            linha_indices = -1
+
+            for c in range(n_curvas):
+                linha = base_curva[c]
+                escala = escalas[c]
+                if linha != linha_indices:
+                    _indices_comuns(palavras, n, n_bases[linha], reposicao,
+                                    chaves, valores, indices)
+                    linha_indices = linha
+                for j in range(n):
+                    amostra[j] = bases[linha, indices[j]] * escala
+
+                media = np.sum(amostra) / n
+                desvio_sq = np.sum((amostra - media) ** 2) / (n - 1)
+
+                qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
+                if qui_calc > qui_tabelas[c, s]:
+                    contagens[c, t, 0] += 1
+
+                acima = np.sum(np.abs(amostra) > erro_admissivel)
+                porcentagem_acima = (acima / n) * 100
+                if porcentagem_acima > percentuais_limite[c]:
+                    contagens[c, t, 1] += 1
+            progresso[t, 0] += n_curvas
+
+    return contagens
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _simular_aninhado_comum_numba(bases, n_bases, tamanhos, n_iter, n_blocos,
+                                  erro_padrao_precisao, erro_admissivel,
+                                  percentuais_limite, qui_tabelas, reposicao,
+                                  semente, curva_id, base_curva, escalas, deslocamentos,
+                                  iter_inicio, controle, progresso):
+    # Versão de _simular_aninhado_numba com uma só sequência para todas as
+    # curvas: cada tarefa é um bloco de iterações e percorre as curvas com
+    # os mesmos sorteios.
+    n_curvas = len(base_curva)
+    n_tamanhos = len(tamanhos)
+    n_max = tamanhos[n_tamanhos - 1]
+    iter_por_bloco = (n_iter + n_blocos - 1) // n_blocos
+    contagens = np.zeros((n_curvas, n_blocos, n_tamanhos, 2), dtype=np.int64)
+
+    for b in prange(n_blocos):
+        inicio = iter_inicio + b * iter_por_bloco
+        fim = min(iter_inicio + n_iter, inicio + iter_por_bloco)
+        palavras = np.empty(n_max, dtype=np.uint64)
+        indices = np.empty(n_max, dtype=np.int64)
+        chaves, valores = criar_tabela_permutacao(n_max, reposicao)
+
+        for i in range(inicio, fim):
+            if _ler_controle(controle) != 0:
+                break
+            sortear_palavras(n_max, i, curva_id, semente, palavras)
+            linha_indices = -1
+
+            for c in range(n_curvas):
+                linha = base_curva[c]
+                escala = escalas[c]
+                deslocamento = deslocamentos[c]
+                if linha != linha_indices:
+                    _indices_comuns(palavras, n_max, n_bases[linha], reposicao,
+                                    chaves, valores, indices)
+                    linha_indices = linha
+                soma = 0.0
+                soma_q = 0.0
+                acima = 0
+                s = 0
+
+                for j in range(n_max):
+                    x = bases[linha, indices[j]] * escala
+                    d = x - deslocamento
+                    soma += d
+                    soma_q += d * d
+                    if np.abs(x) > erro_admissivel:
+                        acima += 1
+
+                    while s < n_tamanhos and tamanhos[s] == j + 1:
+                        n = j + 1
+                        desvio_sq = (soma_q - soma * soma / n) / (n - 1)
+                        qui_calc = ((n - 1) * desvio_sq) / (erro_padrao_precisao ** 2)
+                        if qui_calc > qui_tabelas[c, s]:
+                            contagens[c, b, s, 0] += 1
+
+                        porcentagem_acima = (acima / n) * 100
+                        if porcentagem_acima > percentuais_limite[c]:
+                            contagens[c, b, s, 1] += 1
+                        s += 1
+            progresso[b, 0] += n_curvas * n_tamanhos
+
+    return contagens
+
+
+def executar_monitorado(kernel, argumentos, n_tarefas, total,
+                        progress_iteracoes_callback=None, cancel_callback=None):
+    # Os kernels leem controle[0] (pedido de cancelamento) a cada iteração e
+    # acumulam em progresso[t, 0] as iterações (por célula) de cada tarefa;
+    # cada tarefa ocupa sua própria linha de cache. Com callbacks, o kernel
+    # (nogil) roda numa thread auxiliar e esta thread os consulta a cada
+    # INTERVALO_MONITOR segundos.
+    controle = np.zeros(1, dtype=np.int64)
+    progresso = np.zeros((n_tarefas, 8), dtype=np.int64)
+    with medir(getattr(kernel, '__name__', 'kernel'), 'kernel', tarefas=n_tarefas) as medicao:
+        try:
+            return _lancar_monitorado(kernel, argumentos, controle, progresso, total,
+                                      progress_iteracoes_callback, cancel_callback)
+        finally:
+            medicao['iteracoes'] = int(progresso[:, 0].sum())
+
+def _lancar_monitorado(kernel, argumentos, controle, progresso, total,
+                       progress_iteracoes_callback, cancel_callback):
+    if progress_iteracoes_callback is None and cancel_callback is None:
+        return kernel(*argumentos, controle, progresso)
+
+    # O número de threads do Numba vale por thread: repassa o desta.
+    n_threads = numba.get_num_threads()
+    saida = {}
+
+    def _executar():
+        numba.set_num_threads(n_threads)
+        try:
+            saida['resultado'] = kernel(*argumentos, controle, progresso)
+        except Exception as exc:
+            saida['erro'] = exc
+
+    thread = threading.Thread(target=_executar, daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(INTERVALO_MONITOR)
+            if cancel_callback is not None and cancel_callback():
+                controle[0] = 1
+            if progress_iteracoes_callback:
+                progress_iteracoes_callback(int(progresso[:, 0].sum()), total)
+    except BaseException:
+        controle[0] = 1
+        thread.join()
+        raise
+
+    if 'erro' in saida:
+        raise saida['erro']
+    if controle[0] and progresso[:, 0].sum() < total:
+        raise SimulacaoCancelada()
+    return saida['resultado']
+
+def contar_rejeicoes_grade(bases, tamanhos, n_iter, erro_admissivel,
+                           percentuais_limite, reposicao=True,
+                           semente=0, curvas_id=None, aninhado=False,
+                           base_curva=None, escalas=None, iter_inicio=0,
+                           progress_iteracoes_callback=None, cancel_callback=None):
+    n_curvas = len(percentuais_limite)
+    tamanhos = np.asarray(tamanhos, dtype=np.int64)
+    n_bases = np.array([len(b) for b in bases], dtype=np.int64)
+    dtype = np.float32 if all(b.dtype == np.float32 for b in bases) else np.float64
+
+    if len(bases) == 1:
+        matriz = np.asarray(bases[0], dtype=dtype)[None, :]
+    else:
+        matriz = np.zeros((len(bases), n_bases.max()), dtype=dtype)
+        for linha, base in enumerate(bases):
+            matriz[linha, :len(base)] = base
+
+    base_curva = np.arange(n_curvas) if base_curva is None else np.asarray(base_curva)
+    base_curva = base_curva.astype(np.int64)
+    escalas = np.ones(n_curvas) if escalas is None else np.asarray(escalas, dtype=np.float64)
+    _verificar_sem_reposicao([bases[linha] for linha in set(base_curva.tolist())],
+                             tamanhos, reposicao)
+
+    erro_padrao_precisao = erro_admissivel / 1.6449
+    percentuais_limite = np.asarray(percentuais_limite, dtype=np.float64)
+    with medir('qui_quadrado', 'qui_quadrado', celulas=n_curvas * len(tamanhos)):
+        qui_tabelas = chi2.ppf(1 - (percentuais_limite[:, None] / 100),
+                               df=tamanhos[None, :] - 1)
+
+    if curvas_id is None:
+        curvas_id = np.arange(n_curvas)
+    monitor = {'total': n_curvas * len(tamanhos) * n_iter,
+               'progress_iteracoes_callback': progress_iteracoes_callback,
+               'cancel_callback': cancel_callback}
+    # Curvas com o mesmo identificador sorteiam os mesmos índices: os
+    # kernels "comuns" geram cada sorteio uma única vez.
+    comum = n_curvas > 1 and len(set(np.asarray(curvas_id).tolist())) == 1
+
+    if aninhado and comum:
+        ordem = np.argsort(tamanhos, kind='stable')
+        n_blocos = max(1, min((n_iter + 15) // 16, 4 * numba.get_num_threads()))
+        contagens = executar_monitorado(_simular_aninhado_comum_numba, (
+            matriz, n_bases, tamanhos[ordem], n_iter, n_blocos,
+            erro_padrao_precisao, erro_admissivel,
+            percentuais_limite, np.ascontiguousarray(qui_tabelas[:, ordem]),
+            bool(reposicao),
+            np.int64(semente), np.int64(curvas_id[0]),
+            base_curva, escalas,
+            np.array([np.mean(bases[linha], dtype=np.float64) for linha in base_curva]) * escalas,
+            np.int64(iter_inicio)), n_blocos, **monitor)
+        contagens = contagens.sum(axis=1)
+        contagens[:, ordem] = contagens.copy()
+        return contagens
+
+    if aninhado:
+        ordem = np.argsort(tamanhos, kind='stable')
+        n_blocos = max(1, min((n_iter + 15) // 16,
+                              -(-4 * numba.get_num_threads() // n_curvas)))
+        contagens = executar_monitorado(_simular_aninhado_numba, (
+            matriz, n_bases, tamanhos[ordem], n_iter, n_blocos,
+            erro_padrao_precisao, erro_admissivel,
+            percentuais_limite, np.ascontiguousarray(qui_tabelas[:, ordem]),
+            bool(reposicao),
+            np.int64(semente), np.asarray(curvas_id, dtype=np.int64),
+            base_curva, escalas,
+            np.array([np.mean(bases[linha], dtype=np.float64) for linha in base_curva]) * escalas,
+            np.int64(iter_inicio)), n_curvas * n_blocos, **monitor)
+        contagens = contagens.reshape(n_curvas, n_blocos, len(tamanhos), 2).sum(axis=1)
+        contagens[:, ordem] = contagens.copy()
+        return contagens
+
+    if comum:
+        n_blocos = max(1, min((n_iter + 63) // 64,
+                              -(-4 * numba.get_num_threads() // len(tamanhos))))
+        contagens = executar_monitorado(_simular_grade_comum_numba, (
+            matriz, n_bases, tamanhos, n_iter, n_blocos,
+            erro_padrao_precisao, erro_admissivel,
+            percentuais_limite, qui_tabelas,
+            bool(reposicao),
+            np.int64(semente), np.int64(curvas_id[0]),
+            base_curva, escalas, np.int64(iter_inicio)), len(tamanhos) * n_blocos, **monitor)
+        return contagens.reshape(n_curvas, len(tamanhos), n_blocos, 2).sum(axis=2)
+
+    n_tarefas_grade = n_curvas * len(tamanhos)
+    n_blocos = max(1, min((n_iter + 63) // 64,
+                          -(-4 * numba.get_num_threads() // n_tarefas_grade)))
+
+    contagens = executar_monitorado(_simular_grade_numba, (
+        matriz, n_bases, tamanhos, n_iter, n_blocos,
+        erro_padrao_precisao, erro_admissivel,
+        percentuais_limite, qui_tabelas,
+        bool(reposicao),
+        np.int64(semente), np.asarray(curvas_id, dtype=np.int64),
+        base_curva, escalas, np.int64(iter_inicio)), n_tarefas_grade * n_blocos, **monitor)
+    return contagens.reshape(n_curvas, len(tamanhos), n_blocos, 2).sum(axis=2)
+
+def simular_grade_rejeicao(bases, tamanhos, n_iter, erro_admissivel,
+                           percentuais_limite, **kwargs):
+    contagens = contar_rejeicoes_grade(bases, tamanhos, n_iter, erro_admissivel,
+                                       percentuais_limite, **kwargs)
+    prm = contagens / n_iter * 100
+    return prm[:, :, 0], prm[:, :, 1]
+
+@medido('exportacao')
+def _salvar_planilha_csv(
+    caminho_arquivo: str,
+    percentuais: list[float],
+    amostras: list[int],
+    prm_precisao_list: List[Dict[int, float]],
+    prm_norma_list: List[Dict[int, float]],
+    dados_reais: bool = False,
+    prm_precisao_real: dict[int, float] | None = None,
+    prm_norma_real: dict[int, float] | None = None,
+    lang: str = 'pt'
+) -> None:
+
+    if lang == 'en':
+        header_sample = "Sample Size"
+        header_precision = "PRM(%) - Accuracy"
+        header_standard = "PRM(%) - Country's Standard"
+        header_real_section = "R-10"
+    else:
+        header_sample = "Tamanho da amostra"
+        header_precision = "PRM(%) - Precisão"
+        header_standard = "PRM(%) - Norma"
+        header_real_section = "R-10"
+
+    with open(caminho_arquivo, 'w', encoding='utf-8', newline='') as f:
+        for p in percentuais:
+            f.write(f"\n=== {p}% ===\n")
+            f.write(f"{header_sample},{header_precision},{header_standard}\n")
+
+        for n in amostras:
+            row_values = [str(n)]
+            for i, _perc in enumerate(percentuais):
+                dic_prec = prm_precisao_list[i]
+                dic_norm = prm_norma_list[i]
+                row_values.append(f"{dic_prec.get(n, 0.0):.2f}")
+                row_values.append(f"{dic_norm.get(n, 0.0):.2f}")
+            f.write(",".join(row_values) + "\n")
+
+        if dados_reais and prm_precisao_real is not None and prm_norma_real is not None:
+            f.write(f"\n=== {header_real_section} ===\n")
+            f.write(f"{header_sample},{header_precision},{header_standard}\n")
+            for n in amostras:
+                prec_val = prm_precisao_real.get(n, 0.0)
+                norm_val = prm_norma_real.get(n, 0.0)
+                f.write(f"{n},{prec_val:.2f},{norm_val:.2f}\n")
+
+def _formatar_tempo(segundos):
+    if segundos < 60:
+        return f"{segundos:.2f} s"
+
+    horas = int(segundos // 3600)
+    minutos = int((segundos % 3600) // 60)
+    seg_rest = segundos % 60
+
+    partes = []
+    if horas > 0:
+        partes.append(f"{horas}h")
+    if minutos > 0:
+        partes.append(f"{minutos}m")
+    partes.append(f"{seg_rest:.2f}s")
+
+    return " ".join(partes)
+
+
+def gerar_tamanhos_amostra(N, grade=None):
+    # grade normalizada por normalizar_grade; None é a grade original, de
+    # 5 em 5 até 60% de N.
+    if grade is None:
+        return list(range(5, int(N * 0.6) + 1, 5))
+    if grade['tipo'] == 'log':
+        pontos = np.geomspace(grade['inicio'], grade['fim'], grade['pontos'])
+        return np.unique(np.rint(pontos).astype(np.int64)).tolist()
+    return list(range(grade['inicio'], grade['fim'] + 1, grade['passo']))
+
+def normalizar_grade(grade, N):
+    # None, "linear", "log" ou um dicionário com tipo, inicio, fim (padrão
+    # 60% de N), passo (linear), pontos (log) e refinar (true ou um
+    # dicionário com limiar, rodadas e pontos_max).
+    if grade in (None, '', 'linear'):
+        return None
+    grade = {'tipo': grade} if isinstance(grade, str) else dict(grade)
+    tipo = grade.get('tipo', 'linear')
+    if tipo not in GRADES:
+        raise ValueError(f"Grade desconhecida: {tipo} (opções: {', '.join(GRADES)})")
+
+    normalizada = {'tipo': tipo,
+                   'inicio': int(grade.get('inicio') or 5),
+                   'fim': int(grade.get('fim') or N * 0.6)}
+    if tipo == 'log':
+        normalizada['pontos'] = int(grade.get('pontos') or PONTOS_GRADE_LOG)
+    else:
+        normalizada['passo'] = int(grade.get('passo') or 5)
+    if normalizada['inicio'] < 2 or normalizada['fim'] < normalizada['inicio'] or \
+            normalizada.get('pontos', 2) < 2 or normalizada.get('passo', 1) < 1:
+        raise ValueError("Grade de tamanhos de amostra inválida.")
+
+    refinar = grade.get('refinar')
+    if refinar:
+        refinar = dict(REFINAMENTO_PADRAO, **(refinar if isinstance(refinar, dict) else {}))
+        refinar = {'limiar': float(refinar['limiar']), 'rodadas': int(refinar['rodadas']),
+                   'pontos_max': int(refinar['pontos_max'])}
+        if refinar['limiar'] <= 0 or refinar['rodadas'] < 1:
+            raise ValueError("O refinamento requer limiar positivo e ao menos uma rodada.")
+    normalizada['refinar'] = refinar or None
+    return normalizada
+
+def refinar_tamanhos(tamanhos, curvas, refinamento, iteracoes=None) -> list:
+    # Pontos médios dos intervalos em que alguma curva varia mais que o
+    # limiar entre vizinhos (inclinação) ou em que a segunda diferença de um
+    # dos extremos passa do limiar (curvatura). Com as iterações de cada
+    # ponto, a variação é descontada de dois erros-padrão do ruído de Monte
+    # Carlo. Os intervalos de maior variação entram primeiro, até
+    # pontos_max tamanhos no total.
+    tamanhos = np.asarray(tamanhos, dtype=np.int64)
+    curvas = np.asarray(curvas, dtype=np.float64).reshape(-1, len(tamanhos))
+    if len(tamanhos) < 2:
+        return []
+    variancia = np.zeros_like(curvas)
+    if iteracoes is not None:
+        p = curvas / 100
+        variancia = p * (1 - p) / np.asarray(iteracoes, dtype=np.float64) * 1e4
+
+    variacao = (np.abs(np.diff(curvas, axis=1)) -
+                2 * np.sqrt(variancia[:, :-1] + variancia[:, 1:])).max(axis=0)
+    if len(tamanhos) >= 3:
+        curvatura = (np.abs(np.diff(curvas, n=2, axis=1)) -
+                     2 * np.sqrt(variancia[:, :-2] + 4 * variancia[:, 1:-1] +
+                                 variancia[:, 2:])).max(axis=0)
+        variacao[:-1] = np.maximum(variacao[:-1], curvatura)
+        variacao[1:] = np.maximum(variacao[1:], curvatura)
+
+    candidatos = np.flatnonzero((variacao > refinamento['limiar']) & (np.diff(tamanhos) >= 2))
+    candidatos = candidatos[np.argsort(-variacao[candidatos], kind='stable')]
+    vagas = max(refinamento['pontos_max'] - len(tamanhos), 0)
+    novos = (tamanhos[candidatos[:vagas]] + tamanhos[candidatos[:vagas] + 1]) // 2
+    return sorted(novos.tolist())
+
+def gerar_percentuais(perc_base, intervalo_acima, intervalo_abaixo):
+    percentuais = []
+
+    perc = perc_base - intervalo_abaixo
+    while perc > 0:
+        percentuais.append(perc)
+        perc -= intervalo_abaixo
+    percentuais.append(perc_base)
+    perc = perc_base + intervalo_acima
+    while perc <= 40:
+        percentuais.append(perc)
+        perc += intervalo_acima
+    percentuais.sort()
+
+    return percentuais
+
+def escolher_batch_size(N):
+    if N > 200000:
+        return 50
+    elif N > 100000:
+        return 100
+    return 200
+
+def normalizar_cenario(cenario: dict) -> dict:
+    faltando = [k for k in PARAMETROS_CENARIO if k not in cenario]
+    if faltando:
+        raise ValueError(f"Parâmetros ausentes no cenário: {', '.join(faltando)}")
+
+    normalizado = dict(cenario)
+    normalizado['N'] = int(cenario['N'])
+    normalizado['n_iter'] = int(cenario['n_iter'])
+    for chave in ('erro_admissivel', 'perc_base', 'intervalo_acima', 'intervalo_abaixo'):
+        normalizado[chave] = float(cenario[chave])
+
+    if any(normalizado[k] <= 0 for k in PARAMETROS_CENARIO):
+        raise ValueError("Valores negativos ou nulos não são aceitos.")
+
+    normalizado['engine'] = cenario.get('engine', 'fused')
+    if normalizado['engine'] not in ENGINES:
+        raise ValueError(f"Engine desconhecida: {normalizado['engine']} "
+                         f"(opções: {', '.join(ENGINES)})")
+
+    normalizado['reposicao'] = bool(cenario.get('reposicao', True))
+    normalizado['backend'] = cenario.get('backend') or 'auto'
+    if normalizado['backend'] not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {normalizado['backend']} "
+                         f"(opções: {', '.join(BACKENDS)})")
+    if normalizado['backend'] == 'numpy' and not normalizado['reposicao']:
+        raise ValueError("O backend 'numpy' requer amostragem com reposição.")
+
+    tolerancia = cenario.get('tolerancia')
+    normalizado['tolerancia'] = float(tolerancia) if tolerancia not in (None, '') else None
+    normalizado['confianca'] = float(cenario.get('confianca') or 0.95)
+    if normalizado['tolerancia'] is not None:
+        if normalizado['tolerancia'] <= 0:
+            raise ValueError("A tolerância deve ser positiva.")
+        if normalizado['engine'] != 'batch':
+            raise ValueError("O modo adaptativo (tolerância) requer a engine 'batch'.")
+    if not 0 < normalizado['confianca'] < 1:
+        raise ValueError("O nível de confiança deve estar entre 0 e 1.")
+
+    normalizado['numeros_comuns'] = bool(cenario.get('numeros_comuns', False))
+    normalizado['grade'] = normalizar_grade(cenario.get('grade'), normalizado['N'])
+    normalizado['semente'] = int(cenario.get('semente') or 0)
+    if not 0 <= normalizado['semente'] < 2 ** 63:
+        raise ValueError("A semente deve ser um inteiro entre 0 e 2^63 - 1.")
+
+    return normalizado
+
+def planejar_simulacao(cenario: dict) -> dict:
+    N = cenario['N']
+    tamanhos_amostra = gerar_tamanhos_amostra(N, cenario.get('grade'))
+    if not tamanhos_amostra:
+        raise ValueError("Número de PCs insuficiente para formar amostras.")
+
+    percentuais = gerar_percentuais(cenario['perc_base'],
+                                    cenario['intervalo_acima'],
+                                    cenario['intervalo_abaixo'])
+    with medir('gerar_erros_normais', 'base', N=N):
+        erros_base = gerar_erros_normais(N, cenario['semente'])
+
+    # As bases são geradas em unidades do PEC (erro admissível = 1): o PRM
+    # sintético fica exatamente invariante ao valor do PEC.
+    return {
+        'percentuais': percentuais,
+        'tamanhos_amostra': tamanhos_amostra,
+        'batch_size': escolher_batch_size(N),
+        'erros_base': erros_base,
+        'fatores_escala': fatores_escala(erros_base, 1.0, percentuais).tolist(),
+    }
+
+def estimar_tempo(cenario: dict, plano: dict, curvas_reais=0) -> float:
+    # Modelo de custo calibrado por máquina (simulapec_custo), sem tempo de
+    # compilação do Numba.
+    from simulapec_custo import modelo_padrao
+    return modelo_padrao().prever(cenario, plano, curvas_reais)
+
+def id_curva(perc):
+    return int(round(perc * 1000)) & 0xFFFFFFFF
+
+def id_curva_cenario(cenario, perc=None):
+    # perc=None: curva dos dados reais.
+    if cenario.get('numeros_comuns'):
+        return ID_CURVA_COMUM
+    return ID_CURVA_REAL if perc is None else id_curva(perc)
+
+def _executar_batch(cenario, plano, base_real, progress_callback,
+                    progress_total_callback, cancel_callback,
+                    progress_iteracoes_callback=None, checkpoint=None, identidades=None):
+    n_iter = cenario['n_iter']
+    percentuais = plano['percentuais']
+    tamanhos_amostra = plano['tamanhos_amostra']
+    total_curvas = len(percentuais) + (1 if base_real is not None else 0)
+
+    def _progresso_curva(idx):
+        if progress_iteracoes_callback is None:
+            return None
+        return lambda feitas, total: progress_iteracoes_callback(
+            idx * total + feitas, total_curvas * total)
+
+    def _checkpoint_curva(idx):
+        if checkpoint is None:
+            return {}
+        identidade = identidades[idx]
+        return {'estado_inicial': checkpoint.celulas(identidade),
+                'registrar_celula': lambda *celula: checkpoint.registrar(identidade, *celula)}
+
+    def _registro(pr_p, pr_n, detalhes):
+        return {'precisao': pr_p, 'norma': pr_n, 'iteracoes': detalhes['iteracoes']}
+
+    registros = []
+    registro_R = None
+
+    for idx, (perc, fator) in enumerate(zip(percentuais, plano['fatores_escala'])):
+        if cancel_callback is not None and cancel_callback():
+            raise SimulacaoCancelada()
+
+        detalhes = {}
+        pr_p, pr_n = simular_percentual_rejeicao_escalar(
+            plano['erros_base'], tamanhos_amostra, n_iter,
+            1.0, perc,
+            progress_callback=progress_callback,
+            batch_size=plano['batch_size'],
+            reposicao=cenario['reposicao'],
+            backend=cenario['backend'],
+            cancel_callback=cancel_callback,
+            tolerancia=cenario['tolerancia'],
+            confianca=cenario['confianca'],
+            detalhes=detalhes,
+            semente=cenario['semente'],
+            curva_id=id_curva_cenario(cenario, perc),
+            escala=fator,
+            progress_iteracoes_callback=_progresso_curva(idx),
+            **_checkpoint_curva(idx))
+        registros.append(_registro(pr_p, pr_n, detalhes))
+
+        if progress_total_callback:
+            progress_total_callback(idx + 1, total_curvas)
+
+    if base_real is not None:
+        detalhes = {}
+        pr_p, pr_n = simular_percentual_rejeicao_escalar(
+            base_real, tamanhos_amostra, n_iter,
+            1.0, cenario['perc_base'],
+            progress_callback=progress_callback,
+            batch_size=plano['batch_size'],
+            reposicao=cenario['reposicao'],
+            backend=cenario['backend'],
+            cancel_callback=cancel_callback,
+            tolerancia=cenario['tolerancia'],
+            confianca=cenario['confianca'],
+            detalhes=detalhes,
+            semente=cenario['semente'],
+            curva_id=id_curva_cenario(cenario),
+            progress_iteracoes_callback=_progresso_curva(total_curvas - 1),
+            **_checkpoint_curva(total_curvas - 1))
+        registro_R = _registro(pr_p, pr_n, detalhes)
+
+        if progress_total_callback:
+            progress_total_callback(total_curvas, total_curvas)
+
+    return registros, registro_R
+
+def argumentos_grade(cenario, plano, base_real=None):
+    percentuais = list(plano['percentuais'])
+    bases = [plano['erros_base']]
+    base_curva = [0] * len(percentuais)
+    escalas = list(plano['fatores_escala'])
+    limites = list(percentuais)
+    curvas_id = [id_curva_cenario(cenario, perc) for perc in percentuais]
+    if base_real is not None:
+        bases.append(base_real)
+        base_curva.append(len(bases) - 1)
+        escalas.append(1.0)
+        limites.append(cenario['perc_base'])
+        curvas_id.append(id_curva_cenario(cenario))
+
+    return bases, limites, {
+        'reposicao': cenario['reposicao'],
+        'semente': cenario['semente'],
+        'curvas_id': curvas_id,
+        'aninhado': cenario['engine'] == 'nested',
+        'base_curva': base_curva,
+        'escalas': escalas,
+    }
+
+def _contar_com_checkpoint(bases, tamanhos, n_iter, limites, argumentos, checkpoint,
+                           identidades, progress_iteracoes_callback, cancel_callback):
+    # A grade é executada em fatias de iterações (iter_inicio), cada uma com
+    # cerca de checkpoint.intervalo segundos; os contadores de todas as
+    # células são registrados ao fim de cada fatia. Somar as fatias
+    # reproduz exatamente a execução única.
+    estados = [[checkpoint.celulas(identidade).get(n) for n in tamanhos]
+               for identidade in identidades]
+    feitas = {e['iteracoes'] if e else 0 for linha in estados for e in linha}
+    contagens = np.zeros((len(limites), len(tamanhos), 2), dtype=np.int64)
+    inicio = 0
+    # Só é possível retomar se todas as células pararam na mesma iteração.
+    if len(feitas) == 1 and 0 < min(feitas) < n_iter:
+        inicio = min(feitas)
+        contagens[:] = [[(e['rejeicoes_precisao'], e['rejeicoes_norma']) for e in linha]
+                        for linha in estados]
+
+    n_celulas = len(limites) * len(tamanhos)
+    passo = max(1, n_iter // 100)
+    while inicio < n_iter:
+        if cancel_callback is not None and cancel_callback():
+            raise SimulacaoCancelada()
+        passo = min(passo, n_iter - inicio)
+        progresso = None
+        if progress_iteracoes_callback is not None:
+            progresso = lambda f, t, k=inicio: progress_iteracoes_callback(
+                n_celulas * k + f, n_celulas * n_iter)
+        relogio = time.time()
+        contagens += contar_rejeicoes_grade(
+            bases, tamanhos, passo, 1.0, limites, **argumentos, iter_inicio=inicio,
+            progress_iteracoes_callback=progresso, cancel_callback=cancel_callback)
+        duracao = time.time() - relogio
+        inicio += passo
+
+        for identidade, linha in zip(identidades, contagens):
+            for n, (rejeicoes_p, rejeicoes_n) in zip(tamanhos, linha):
+                checkpoint.registrar(identidade, n, rejeicoes_p, rejeicoes_n, inicio,
+                                     inicio == n_iter)
+        passo = max(1, int(passo * checkpoint.intervalo / max(duracao, 1e-3)))
+
+    return contagens
+
+def _executar_fundido(cenario, plano, base_real, progress_total_callback,
+                      cancel_callback, progress_iteracoes_callback=None,
+                      checkpoint=None, identidades=None):
+    if cancel_callback is not None and cancel_callback():
+        raise SimulacaoCancelada()
+
+    bases, limites, argumentos = argumentos_grade(cenario, plano, base_real)
+    if checkpoint is not None:
+        contagens = _contar_com_checkpoint(
+            bases, plano['tamanhos_amostra'], cenario['n_iter'], limites, argumentos,
+            checkpoint, identidades, progress_iteracoes_callback, cancel_callback)
+        prm = contagens / cenario['n_iter'] * 100
+        prm_p, prm_n = prm[:, :, 0], prm[:, :, 1]
+    else:
+        prm_p, prm_n = simular_grade_rejeicao(
+            bases, plano['tamanhos_amostra'], cenario['n_iter'], 1.0, limites, **argumentos,
+            progress_iteracoes_callback=progress_iteracoes_callback,
+            cancel_callback=cancel_callback)
+
+    if progress_total_callback:
+        progress_total_callback(len(limites), len(limites))
+
+    iteracoes = [cenario['n_iter']] * len(plano['tamanhos_amostra'])
+    registros = [{'precisao': p, 'norma': n, 'iteracoes': iteracoes}
+                 for p, n in zip(prm_p.tolist(), prm_n.tolist())]
+    registro_R = registros.pop() if base_real is not None else None
+    return registros, registro_R
+
+def _executar_exato(cenario, plano, base_real, progress_total_callback):
+    tamanhos_amostra = plano['tamanhos_amostra']
+    percentuais = plano['percentuais']
+    total_curvas = len(percentuais) + (1 if base_real is not None else 0)
+
+    def _registro(base, perc):
+        prm_p, cota = prm_precisao_aproximada(base, tamanhos_amostra, 1.0, perc,
+                                              reposicao=cenario['reposicao'])
+        prm_n = prm_norma_exata(base, tamanhos_amostra, 1.0, perc,
+                                reposicao=cenario['reposicao'])
+        registro = {'precisao': prm_p.tolist(), 'norma': prm_n.tolist()}
+        if cota is not None:
+            registro['cota'] = cota.tolist()
+        return registro
+
+    registros = []
+    registro_R = None
+
+    for idx, (perc, fator) in enumerate(zip(percentuais, plano['fatores_escala'])):
+        registros.append(_registro(plano['erros_base'] * fator, perc))
+        if progress_total_callback:
+            progress_total_callback(idx + 1, total_curvas)
+
+    if base_real is not None:
+        registro_R = _registro(base_real, cenario['perc_base'])
+        if progress_total_callback:
+            progress_total_callback(total_curvas, total_curvas)
+
+    return registros, registro_R
+
+def _identidade_curva(cenario, plano, perc, base_real=None):
+    identidade = {
+        'N': cenario['N'] if base_real is None else len(base_real),
+        'perc': perc,
+        'semente': cenario['semente'],
+    }
+    if base_real is not None:
+        identidade['dados_reais'] = hashlib.sha256(
+            np.ascontiguousarray(base_real, dtype=np.float64).tobytes()).hexdigest()
+
+    if cenario['engine'] == 'exact':
+        identidade['metodo'] = 'exact'
+        identidade['reposicao'] = cenario['reposicao']
+        return identidade
+
+    # batch, fused e nested sorteiam as mesmas sequências: os resultados
+    # são intercambiáveis.
+    identidade['metodo'] = 'monte_carlo'
+    identidade['n_iter'] = cenario['n_iter']
+    if cenario['tolerancia'] is not None:
+        identidade['tolerancia'] = cenario['tolerancia']
+        identidade['confianca'] = cenario['confianca']
+    if cenario.get('numeros_comuns'):
+        identidade['numeros_comuns'] = True
+    if not cenario['reposicao']:
+        identidade['reposicao'] = False
+    return identidade
+
+def _executar_engine(cenario, plano, base_real, progress_callback,
+                     progress_total_callback, cancel_callback,
+                     progress_iteracoes_callback=None, checkpoint=None, identidades=None):
+    if cenario['engine'] == 'exact':
+        return _executar_exato(cenario, plano, base_real, progress_total_callback)
+    elif cenario['engine'] in ('fused', 'nested'):
+        return _executar_fundido(cenario, plano, base_real, progress_total_callback,
+                                 cancel_callback, progress_iteracoes_callback,
+                                 checkpoint, identidades)
+    return _executar_batch(cenario, plano, base_real, progress_callback,
+                           progress_total_callback, cancel_callback,
+                           progress_iteracoes_callback, checkpoint, identidades)
+
+def _celulas_do_registro(registro, tamanhos):
+    campos = [k for k in registro if k != 'tamanhos']
+    return {n: {campo: registro[campo][i] for campo in campos}
+            for i, n in enumerate(tamanhos)}
+
+def _registro_das_celulas(celulas, tamanhos):
+    campos = celulas[tamanhos[0]].keys()
+    return {campo: [celulas[n][campo] for n in tamanhos] for campo in campos}
+
+def _celula_do_checkpoint(estado):
+    # Mesma conta das engines: o PRM retomado é idêntico ao calculado.
+    iteracoes = estado['iteracoes']
+    return {'precisao': (estado['rejeicoes_precisao'] / iteracoes) * 100,
+            'norma': (estado['rejeicoes_norma'] / iteracoes) * 100,
+            'iteracoes': iteracoes}
+
+def normalizar_dados_reais(dados_reais, cenario):
+    if dados_reais is None:
+        return None
+    return np.asarray(dados_reais, dtype=np.float64) / cenario['erro_admissivel']
+
+def executar_simulacao(cenario: dict, dados_reais=None, plano=None,
+                       progress_callback=None, progress_total_callback=None,
+                       cancel_callback=None, cache=None,
+                       progress_iteracoes_callback=None, checkpoint=None) -> dict:
+    if plano is None:
+        plano = planejar_simulacao(cenario)
+    if (cenario.get('grade') or {}).get('refinar'):
+        return _executar_refinado(
+            cenario, dados_reais, plano, cache, progress_callback=progress_callback,
+            progress_total_callback=progress_total_callback, cancel_callback=cancel_callback,
+            progress_iteracoes_callback=progress_iteracoes_callback, checkpoint=checkpoint)
+    percentuais = plano['percentuais']
+    tamanhos_amostra = plano['tamanhos_amostra']
+
+    inicio = time.time()
+    base_real = normalizar_dados_reais(dados_reais, cenario)
+
+    identidades = [_identidade_curva(cenario, plano, perc) for perc in percentuais]
+    if base_real is not None:
+        identidades.append(_identidade_curva(cenario, plano, cenario['perc_base'], base_real))
+
+    celulas = [cache.carregar(identidade) if cache is not None else {}
+               for identidade in identidades]
+
+    # Células concluídas num checkpoint valem como células do cache; as
+    # parciais são retomadas pela engine.
+    if cenario['engine'] == 'exact':
+        checkpoint = None
+    retomadas = 0
+    if checkpoint is not None:
+        checkpoint.abrir(identidades)
+        retomado = any(checkpoint.celulas(identidade) for identidade in identidades)
+        for identidade, c in zip(identidades, celulas):
+            for n, estado in checkpoint.celulas(identidade).items():
+                if estado['concluida'] and n in tamanhos_amostra and n not in c:
+                    c[n] = _celula_do_checkpoint(estado)
+                    retomadas += 1
+
+    pendentes = [i for i, c in enumerate(celulas)
+                 if any(n not in c for n in tamanhos_amostra)]
+    if cache is not None and retomadas:
+        for i, c in enumerate(celulas):
+            if i not in pendentes:
+                cache.salvar(identidades[i], c)
+    tamanhos_pendentes = sorted({n for i in pendentes for n in tamanhos_amostra
+                                 if n not in celulas[i]})
+
+    if pendentes:
+        niveis = [i for i in pendentes if i < len(percentuais)]
+        plano_pendente = dict(
+            plano,
+            percentuais=[percentuais[i] for i in niveis],
+            fatores_escala=[plano['fatores_escala'][i] for i in niveis],
+            tamanhos_amostra=tamanhos_pendentes)
+        real_pendente = base_real is not None and len(percentuais) in pendentes
+        identidades_pendentes = [identidades[i] for i in niveis]
+        if real_pendente:
+            identidades_pendentes.append(identidades[-1])
+
+        try:
+            with medir('executar_simulacao', engine=cenario['engine'], N=cenario['N'],
+                       n_iter=cenario['n_iter'], curvas=len(identidades_pendentes),
+                       tamanhos=len(tamanhos_pendentes)):
+                registros, registro_R = _executar_engine(
+                    cenario, plano_pendente, base_real if real_pendente else None,
+                    progress_callback, progress_total_callback, cancel_callback,
+                    progress_iteracoes_callback, checkpoint, identidades_pendentes)
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.salvar()
+            raise
+        if real_pendente:
+            niveis.append(len(percentuais))
+            registros.append(registro_R)
+
+        for i, registro in zip(niveis, registros):
+            celulas[i].update(_celulas_do_registro(registro, tamanhos_pendentes))
+            if cache is not None:
+                cache.salvar(identidades[i], celulas[i])
+    elif progress_total_callback:
+        progress_total_callback(len(identidades), len(identidades))
+
+    registros = [_registro_das_celulas(c, tamanhos_amostra) for c in celulas]
+    registro_R = registros.pop() if base_real is not None else None
+
+    total_celulas = len(identidades) * len(tamanhos_amostra)
+    calculadas = len(pendentes) * len(tamanhos_pendentes)
+    extras = {
+        'tempo_processamento': time.time() - inicio,
+        'cache': {'celulas_calculadas': calculadas,
+                  'celulas_reaproveitadas': total_celulas - calculadas},
+    }
+    if checkpoint is not None:
+        extras['checkpoint'] = {
+            'retomado': retomado,
+            'celulas_retomadas': retomadas,
+        }
+        checkpoint.concluir()
+    return montar_resultado(cenario, plano, registros, registro_R, extras)
+
+def _executar_refinado(cenario, dados_reais, plano, cache, **opcoes):
+    # Refinamento automático da grade: cada rodada simula só os tamanhos
+    # acrescentados; os já calculados vêm do cache (em memória, se nenhum
+    # for informado).
+    refinamento = cenario['grade']['refinar']
+    cache = cache if cache is not None else CacheMemoria()
+    rodada_unica = dict(cenario, grade=dict(cenario['grade'], refinar=None))
+    inicio = time.time()
+    calculadas = acrescentados = 0
+
+    for rodada in range(refinamento['rodadas'] + 1):
+        resultado = executar_simulacao(rodada_unica, dados_reais, plano, cache=cache, **opcoes)
+        calculadas += resultado['cache']['celulas_calculadas']
+        curvas = resultado['curvas_precisao'] + resultado['curvas_norma']
+        iteracoes = resultado.get('iteracoes')
+        iteracoes = iteracoes * 2 if iteracoes is not None else None
+        if resultado['curva_precisao_R'] is not None:
+            curvas += [resultado['curva_precisao_R'], resultado['curva_norma_R']]
+            if iteracoes is not None:
+                iteracoes += [resultado['iteracoes_R']] * 2
+        novos = (refinar_tamanhos(plano['tamanhos_amostra'], curvas, refinamento, iteracoes)
+                 if rodada < refinamento['rodadas'] else [])
+        if not novos:
+            break
+        acrescentados += len(novos)
+        plano = dict(plano, tamanhos_amostra=sorted(plano['tamanhos_amostra'] + novos))
+
+    total_celulas = len(curvas) // 2 * len(plano['tamanhos_amostra'])
+    resultado['cenario']['grade'] = cenario['grade']
+    resultado['tempo_processamento'] = time.time() - inicio
+    resultado['cache'] = {'celulas_calculadas': calculadas,
+                          'celulas_reaproveitadas': total_celulas - calculadas}
+    resultado['refinamento'] = {'rodadas': rodada, 'tamanhos_acrescentados': acrescentados}
+    return resultado
+
+def montar_resultado(cenario, plano, registros, registro_R, extras):
+    resultado = {
+        'cenario': {k: cenario[k] for k in PARAMETROS_CENARIO + PARAMETROS_OPCIONAIS},
+        'percentuais': plano['percentuais'],
+        'tamanhos_amostra': plano['tamanhos_amostra'],
+        'curvas_precisao': [r['precisao'] for r in registros],
+        'curvas_norma': [r['norma'] for r in registros],
+        'curva_precisao_R': registro_R['precisao'] if registro_R else None,
+        'curva_norma_R': registro_R['norma'] if registro_R else None,
+        # A engine 'exact' não sorteia: sem iterações nem intervalos de
+        # confiança, e o n_iter do cenário não foi usado.
+        'analitico': cenario['engine'] == 'exact',
+    }
+
+    if registros and 'cota' in registros[0]:
+        # Garantia de pior caso (Berry–Esseen), não a precisão típica da
+        # aproximação: o próprio termo de Berry–Esseen passa de 15 pontos
+        # percentuais nos tamanhos usuais, enquanto o erro medido contra o
+        # Monte Carlo fica abaixo de 1 ponto. Em geral, a cota não informa
+        # nada sobre a qualidade da curva.
+        resultado['cotas_erro_precisao'] = [r['cota'] for r in registros]
+        resultado['cota_erro_precisao_R'] = registro_R['cota'] if registro_R else None
+
+    if resultado['analitico']:
+        resultado['iteracoes'] = resultado['iteracoes_R'] = None
+    elif registros and 'iteracoes' in registros[0]:
+        def _intervalos(registro, teste):
+            iteracoes = np.asarray(registro['iteracoes'], dtype=np.float64)
+            rejeicoes = np.rint(np.asarray(registro[teste]) * iteracoes / 100)
+            return _intervalos_lista(rejeicoes, iteracoes, cenario['confianca'])
+
+        resultado['iteracoes'] = [r['iteracoes'] for r in registros]
+        resultado['iteracoes_R'] = registro_R['iteracoes'] if registro_R else None
+        for teste in ('precisao', 'norma'):
+            resultado[f"ic_{teste}"] = [_intervalos(r, teste) for r in registros]
+            resultado[f"ic_{teste}_R"] = _intervalos(registro_R, teste) if registro_R else None
+
+    resultado.update(extras)
+    return resultado
+
+
+def carregar_dados_reais_txt(caminho, **leitura):
+    # leitura: colunas, referencia, separador, decimal e mmap (ver carregar_erros).
+    return carregar_erros(caminho, **leitura)
+
+def carregar_cenarios(caminho) -> List[dict]:
+    if str(caminho).lower().endswith('.toml'):
+        if tomllib is None:
+            raise RuntimeError("Leitura de TOML requer Python 3.11 ou superior.")
+        with open(caminho, 'rb') as f:
+            conteudo = tomllib.load(f)
+    else:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            conteudo = json.load(f)
+
+    cenarios = conteudo.get('cenarios', [conteudo])
+    nome_arquivo = os.path.splitext(os.path.basename(caminho))[0]
+    pasta = os.path.dirname(os.path.abspath(caminho))
+
+    resultado = []
+    for i, cenario in enumerate(cenarios):
+        cenario = dict(cenario)
+        cenario.setdefault('nome', nome_arquivo if len(cenarios) == 1 else f"{nome_arquivo}_{i + 1}")
+        dados_reais = cenario.get('dados_reais')
+        if isinstance(dados_reais, dict):
+            cenario['dados_reais'] = {k: os.path.join(pasta, v) for k, v in dados_reais.items()}
+        elif dados_reais:
+            cenario['dados_reais'] = os.path.join(pasta, dados_reais)
+        if cenario.get('lote'):
+            cenario['lote'] = os.path.join(pasta, cenario['lote'])
+        resultado.append(cenario)
+    return resultado
+
+def curvas_para_dicionarios(tamanhos_amostra, curvas):
+    return [{n: round(v, 2) for n, v in zip(tamanhos_amostra, curva)} for curva in curvas]
+
+@medido('exportacao')
+def salvar_resultado(resultado: dict, pasta_saida, nome, lang='pt'):
+    os.makedirs(pasta_saida, exist_ok=True)
+    tamanhos = resultado['tamanhos_amostra']
+    tem_real = resultado['curva_precisao_R'] is not None
+
+    caminho_csv = os.path.join(pasta_saida, f"{nome}.csv")
+    _salvar_planilha_csv(
+        caminho_arquivo=caminho_csv,
+        percentuais=resultado['percentuais'],
+        amostras=tamanhos,
+        prm_precisao_list=curvas_para_dicionarios(tamanhos, resultado['curvas_precisao']),
+        prm_norma_list=curvas_para_dicionarios(tamanhos, resultado['curvas_norma']),
+        dados_reais=tem_real,
+        prm_precisao_real=curvas_para_dicionarios(tamanhos, [resultado['curva_precisao_R']])[0] if tem_real else None,
+        prm_norma_real=curvas_para_dicionarios(tamanhos, [resultado['curva_norma_R']])[0] if tem_real else None,
+        lang=lang)
+
+    caminho_json = os.path.join(pasta_saida, f"{nome}.json")
+    with open(caminho_json, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    return caminho_csv, caminho_json
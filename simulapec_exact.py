@@ -0,0 +1,97 @@
+import numpy as np
+from scipy.stats import binom, chi2, hypergeom, norm
+
+# Constante de Berry–Esseen para somas i.i.d. (Shevtsova, 2011).
+CONSTANTE_BERRY_ESSEEN = 0.4748
+
+
+def limite_aceitacao_norma(tamanhos, percentual_limite):
+    tamanhos = np.asarray(tamanhos, dtype=np.int64)
+    k = np.floor(tamanhos * percentual_limite / 100).astype(np.int64)
+
+    # Mesmo critério do Monte Carlo: rejeita quando (acima / n) * 100 > limite.
+    sobe = ((k + 1) / tamanhos) * 100 <= percentual_limite
+    k = np.where(sobe, k + 1, k)
+    desce = (k >= 0) & ((k / tamanhos) * 100 > percentual_limite)
+    return np.where(desce, k - 1, k)
+
+def prm_norma_exata(base, tamanhos, erro_admissivel, percentual_limite,
+                    reposicao=True):
+    base = np.asarray(base)
+    tamanhos = np.asarray(tamanhos, dtype=np.int64)
+    k_max = limite_aceitacao_norma(tamanhos, percentual_limite)
+    n_acima = int(np.count_nonzero(np.abs(base) > erro_admissivel))
+
+    if reposicao:
+        prm = binom.sf(k_max, tamanhos, n_acima / len(base))
+    else:
+        prm = hypergeom.sf(k_max, len(base), n_acima, tamanhos)
+        prm = np.where(tamanhos <= len(base), prm, np.nan)
+
+    return prm * 100
+
+def _variancia_s2_sem_reposicao(N, n, mu2, mu4):
+    # Var(s²) numa amostra sem reposição de tamanho n de uma população de N
+    # valores com momentos centrais mu2 e mu4 (Cho, Cho e Eltinge, 2005).
+    comum = N * (N - n) / (n * (n - 1) * (N - 1) * (N - 2) * (N - 3))
+    return comum * ((N * n - N - n - 1) * mu4
+                    - (N ** 2 * n - 3 * n - 3 * N ** 2 + 6 * N - 3) / (N - 1) * mu2 ** 2)
+
+def prm_precisao_aproximada(base, tamanhos, erro_admissivel, percentual_limite,
+                            reposicao=True):
+    # Retorna (PRM, cota de erro), em %. A cota é uma garantia de pior caso,
+    # em geral muito mais larga que o erro real (ver montar_resultado). Sem
+    # reposição, a aproximação usa a correção de população finita, e não há
+    # cota: Berry–Esseen exige sorteios independentes, e a cota é None.
+    base = np.asarray(base, dtype=np.float64)
+    n = np.asarray(tamanhos, dtype=np.float64)
+
+    desvios = base - base.mean()
+    y = desvios ** 2
+    sigma2 = y.mean()
+    mu4 = np.mean(y ** 2)
+    sigma_y = y.std()
+    rho = np.mean(np.abs(y - sigma2) ** 3)
+
+    erro_padrao_precisao = erro_admissivel / 1.6449
+    qui_tabelas = chi2.ppf(1 - (percentual_limite / 100), df=n - 1)
+    q = qui_tabelas * erro_padrao_precisao ** 2
+
+    if sigma2 == 0 or sigma_y == 0:
+        prm = np.where(q < 0, 1.0, 0.0)
+        return prm * 100, (np.zeros_like(prm) if reposicao else None)
+
+    if reposicao:
+        media_s2 = sigma2
+        var_s2 = (mu4 - sigma2 ** 2 * (n - 3) / (n - 1)) / n
+    else:
+        # E[s²] = N·σ²/(N-1); com n = N, s² é constante (var_s2 = 0).
+        N = len(base)
+        media_s2 = sigma2 * N / (N - 1)
+        var_s2 = np.maximum(_variancia_s2_sem_reposicao(N, n, sigma2, mu4), 0.0)
+
+    # (n-1)s²/E[s²] aproximado por c·χ²(ν) com mesma média e variância.
+    var_w = (n - 1) ** 2 * var_s2 / media_s2 ** 2
+    degenerada = var_w <= 0
+    var_w = np.where(degenerada, 1.0, var_w)
+    c = var_w / (2 * (n - 1))
+    nu = 2 * (n - 1) ** 2 / var_w
+    prm = np.where(degenerada, (n - 1) * media_s2 > q, chi2.sf(q / media_s2 / c, nu))
+    if not reposicao:
+        return prm * 100, None
+
+    # Cota rigorosa: (n-1)s² = T - D, com T = Σ(x-μ)² (soma i.i.d.,
+    # Berry–Esseen) e D = n(x̄-μ)² >= 0, E[D] = σ² (desigualdade de Markov).
+    be = CONSTANTE_BERRY_ESSEEN * rho / (sigma_y ** 3 * np.sqrt(n))
+    escala = np.sqrt(n) * sigma_y
+    superior = norm.sf((q - n * sigma2) / escala) + be
+
+    epsilons = sigma2 * np.logspace(0, 6, 61)[:, None]
+    inferior = np.max(norm.sf((q + epsilons - n * sigma2) / escala)
+                      - sigma2 / epsilons, axis=0) - be
+
+    superior = np.clip(superior, 0, 1)
+    inferior = np.clip(inferior, 0, 1)
+    cota = np.maximum(superior - prm, prm - inferior)
+
+    return prm * 100, np.clip(cota, 0, None) * 100
@@ -0,0 +1,148 @@
+import json
+import os
+import platform
+
+import numpy as np
+import numba
+
+from simulapec_cache import VERSAO_CACHE
+from simulapec_instrumentacao import medido
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FORMATOS_TABELA = ('parquet', 'npz')
+TESTES = ('precisao', 'norma')
+# Colunas do cenário repetidas em cada linha: filtros diretos numa varredura.
+COLUNAS_CENARIO = ('N', 'erro_admissivel', 'perc_base', 'n_iter', 'semente', 'engine')
+
+
+def metadados_resultado(resultado: dict, nome=None) -> dict:
+    return {
+        'nome': nome,
+        'cenario': resultado['cenario'],
+        'percentuais': resultado['percentuais'],
+        'tamanhos_amostra': resultado['tamanhos_amostra'],
+        'dados_reais': resultado['curva_precisao_R'] is not None,
+        'analitico': resultado.get('analitico', False),
+        'tempo_processamento': resultado.get('tempo_processamento'),
+        'cache': resultado.get('cache'),
+        'checkpoint': resultado.get('checkpoint'),
+        'versao_cache': VERSAO_CACHE,
+        'numpy': np.__version__,
+        'numba': numba.__version__,
+        'python': platform.python_version(),
+    }
+
+def tabela_resultado(resultado: dict, nome='') -> dict:
+    # Formato longo: uma linha por (curva, teste, tamanho de amostra), montada
+    # com operações sobre arrays inteiros.
+    tamanhos = np.asarray(resultado['tamanhos_amostra'], dtype=np.int64)
+    niveis = list(resultado['percentuais'])
+    curvas = {teste: list(resultado[f"curvas_{teste}"]) for teste in TESTES}
+    iteracoes = resultado.get('iteracoes')
+    ic = {teste: resultado.get(f"ic_{teste}") for teste in TESTES}
+    cotas = resultado.get('cotas_erro_precisao')
+    real = resultado['curva_precisao_R'] is not None
+
+    if real:
+        niveis.append(resultado['cenario']['perc_base'])
+        for teste in TESTES:
+            curvas[teste].append(resultado[f"curva_{teste}_R"])
+            if ic[teste] is not None:
+                ic[teste] = ic[teste] + [resultado[f"ic_{teste}_R"]]
+        if iteracoes is not None:
+            iteracoes = iteracoes + [resultado['iteracoes_R']]
+        if cotas is not None:
+            cotas = cotas + [resultado['cota_erro_precisao_R']]
+
+    n_curvas, n_tamanhos = len(niveis), len(tamanhos)
+    forma = (n_curvas, len(TESTES), n_tamanhos)
+    n_linhas = int(np.prod(forma))
+
+    prm = np.stack([np.asarray(curvas[teste], dtype=np.float64) for teste in TESTES], axis=1)
+    if iteracoes is not None:
+        iteracoes = np.broadcast_to(
+            np.asarray(iteracoes, dtype=np.int64)[:, None, :], forma)
+    else:
+        iteracoes = np.zeros(forma, dtype=np.int64)
+
+    limites = np.full(forma + (2,), np.nan)
+    for k, teste in enumerate(TESTES):
+        if ic[teste] is not None:
+            limites[:, k] = np.asarray(ic[teste], dtype=np.float64)
+    cota = np.full(forma, np.nan)
+    if cotas is not None:
+        cota[:, 0] = np.asarray(cotas, dtype=np.float64)
+
+    eh_real = np.zeros(n_curvas, dtype=np.bool_)
+    eh_real[-1] = real
+    tabela = {
+        'cenario': np.full(n_linhas, nome or ''),
+        'nivel': np.repeat(np.asarray(niveis, dtype=np.float64), len(TESTES) * n_tamanhos),
+        'real': np.repeat(eh_real, len(TESTES) * n_tamanhos),
+        'teste': np.tile(np.repeat(np.array(TESTES), n_tamanhos), n_curvas),
+        'tamanho': np.tile(tamanhos, n_curvas * len(TESTES)),
+        'prm': prm.reshape(-1),
+        'iteracoes': iteracoes.reshape(-1),
+        'ic_inferior': limites[..., 0].reshape(-1),
+        'ic_superior': limites[..., 1].reshape(-1),
+        'cota': cota.reshape(-1),
+    }
+    for coluna in COLUNAS_CENARIO:
+        tabela[coluna] = np.full(n_linhas, resultado['cenario'][coluna])
+    if resultado.get('analitico'):
+        # Resultados analíticos não executam iterações.
+        tabela['n_iter'] = np.zeros(n_linhas, dtype=tabela['n_iter'].dtype)
+    return tabela
+
+def _concatenar(resultados: dict):
+    tabelas = [tabela_resultado(resultado, nome) for nome, resultado in resultados.items()]
+    tabela = {coluna: np.concatenate([t[coluna] for t in tabelas]) for coluna in tabelas[0]}
+    metadados = {'resultados': [metadados_resultado(resultado, nome)
+                                for nome, resultado in resultados.items()]}
+    return tabela, metadados
+
+@medido('exportacao')
+def salvar_tabela(resultados: dict, caminho):
+    # resultados: {nome do cenário: resultado}. O formato vem da extensão
+    # (.parquet ou .npz); os metadados completos vão em JSON no arquivo.
+    formato = os.path.splitext(caminho)[1].lower().lstrip('.')
+    if formato not in FORMATOS_TABELA:
+        raise ValueError(f"Formato de tabela desconhecido: {caminho} "
+                         f"(opções: {', '.join(FORMATOS_TABELA)})")
+    tabela, metadados = _concatenar(resultados)
+    texto = json.dumps(metadados, ensure_ascii=False)
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+
+    if formato == 'npz':
+        np.savez_compressed(caminho, metadados=np.array(texto), **tabela)
+        return caminho
+
+    if pa is None:
+        raise ValueError("A exportação em Parquet requer o pacote pyarrow (pip install pyarrow).")
+    arrow = pa.Table.from_pydict({coluna: pa.array(valores) for coluna, valores in tabela.items()})
+    arrow = arrow.replace_schema_metadata({'simulapec': texto})
+    pq.write_table(arrow, caminho, compression='zstd')
+    return caminho
+
+def salvar_tabela_resultado(resultado: dict, pasta_saida, nome, formatos=FORMATOS_TABELA):
+    return [salvar_tabela({nome: resultado}, os.path.join(pasta_saida, f"{nome}.{formato}"))
+            for formato in formatos]
+
+def carregar_tabela_resultados(caminho):
+    # Retorna (colunas como arrays NumPy, metadados).
+    if str(caminho).lower().endswith('.npz'):
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            tabela = {coluna: arquivo[coluna] for coluna in arquivo.files}
+        return tabela, json.loads(str(tabela.pop('metadados')))
+
+    if pq is None:
+        raise ValueError("A leitura de Parquet requer o pacote pyarrow (pip install pyarrow).")
+    arrow = pq.read_table(caminho)
+    tabela = {coluna: arrow.column(coluna).to_numpy() for coluna in arrow.column_names}
+    return tabela, json.loads(arrow.schema.metadata[b'simulapec'])
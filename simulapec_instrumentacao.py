@@ -0,0 +1,147 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentação opcional: desativada, cada ponto medido custa apenas a
+# leitura de ATIVO. Ativada com ativar() ou com a variável de ambiente
+# SIMULAPEC_PERFIL=<arquivo.json>, que grava o perfil ao fim do processo.
+ATIVO = False
+_eventos = []
+_agregados = {}
+_celulas = []
+_threads = {}
+_trava = threading.Lock()
+_origem = time.perf_counter()
+
+
+def ativar():
+    global ATIVO, _origem
+    with _trava:
+        _eventos.clear()
+        _agregados.clear()
+        _celulas.clear()
+        _threads.clear()
+        _origem = time.perf_counter()
+        ATIVO = True
+
+def desativar():
+    global ATIVO
+    ATIVO = False
+
+def ativo() -> bool:
+    return ATIVO
+
+def _thread():
+    ident = threading.get_ident()
+    if ident not in _threads:
+        _threads[ident] = (len(_threads) + 1, threading.current_thread().name)
+    return _threads[ident][0]
+
+def _microssegundos(instante):
+    return (instante - _origem) * 1e6
+
+def _threads_numba():
+    try:
+        import numba
+        return numba.get_num_threads()
+    except ImportError:
+        return 1
+
+@contextmanager
+def medir(nome, categoria='simulacao', **argumentos):
+    # Intervalo com duração e tempo de CPU do processo; o bloco pode
+    # acrescentar argumentos (ex.: iteracoes) ao dicionário devolvido. Nos
+    # kernels, a utilização é o tempo de CPU dividido por tempo × threads.
+    if not ATIVO:
+        yield argumentos
+        return
+    inicio, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield argumentos
+    finally:
+        duracao = time.perf_counter() - inicio
+        if categoria == 'kernel':
+            threads = _threads_numba()
+            argumentos['threads'] = threads
+            argumentos['utilizacao'] = (time.process_time() - cpu) / max(duracao * threads, 1e-9)
+        if 'iteracoes' in argumentos:
+            argumentos['iteracoes_por_s'] = argumentos['iteracoes'] / max(duracao, 1e-9)
+        with _trava:
+            _eventos.append({'name': nome, 'cat': categoria, 'ph': 'X',
+                             'ts': _microssegundos(inicio), 'dur': duracao * 1e6,
+                             'pid': os.getpid(), 'tid': _thread(), 'args': argumentos})
+            _acumular(nome, categoria, duracao)
+
+def medido(categoria):
+    # Decorador: mede cada chamada da função com medir().
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if not ATIVO:
+                return funcao(*args, **kwargs)
+            with medir(funcao.__name__, categoria):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+def _acumular(nome, categoria, duracao, chamadas=1):
+    total = _agregados.setdefault((categoria, nome), [0, 0.0])
+    total[0] += chamadas
+    total[1] += duracao
+
+def acumular(nome, duracao, categoria='kernel', chamadas=1):
+    # Para pontos quentes (lançamentos do kernel por lote): só o total, sem
+    # um evento por chamada.
+    with _trava:
+        _acumular(nome, categoria, duracao, chamadas)
+
+def celula_concluida(curva, tamanho, iteracoes, duracao):
+    # Uma célula (nível de rejeição × tamanho de amostra) concluída.
+    with _trava:
+        _celulas.append({'curva': curva, 'tamanho': int(tamanho), 'iteracoes': int(iteracoes),
+                         'duracao': duracao,
+                         'iteracoes_por_s': iteracoes / max(duracao, 1e-9)})
+        _eventos.append({'name': 'iteracoes_por_s', 'ph': 'C',
+                         'ts': _microssegundos(time.perf_counter()), 'pid': os.getpid(),
+                         'args': {str(curva): iteracoes / max(duracao, 1e-9)}})
+
+def resumo() -> dict:
+    with _trava:
+        etapas = [{'categoria': categoria, 'nome': nome, 'chamadas': chamadas,
+                   'tempo_total': total, 'tempo_medio': total / chamadas}
+                  for (categoria, nome), (chamadas, total) in _agregados.items()]
+        kernels = [evento for evento in _eventos
+                   if evento.get('cat') == 'kernel' and 'utilizacao' in evento['args']]
+        taxas = [c['iteracoes_por_s'] for c in _celulas]
+        return {
+            'etapas': sorted(etapas, key=lambda e: -e['tempo_total']),
+            'utilizacao_kernels': (sum(e['args']['utilizacao'] * e['dur'] for e in kernels) /
+                                   sum(e['dur'] for e in kernels)) if kernels else None,
+            'celulas': list(_celulas),
+            'iteracoes_por_s_celulas': {
+                'minimo': min(taxas), 'mediana': sorted(taxas)[len(taxas) // 2],
+                'maximo': max(taxas)} if taxas else None,
+        }
+
+def salvar(caminho):
+    # Formato de trace do Chrome (chrome://tracing, Perfetto), com o resumo
+    # agregado em "otherData".
+    with _trava:
+        eventos = list(_eventos)
+        nomes = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                  'args': {'name': nome}} for tid, nome in _threads.values()]
+    conteudo = {'traceEvents': nomes + eventos, 'displayTimeUnit': 'ms',
+                'otherData': {'simulapec': resumo()}}
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, ensure_ascii=False)
+    return caminho
+
+
+if os.environ.get('SIMULAPEC_PERFIL'):
+    ativar()
+    atexit.register(salvar, os.environ['SIMULAPEC_PERFIL'])
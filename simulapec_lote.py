@@ -0,0 +1,172 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from simulapec_cache import CacheMemoria
+from simulapec_dados import carregar_erros
+from simulapec_engine import (
+    contar_rejeicoes_grade,
+    executar_simulacao,
+    id_curva_cenario,
+    normalizar_cenario,
+    normalizar_dados_reais,
+    planejar_simulacao,
+)
+from simulapec_instrumentacao import medido
+
+EXTENSOES_DADOS = ('.txt', '.csv', '.tsv', '.npy')
+# Limite de valores por execução do kernel (bases de todos os conjuntos juntas).
+VALORES_POR_EXECUCAO = 8_000_000
+
+
+def listar_conjuntos(entrada, leitura=None):
+    # entrada: pasta com os arquivos de dados reais, manifesto JSON (lista de
+    # caminhos ou de {"arquivo", "nome", "leitura"}) ou lista de caminhos.
+    if isinstance(entrada, (list, tuple)):
+        itens, pasta = list(entrada), os.getcwd()
+    elif os.path.isdir(entrada):
+        pasta = entrada
+        itens = sorted(nome for nome in os.listdir(entrada)
+                       if nome.lower().endswith(EXTENSOES_DADOS))
+    else:
+        pasta = os.path.dirname(os.path.abspath(entrada))
+        with open(entrada, 'r', encoding='utf-8') as f:
+            itens = json.load(f)
+        itens = itens.get('conjuntos', []) if isinstance(itens, dict) else itens
+
+    conjuntos = []
+    for item in itens:
+        item = {'arquivo': item} if isinstance(item, str) else dict(item)
+        item['arquivo'] = os.path.join(pasta, item['arquivo'])
+        item.setdefault('nome', os.path.splitext(os.path.basename(item['arquivo']))[0])
+        item['leitura'] = dict(leitura or {}, **item.get('leitura', {}))
+        conjuntos.append(item)
+    if not conjuntos:
+        raise ValueError(f"Nenhum arquivo de dados reais encontrado em {entrada}.")
+    return conjuntos
+
+def carregar_conjuntos(conjuntos, processos=None):
+    with ThreadPoolExecutor(processos) as executor:
+        return list(executor.map(lambda c: carregar_erros(c['arquivo'], **c['leitura']),
+                                 conjuntos))
+
+def _grade_real(cenario, plano, dados):
+    # Todas as curvas reais em uma única grade paralela, com o mesmo
+    # identificador de curva de executar_simulacao: cada conjunto tem
+    # exatamente a curva R que teria numa execução individual.
+    bases = [normalizar_dados_reais(d, cenario) for d in dados]
+    tamanhos = plano['tamanhos_amostra']
+    por_execucao = max(1, VALORES_POR_EXECUCAO // max(len(b) for b in bases))
+
+    contagens = []
+    for i in range(0, len(bases), por_execucao):
+        grupo = bases[i:i + por_execucao]
+        k = len(grupo)
+        contagens.append(contar_rejeicoes_grade(
+            grupo, tamanhos, cenario['n_iter'], 1.0, [cenario['perc_base']] * k,
+            reposicao=cenario['reposicao'], semente=cenario['semente'],
+            curvas_id=[id_curva_cenario(cenario)] * k, aninhado=cenario['engine'] == 'nested',
+            base_curva=list(range(k)), escalas=[1.0] * k))
+    prm = np.concatenate(contagens) / cenario['n_iter'] * 100
+    return [(p[:, 0].tolist(), p[:, 1].tolist()) for p in prm]
+
+def _menor_tamanho_aprovado(tamanhos, prm_precisao, prm_norma, risco):
+    # Menor n a partir do qual nenhum dos testes rejeita com probabilidade
+    # acima do risco.
+    aprovados = np.maximum(prm_precisao, prm_norma) <= risco
+    if not aprovados[-1]:
+        return None
+    falhas = np.flatnonzero(~aprovados)
+    return tamanhos[falhas[-1] + 1] if len(falhas) else tamanhos[0]
+
+def executar_lote(cenario: dict, conjuntos, risco=5.0, cache=None, plano=None,
+                  progress_total_callback=None) -> dict:
+    cenario = normalizar_cenario(cenario)
+    if not (isinstance(conjuntos, list) and conjuntos and isinstance(conjuntos[0], dict)):
+        conjuntos = listar_conjuntos(conjuntos)
+    if plano is None:
+        plano = planejar_simulacao(cenario)
+    cache = cache if cache is not None else CacheMemoria()
+    inicio = time.time()
+
+    dados = carregar_conjuntos(conjuntos)
+    sintetico = executar_simulacao(cenario, plano=plano, cache=cache)
+    # Com refinamento automático, a grade final é a da simulação fictícia e
+    # as curvas reais são calculadas nela, sem novo refinamento.
+    tamanhos = sintetico['tamanhos_amostra']
+    plano = dict(plano, tamanhos_amostra=tamanhos)
+    if cenario['grade'] is not None:
+        cenario = dict(cenario, grade=dict(cenario['grade'], refinar=None))
+
+    if cenario['engine'] in ('fused', 'nested') or \
+            (cenario['engine'] == 'batch' and cenario['tolerancia'] is None):
+        curvas = _grade_real(cenario, plano, dados)
+        if progress_total_callback:
+            progress_total_callback(len(dados), len(dados))
+    else:
+        curvas = []
+        for i, d in enumerate(dados):
+            resultado = executar_simulacao(cenario, dados_reais=d, plano=plano, cache=cache)
+            curvas.append((resultado['curva_precisao_R'], resultado['curva_norma_R']))
+            if progress_total_callback:
+                progress_total_callback(i + 1, len(dados))
+
+    avaliacoes = []
+    for conjunto, d, (prm_p, prm_n) in zip(conjuntos, dados, curvas):
+        erros = np.abs(d)
+        n_aprovado = _menor_tamanho_aprovado(tamanhos, np.asarray(prm_p), np.asarray(prm_n), risco)
+        avaliacoes.append({
+            'nome': conjunto['nome'],
+            'arquivo': conjunto['arquivo'],
+            'pontos': len(d),
+            'perc_acima': float(np.count_nonzero(erros > cenario['erro_admissivel']) / len(d) * 100),
+            'rmse': float(np.sqrt(np.mean(erros ** 2))),
+            'n_aprovado': n_aprovado,
+            'aprovado': n_aprovado is not None,
+            'curva_precisao': prm_p,
+            'curva_norma': prm_n,
+        })
+
+    ordem = sorted(range(len(avaliacoes)), key=lambda i: (
+        not avaliacoes[i]['aprovado'], avaliacoes[i]['n_aprovado'] or 0,
+        float(np.mean(np.maximum(avaliacoes[i]['curva_precisao'], avaliacoes[i]['curva_norma'])))))
+    for posicao, i in enumerate(ordem):
+        avaliacoes[i]['posicao'] = posicao + 1
+
+    return {
+        'cenario': sintetico['cenario'],
+        'risco': risco,
+        'sintetico': sintetico,
+        'conjuntos': [avaliacoes[i] for i in ordem],
+        'tempo_processamento': time.time() - inicio,
+    }
+
+@medido('exportacao')
+def salvar_lote(lote: dict, pasta_saida, nome, lang='pt'):
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    if lang == 'en':
+        cabecalhos = ['Rank', 'Dataset', 'Points', '% above PEC', 'RMSE (m)',
+                      'Passes', f"Smallest n with PRM <= {lote['risco']:g}%"]
+        sim, nao = 'yes', 'no'
+    else:
+        cabecalhos = ['Posição', 'Conjunto', 'Pontos', '% acima do PEC', 'REQM (m)',
+                      'Aprovado', f"Menor n com PRM <= {lote['risco']:g}%"]
+        sim, nao = 'sim', 'não'
+
+    caminho_csv = os.path.join(pasta_saida, f"{nome}_lote.csv")
+    with open(caminho_csv, 'w', encoding='utf-8', newline='') as f:
+        f.write(",".join(cabecalhos) + "\n")
+        for c in lote['conjuntos']:
+            f.write(f"{c['posicao']},{c['nome']},{c['pontos']},{c['perc_acima']:.2f},"
+                    f"{c['rmse']:.4f},{sim if c['aprovado'] else nao},"
+                    f"{c['n_aprovado'] if c['aprovado'] else ''}\n")
+
+    caminho_json = os.path.join(pasta_saida, f"{nome}_lote.json")
+    with open(caminho_json, 'w', encoding='utf-8') as f:
+        json.dump(lote, f, ensure_ascii=False, indent=2)
+
+    return caminho_csv, caminho_json
@@ -0,0 +1,160 @@
+import numpy as np
+from numba import jit
+
+# Philox4x32-10 (Salmon et al., 2011): cada sorteio é função pura de
+# (chave, contador), sem estado por thread.
+_MASCARA_32 = np.uint64(0xFFFFFFFF)
+_DESLOCA_32 = np.uint64(32)
+_PHILOX_M0 = np.uint64(0xD2511F53)
+_PHILOX_M1 = np.uint64(0xCD9E8D57)
+_PHILOX_W0 = np.uint64(0x9E3779B9)
+_PHILOX_W1 = np.uint64(0xBB67AE85)
+
+DOMINIO_REAMOSTRAGEM = 0
+DOMINIO_BASE = 1
+
+
+@jit(nopython=True, cache=True, inline='always')
+def philox4x32(c0, c1, c2, c3, k0, k1):
+    c0 = np.uint64(c0) & _MASCARA_32
+    c1 = np.uint64(c1) & _MASCARA_32
+    c2 = np.uint64(c2) & _MASCARA_32
+    c3 = np.uint64(c3) & _MASCARA_32
+    k0 = np.uint64(k0) & _MASCARA_32
+    k1 = np.uint64(k1) & _MASCARA_32
+
+    for r in range(10):
+        p0 = _PHILOX_M0 * c0
+        p1 = _PHILOX_M1 * c2
+        novo0 = (p1 >> _DESLOCA_32) ^ c1 ^ k0
+        novo2 = (p0 >> _DESLOCA_32) ^ c3 ^ k1
+        c1 = p1 & _MASCARA_32
+        c3 = p0 & _MASCARA_32
+        c0 = novo0
+        c2 = novo2
+        k0 = (k0 + _PHILOX_W0) & _MASCARA_32
+        k1 = (k1 + _PHILOX_W1) & _MASCARA_32
+
+    return c0, c1, c2, c3
+
+def philox4x32_vetorizado(c0, c1, c2, c3, k0, k1):
+    # philox4x32 sobre arrays NumPy (com broadcasting entre os contadores):
+    # as mesmas palavras, elemento a elemento.
+    mascara = _MASCARA_32
+    c0, c1, c2, c3 = (np.asarray(c, dtype=np.uint64) & mascara for c in (c0, c1, c2, c3))
+    k0 = np.uint64(k0) & mascara
+    k1 = np.uint64(k1) & mascara
+
+    for r in range(10):
+        p0 = _PHILOX_M0 * c0
+        p1 = _PHILOX_M1 * c2
+        novo0 = (p1 >> _DESLOCA_32) ^ c1 ^ k0
+        novo2 = (p0 >> _DESLOCA_32) ^ c3 ^ k1
+        c1 = p1 & mascara
+        c3 = p0 & mascara
+        c0 = novo0
+        c2 = novo2
+        k0 = (k0 + _PHILOX_W0) & mascara
+        k1 = (k1 + _PHILOX_W1) & mascara
+
+    return c0, c1, c2, c3
+
+def indices_reamostragem_vetorizado(n, iteracoes, curva_id, semente, n_base):
+    # Índices com reposição de indice_reamostragem para várias iterações de
+    # uma vez: linha i = os n sorteios da iteração iteracoes[i].
+    blocos = np.arange((n + 3) >> 2, dtype=np.uint64)
+    iteracoes = np.asarray(iteracoes, dtype=np.uint64)[:, None]
+    palavras = philox4x32_vetorizado(blocos[None, :], iteracoes, curva_id,
+                                     DOMINIO_REAMOSTRAGEM, semente & 0xFFFFFFFF, semente >> 32)
+    palavras = np.stack(palavras, axis=-1).reshape(len(iteracoes), -1)[:, :n]
+    return ((palavras * np.uint64(n_base)) >> _DESLOCA_32).astype(np.int64)
+
+@jit(nopython=True, cache=True, inline='always')
+def indice_uniforme(palavra, limite):
+    # Multiplicação de Lemire: mapeia 32 bits em [0, limite) sem divisão.
+    return np.int64((palavra * np.uint64(limite)) >> _DESLOCA_32)
+
+@jit(nopython=True, cache=True, inline='always')
+def uniforme_53(palavra_a, palavra_b):
+    return ((palavra_a >> np.uint64(5)) * 67108864.0
+            + (palavra_b >> np.uint64(6))) / 9007199254740992.0
+
+@jit(nopython=True, cache=True, inline='always')
+def palavra_reamostragem(j, iteracao, curva_id, semente, palavras):
+    # palavras guarda o último bloco de 4 sorteios; j percorre 0, 1, 2, ...
+    resto = j & 3
+    if resto == 0:
+        p0, p1, p2, p3 = philox4x32(j >> 2, iteracao, curva_id, DOMINIO_REAMOSTRAGEM,
+                                    semente & 0xFFFFFFFF, semente >> 32)
+        palavras[0] = p0
+        palavras[1] = p1
+        palavras[2] = p2
+        palavras[3] = p3
+    return palavras[resto]
+
+@jit(nopython=True, cache=True, inline='always')
+def indice_reamostragem(j, iteracao, curva_id, semente, n_base, palavras):
+    return indice_uniforme(palavra_reamostragem(j, iteracao, curva_id, semente, palavras),
+                           n_base)
+
+@jit(nopython=True, cache=True)
+def criar_tabela_permutacao(n, reposicao):
+    # Tabela hash (endereçamento aberto, chave -1 = vazia) com as posições
+    # já trocadas da permutação virtual de indice_sem_reposicao: memória
+    # O(n), independente do tamanho da base. Com reposição não é usada.
+    capacidade = 1
+    while not reposicao and capacidade < 2 * n:
+        capacidade *= 2
+    chaves = np.full(capacidade, -1, dtype=np.int64)
+    valores = np.empty(capacidade, dtype=np.int64)
+    return chaves, valores
+
+@jit(nopython=True, cache=True, inline='always')
+def _posicao_tabela(chaves, chave):
+    mascara = len(chaves) - 1
+    posicao = (chave * 0x9E3779B1) & mascara
+    while chaves[posicao] != -1 and chaves[posicao] != chave:
+        posicao = (posicao + 1) & mascara
+    return posicao
+
+@jit(nopython=True, cache=True, inline='always')
+def indice_sem_reposicao(j, palavra, n_base, chaves, valores):
+    # Passo j do Fisher–Yates parcial: troca as posições j e r (r uniforme
+    # em [j, n_base)) e devolve o valor que vai para a posição j. Os n
+    # primeiros índices formam uma amostra sem reposição de tamanho n, e
+    # qualquer prefixo também (o que a engine aninhada exige). As chaves
+    # devem ser reiniciadas (-1) a cada amostra.
+    r = j + indice_uniforme(palavra, n_base - j)
+    posicao = _posicao_tabela(chaves, r)
+    indice = valores[posicao] if chaves[posicao] == r else r
+    if r != j:
+        posicao_j = _posicao_tabela(chaves, j)
+        valor_j = valores[posicao_j] if chaves[posicao_j] == j else j
+        chaves[posicao] = r
+        valores[posicao] = valor_j
+    return indice
+
+@jit(nopython=True, cache=True, inline='always')
+def indice_amostra(j, iteracao, curva_id, semente, n_base, palavras, reposicao,
+                   chaves, valores):
+    palavra = palavra_reamostragem(j, iteracao, curva_id, semente, palavras)
+    if reposicao:
+        return indice_uniforme(palavra, n_base)
+    return indice_sem_reposicao(j, palavra, n_base, chaves, valores)
+
+@jit(nopython=True, cache=True, inline='always')
+def sortear_palavras(n, iteracao, curva_id, semente, palavras):
+    # Os n primeiros sorteios de indice_reamostragem para a iteração, ainda
+    # sem o mapeamento no tamanho da base: uma única sequência serve a
+    # bases de tamanhos diferentes (números aleatórios comuns).
+    for bloco in range((n + 3) >> 2):
+        p0, p1, p2, p3 = philox4x32(bloco, iteracao, curva_id, DOMINIO_REAMOSTRAGEM,
+                                    semente & 0xFFFFFFFF, semente >> 32)
+        j = bloco << 2
+        palavras[j] = p0
+        if j + 1 < n:
+            palavras[j + 1] = p1
+        if j + 2 < n:
+            palavras[j + 2] = p2
+        if j + 3 < n:
+            palavras[j + 3] = p3
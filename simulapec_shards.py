@@ -0,0 +1,291 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import multiprocessing
+
+import numpy as np
+
+from simulapec_engine import (
+    PARAMETROS_CENARIO,
+    PARAMETROS_OPCIONAIS,
+    _formatar_tempo,
+    argumentos_grade,
+    carregar_cenarios,
+    carregar_dados_reais_txt,
+    contar_rejeicoes_grade,
+    gerar_percentuais,
+    gerar_tamanhos_amostra,
+    montar_resultado,
+    normalizar_cenario,
+    normalizar_dados_reais,
+    planejar_simulacao,
+    salvar_resultado,
+)
+
+# Um shard é um arquivo JSON autocontido: cenário, subconjunto de curvas,
+# faixa de tamanhos e faixa de iterações. Como cada sorteio é função pura de
+# (semente, curva, iteração, posição), somar os contadores dos shards
+# reproduz exatamente a execução em um único processo.
+VERSAO_SHARD = 1
+
+
+def _dividir_faixas(itens, partes, pesos=None):
+    pesos = np.ones(len(itens)) if pesos is None else np.asarray(pesos, dtype=np.float64)
+    partes = max(1, min(int(partes), len(itens)))
+    acumulado = np.cumsum(pesos) / pesos.sum()
+    cortes = np.searchsorted(acumulado, np.arange(1, partes) / partes, side='left') + 1
+    cortes = np.unique(np.clip(cortes, 1, len(itens) - 1)) if len(itens) > 1 else []
+    return [list(faixa) for faixa in np.split(np.asarray(itens), cortes) if len(faixa)]
+
+def dividir_cenario(cenario: dict, dados_reais=None, niveis_por_shard=None,
+                    faixas_tamanho=1, blocos_iteracao=1) -> list:
+    cenario = normalizar_cenario(cenario)
+    if cenario['engine'] == 'exact':
+        raise ValueError("A engine 'exact' não usa Monte Carlo e não precisa de shards.")
+    if cenario['tolerancia'] is not None:
+        raise ValueError("O modo adaptativo (tolerância) não pode ser dividido em shards.")
+    if (cenario['grade'] or {}).get('refinar'):
+        raise ValueError("O refinamento automático da grade não pode ser dividido em shards.")
+    if cenario['engine'] == 'batch':
+        cenario['engine'] = 'fused'
+
+    tamanhos = gerar_tamanhos_amostra(cenario['N'], cenario['grade'])
+    if not tamanhos:
+        raise ValueError("Número de PCs insuficiente para formar amostras.")
+    percentuais = gerar_percentuais(cenario['perc_base'], cenario['intervalo_acima'],
+                                    cenario['intervalo_abaixo'])
+    curvas = list(range(len(percentuais) + (dados_reais is not None)))
+    grupos = [curvas[i:i + (niveis_por_shard or len(curvas))]
+              for i in range(0, len(curvas), niveis_por_shard or len(curvas))]
+
+    # O custo do kernel fundido cresce com n: as faixas equilibram soma(n).
+    faixas = _dividir_faixas(tamanhos, faixas_tamanho, pesos=tamanhos)
+    limites = np.linspace(0, cenario['n_iter'], max(1, min(int(blocos_iteracao),
+                                                         cenario['n_iter'])) + 1)
+    limites = np.unique(np.rint(limites).astype(np.int64)).tolist()
+
+    dados = None if dados_reais is None else np.asarray(dados_reais, dtype=np.float64).tolist()
+    chaves = PARAMETROS_CENARIO + PARAMETROS_OPCIONAIS
+    shards = []
+    for grupo in grupos:
+        for faixa in faixas:
+            for inicio, fim in zip(limites[:-1], limites[1:]):
+                real = len(percentuais) in grupo
+                shards.append({
+                    'versao': VERSAO_SHARD,
+                    'nome': cenario.get('nome'),
+                    'cenario': {k: cenario[k] for k in chaves},
+                    'curvas': grupo,
+                    'dados_reais': dados if real else None,
+                    'tamanhos': [int(n) for n in faixa],
+                    'iter_inicio': inicio,
+                    'iter_fim': fim,
+                })
+
+    for i, shard in enumerate(shards):
+        shard['indice'] = i
+        shard['total'] = len(shards)
+    return shards
+
+def executar_shard(shard: dict) -> dict:
+    if shard.get('versao') != VERSAO_SHARD:
+        raise ValueError(f"Versão de shard incompatível: {shard.get('versao')}")
+
+    inicio = time.time()
+    cenario = normalizar_cenario(shard['cenario'])
+    plano = planejar_simulacao(cenario)
+    n_niveis = len(plano['percentuais'])
+    niveis = [c for c in shard['curvas'] if c < n_niveis]
+    base_real = None
+    if shard['dados_reais'] is not None:
+        base_real = normalizar_dados_reais(shard['dados_reais'], cenario)
+
+    plano_shard = dict(
+        plano,
+        percentuais=[plano['percentuais'][c] for c in niveis],
+        fatores_escala=[plano['fatores_escala'][c] for c in niveis],
+        tamanhos_amostra=shard['tamanhos'])
+    bases, limites, argumentos = argumentos_grade(cenario, plano_shard, base_real)
+    contagens = contar_rejeicoes_grade(
+        bases, shard['tamanhos'], shard['iter_fim'] - shard['iter_inicio'], 1.0,
+        limites, iter_inicio=shard['iter_inicio'], **argumentos)
+
+    return {
+        'versao': VERSAO_SHARD,
+        'nome': shard.get('nome'),
+        'cenario': shard['cenario'],
+        'indice': shard['indice'],
+        'total': shard['total'],
+        'curvas': niveis + ([n_niveis] if base_real is not None else []),
+        'tamanhos': shard['tamanhos'],
+        'iteracoes': shard['iter_fim'] - shard['iter_inicio'],
+        'rejeicoes_precisao': contagens[:, :, 0].tolist(),
+        'rejeicoes_norma': contagens[:, :, 1].tolist(),
+        'tempo_processamento': time.time() - inicio,
+    }
+
+def combinar_shards(parciais: list) -> dict:
+    if not parciais:
+        raise ValueError("Nenhum resultado parcial informado.")
+
+    cenario = normalizar_cenario(parciais[0]['cenario'])
+    total = parciais[0]['total']
+    indices = sorted(p['indice'] for p in parciais)
+    if any(p['cenario'] != parciais[0]['cenario'] or p['total'] != total for p in parciais):
+        raise ValueError("Os resultados parciais pertencem a cenários diferentes.")
+    if indices != list(range(total)):
+        faltando = sorted(set(range(total)) - set(indices))
+        raise ValueError(f"Shards ausentes ou repetidos (faltando: {faltando}).")
+
+    percentuais = gerar_percentuais(cenario['perc_base'], cenario['intervalo_acima'],
+                                    cenario['intervalo_abaixo'])
+    tamanhos = gerar_tamanhos_amostra(cenario['N'], cenario['grade'])
+    posicao = {n: j for j, n in enumerate(tamanhos)}
+    n_curvas = len(percentuais) + any(len(percentuais) in p['curvas'] for p in parciais)
+
+    contagens = np.zeros((n_curvas, len(tamanhos), 3), dtype=np.int64)
+    for parcial in parciais:
+        colunas = [posicao[n] for n in parcial['tamanhos']]
+        for linha, c in enumerate(parcial['curvas']):
+            contagens[c, colunas, 0] += parcial['rejeicoes_precisao'][linha]
+            contagens[c, colunas, 1] += parcial['rejeicoes_norma'][linha]
+            contagens[c, colunas, 2] += parcial['iteracoes']
+
+    if np.any(contagens[:, :, 2] != cenario['n_iter']):
+        raise ValueError("Os shards não cobrem todas as iterações de todas as células.")
+
+    prm = contagens[:, :, :2] / cenario['n_iter'] * 100
+    iteracoes = [cenario['n_iter']] * len(tamanhos)
+    registros = [{'precisao': prm[c, :, 0].tolist(), 'norma': prm[c, :, 1].tolist(),
+                  'iteracoes': iteracoes} for c in range(n_curvas)]
+    registro_R = registros.pop() if n_curvas > len(percentuais) else None
+
+    plano = {'percentuais': percentuais, 'tamanhos_amostra': tamanhos}
+    return montar_resultado(cenario, plano, registros, registro_R, {
+        'tempo_processamento': sum(p['tempo_processamento'] for p in parciais),
+        'shards': total,
+    })
+
+def _iniciar_processo(threads):
+    import numba
+    numba.set_num_threads(threads)
+
+def executar_shards_local(shards: list, processos=None) -> list:
+    processos = max(1, min(processos or multiprocessing.cpu_count(), len(shards)))
+    threads = max(1, multiprocessing.cpu_count() // processos)
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(processos, initializer=_iniciar_processo, initargs=(threads,)) as pool:
+        return pool.map(executar_shard, shards, chunksize=1)
+
+def salvar_json(conteudo, caminho):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f)
+    return caminho
+
+def carregar_json(caminho):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _expandir(caminhos):
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            arquivos.extend(sorted(glob.glob(os.path.join(caminho, '*.json'))))
+        else:
+            arquivos.append(caminho)
+    return arquivos
+
+def _dividir_arquivo(caminho, args):
+    for cenario in carregar_cenarios(caminho):
+        dados_reais = None
+        if cenario.get('dados_reais'):
+            dados_reais = carregar_dados_reais_txt(cenario['dados_reais'],
+                                                   **cenario.get('leitura', {}))
+        yield cenario['nome'], dividir_cenario(
+            cenario, dados_reais, args.niveis, args.faixas, args.blocos)
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        prog='simulapec-shards',
+        description='Divide cenários do SimulaPEC em shards executáveis em outros '
+                    'processos ou máquinas e combina os resultados parciais.')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    def opcoes_divisao(p):
+        p.add_argument('cenario', help='Arquivo de cenário (.json ou .toml).')
+        p.add_argument('--niveis', type=int, default=None,
+                       help='Curvas (níveis de rejeição) por shard (padrão: todas).')
+        p.add_argument('--faixas', type=int, default=1,
+                       help='Número de faixas de tamanho de amostra.')
+        p.add_argument('--blocos', type=int, default=1,
+                       help='Número de blocos de iterações.')
+
+    p = sub.add_parser('dividir', help='Grava os shards de um cenário em arquivos.')
+    opcoes_divisao(p)
+    p.add_argument('-o', '--saida', default='shards', help='Pasta dos shards.')
+
+    p = sub.add_parser('executar', help='Executa shards e grava os resultados parciais.')
+    p.add_argument('shards', nargs='+', help='Arquivos ou pastas de shards.')
+    p.add_argument('-o', '--saida', default='parciais', help='Pasta dos resultados parciais.')
+
+    p = sub.add_parser('combinar', help='Soma resultados parciais e grava o resultado final.')
+    p.add_argument('parciais', nargs='+', help='Arquivos ou pastas de resultados parciais.')
+    p.add_argument('-o', '--saida', default='resultados', help='Pasta do resultado.')
+    p.add_argument('--nome', default=None, help='Nome dos arquivos de saída.')
+    p.add_argument('--lang', choices=('pt', 'en'), default='pt')
+
+    p = sub.add_parser('local', help='Divide e executa em um pool de processos locais.')
+    opcoes_divisao(p)
+    p.add_argument('-o', '--saida', default='resultados', help='Pasta do resultado.')
+    p.add_argument('--processos', type=int, default=None,
+                   help='Número de processos (padrão: um por núcleo).')
+    p.add_argument('--lang', choices=('pt', 'en'), default='pt')
+    return parser
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+    inicio = time.time()
+
+    try:
+        if args.comando == 'dividir':
+            os.makedirs(args.saida, exist_ok=True)
+            for nome, shards in _dividir_arquivo(args.cenario, args):
+                for shard in shards:
+                    salvar_json(shard, os.path.join(
+                        args.saida, f"{nome}_shard_{shard['indice']:04d}.json"))
+                print(f"[{nome}] {len(shards)} shards -> {args.saida}")
+
+        elif args.comando == 'executar':
+            os.makedirs(args.saida, exist_ok=True)
+            for caminho in _expandir(args.shards):
+                parcial = executar_shard(carregar_json(caminho))
+                destino = os.path.join(args.saida, os.path.basename(caminho).replace(
+                    '_shard_', '_parcial_'))
+                salvar_json(parcial, destino)
+                print(f"{caminho}: {_formatar_tempo(parcial['tempo_processamento'])} -> {destino}")
+
+        elif args.comando == 'combinar':
+            parciais = [carregar_json(c) for c in _expandir(args.parciais)]
+            resultado = combinar_shards(parciais)
+            nome = args.nome or parciais[0].get('nome') or 'resultado'
+            caminhos = salvar_resultado(resultado, args.saida, nome, lang=args.lang)
+            print(f"[{nome}] {len(parciais)} shards -> {', '.join(caminhos)}")
+
+        else:
+            for nome, shards in _dividir_arquivo(args.cenario, args):
+                resultado = combinar_shards(executar_shards_local(shards, args.processos))
+                caminhos = salvar_resultado(resultado, args.saida, nome, lang=args.lang)
+                print(f"[{nome}] {len(shards)} shards -> {', '.join(caminhos)}")
+    except (ValueError, OSError, KeyError) as exc:
+        print(f"erro: {exc}", file=sys.stderr)
+        return 1
+
+    print(f"Tempo total: {_formatar_tempo(time.time() - inicio)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import json
+import os
+import time
+
+from simulapec_engine import (
+    escolher_batch_size,
+    fatores_escala,
+    gerar_erros_normais,
+    id_curva_cenario,
+    intervalo_wilson,
+    normalizar_cenario,
+    normalizar_dados_reais,
+    simular_percentual_rejeicao_escalar,
+)
+from simulapec_instrumentacao import medido, medir
+
+SENTIDOS = ('abaixo', 'acima')
+TESTES_CRITERIO = ('precisao', 'norma', 'ambos')
+# Primeira rodada de iterações em cada tamanho; dobra até a decisão ficar
+# estatisticamente clara ou até o n_iter do cenário.
+ITERACOES_INICIAIS = 200
+
+
+def _situacao(rejeicoes, iteracoes, risco, sentido, confianca):
+    # +1: o critério é atendido com a confiança pedida; -1: é violado; 0:
+    # o intervalo de Wilson ainda contém o risco.
+    inferior, superior = intervalo_wilson(rejeicoes, iteracoes, confianca)
+    if sentido == 'abaixo':
+        return 1 if superior <= risco else -1 if inferior > risco else 0
+    return 1 if inferior >= risco else -1 if superior < risco else 0
+
+def _atende(prm, risco, sentido):
+    return prm <= risco if sentido == 'abaixo' else prm >= risco
+
+class _Avaliador:
+    # Simula um tamanho de amostra com iterações crescentes, retomando as já
+    # feitas (os sorteios dependem só do índice da iteração), até decidir
+    # de que lado do risco está o PRM de cada teste.
+    def __init__(self, base, limite, escala, curva_id, cenario, risco, sentido, testes,
+                 iteracoes_max, cancel_callback):
+        self.base = base
+        self.limite = limite
+        self.escala = escala
+        self.curva_id = curva_id
+        self.cenario = cenario
+        self.risco = risco
+        self.sentido = sentido
+        self.testes = testes
+        self.iteracoes_max = iteracoes_max
+        self.cancel_callback = cancel_callback
+        self.batch_size = escolher_batch_size(len(base))
+        self.avaliacoes = {}
+
+    def __call__(self, n):
+        if n in self.avaliacoes:
+            return self.avaliacoes[n]['atende']
+        estado = {}
+
+        def registrar(tamanho, rejeicoes_p, rejeicoes_n, feitas, concluida):
+            estado[tamanho] = {'iteracoes': feitas, 'rejeicoes_precisao': rejeicoes_p,
+                               'rejeicoes_norma': rejeicoes_n, 'concluida': False}
+
+        iteracoes = min(ITERACOES_INICIAIS, self.iteracoes_max)
+        while True:
+            simular_percentual_rejeicao_escalar(
+                self.base, [n], iteracoes, 1.0, self.limite, batch_size=self.batch_size,
+                reposicao=self.cenario['reposicao'], backend=self.cenario['backend'],
+                cancel_callback=self.cancel_callback,
+                semente=self.cenario['semente'], curva_id=self.curva_id, escala=self.escala,
+                estado_inicial=estado, registrar_celula=registrar)
+            rejeicoes = {teste: int(estado[n][f"rejeicoes_{teste}"])
+                         for teste in ('precisao', 'norma')}
+            situacoes = [_situacao(rejeicoes[teste], iteracoes, self.risco, self.sentido,
+                                   self.cenario['confianca']) for teste in self.testes]
+            decisao = -1 if -1 in situacoes else 1 if all(s == 1 for s in situacoes) else 0
+            if decisao != 0 or iteracoes >= self.iteracoes_max:
+                break
+            iteracoes = min(2 * iteracoes, self.iteracoes_max)
+
+        prm = {teste: rejeicoes[teste] / iteracoes * 100 for teste in rejeicoes}
+        if decisao == 0:
+            # Sem significância no limite de iterações: decide pela estimativa.
+            atende = all(_atende(prm[teste], self.risco, self.sentido) for teste in self.testes)
+        else:
+            atende = decisao == 1
+        avaliacao = {'tamanho': int(n), 'iteracoes': iteracoes, 'atende': atende,
+                     'decidido': decisao != 0}
+        for teste in ('precisao', 'norma'):
+            inferior, superior = intervalo_wilson(rejeicoes[teste], iteracoes,
+                                                  self.cenario['confianca'])
+            avaliacao[f"prm_{teste}"] = prm[teste]
+            avaliacao[f"ic_{teste}"] = (round(float(inferior), 4), round(float(superior), 4))
+        self.avaliacoes[n] = avaliacao
+        return atende
+
+def _busca(candidatos, atende):
+    # Menor candidato que atende, supondo o critério monótono em n: testa os
+    # extremos, cerca a fronteira dobrando o passo a partir do menor tamanho
+    # (amostras pequenas custam menos) e termina por bisseção.
+    ultimo = len(candidatos) - 1
+    if not atende(candidatos[ultimo]):
+        return None
+    if atende(candidatos[0]):
+        return candidatos[0]
+    falha, passo = 0, 1
+    while falha + passo < ultimo:
+        if atende(candidatos[falha + passo]):
+            break
+        falha += passo
+        passo *= 2
+    sucesso = min(falha + passo, ultimo)
+    while sucesso - falha > 1:
+        meio = (falha + sucesso) // 2
+        if atende(candidatos[meio]):
+            sucesso = meio
+        else:
+            falha = meio
+    return candidatos[sucesso]
+
+def _afirmacao(resultado, passo):
+    n = resultado['tamanho_minimo']
+    simbolo = '<=' if resultado['sentido'] == 'abaixo' else '>='
+    contrario = '>' if resultado['sentido'] == 'abaixo' else '<'
+    risco = resultado['risco']
+    if n is None:
+        return (f"Nenhum tamanho até {resultado['limites'][1]} tem PRM {simbolo} {risco:g}%.")
+    texto = f"n mínimo = {n}: PRM {simbolo} {risco:g}% em n = {n}"
+    if n - passo >= resultado['limites'][0]:
+        texto += f" e PRM {contrario} {risco:g}% em n = {n - passo}"
+    texto += (f", com confiança conjunta de pelo menos {resultado['confianca_conjunta']:.1%} "
+              f"(Bonferroni sobre {len(resultado['avaliacoes'])} tamanhos simulados, "
+              f"{resultado['confianca']:.0%} cada)")
+    if not resultado['decidido']:
+        texto += "; decisão na fronteira sem significância no limite de iterações"
+    return texto + "."
+
+@medido('python')
+def tamanho_minimo(cenario: dict, risco, dados_reais=None, nivel=None, sentido='abaixo',
+                   teste='ambos', limites=None, passo=1, cancel_callback=None) -> dict:
+    # Menor tamanho de amostra cujo PRM fica abaixo (ou acima) do risco, sem
+    # simular a grade inteira. A curva é a dos dados reais, se houver, ou a
+    # do nível de rejeição `nivel` (padrão: perc_base), com os mesmos
+    # sorteios de executar_simulacao.
+    cenario = normalizar_cenario(cenario)
+    risco = float(risco)
+    if not 0 < risco < 100:
+        raise ValueError("O risco deve estar entre 0 e 100%.")
+    if teste not in TESTES_CRITERIO:
+        raise ValueError(f"Teste desconhecido: {teste} (opções: {', '.join(TESTES_CRITERIO)})")
+    N = cenario['N']
+    base_real = normalizar_dados_reais(dados_reais, cenario)
+    nivel = cenario['perc_base'] if nivel is None else float(nivel)
+    if sentido not in SENTIDOS:
+        raise ValueError(f"Sentido desconhecido: {sentido} (opções: {', '.join(SENTIDOS)})")
+
+    if base_real is not None:
+        base, limite, escala = base_real, cenario['perc_base'], 1.0
+        curva_id = id_curva_cenario(cenario)
+    else:
+        with medir('gerar_erros_normais', 'base', N=N):
+            base = gerar_erros_normais(N, cenario['semente'])
+        limite, escala = nivel, float(fatores_escala(base, 1.0, [nivel])[0])
+        curva_id = id_curva_cenario(cenario, nivel)
+
+    passo = int(passo)
+    menor, maior = limites or (5, int(len(base) * 0.6))
+    menor, maior = max(int(menor), 2), min(int(maior), len(base))
+    if passo < 1 or maior < menor:
+        raise ValueError("Limites ou passo de tamanho de amostra inválidos.")
+
+    inicio = time.time()
+    testes = ('precisao', 'norma') if teste == 'ambos' else (teste,)
+    avaliar = _Avaliador(base, limite, escala, curva_id, cenario, risco, sentido, testes,
+                         cenario['n_iter'], cancel_callback)
+    n = _busca(list(range(menor, maior + 1, passo)), avaliar)
+
+    avaliacoes = sorted(avaliar.avaliacoes.values(), key=lambda a: a['tamanho'])
+    fronteira = [a for a in avaliacoes if n is not None and a['tamanho'] in (n, n - passo)]
+    resultado = {
+        'cenario': cenario,
+        'risco': risco,
+        'sentido': sentido,
+        'teste': teste,
+        'nivel': None if base_real is not None else nivel,
+        'dados_reais': base_real is not None,
+        'limites': (menor, maior),
+        'passo': passo,
+        'confianca': cenario['confianca'],
+        'tamanho_minimo': n,
+        'confianca_conjunta': max(0.0, 1 - len(avaliacoes) * (1 - cenario['confianca'])),
+        'decidido': all(a['decidido'] for a in fronteira or avaliacoes[-1:]),
+        'avaliacoes': avaliacoes,
+        'iteracoes_total': int(sum(a['iteracoes'] for a in avaliacoes)),
+        'tempo_processamento': time.time() - inicio,
+    }
+    resultado['afirmacao'] = _afirmacao(resultado, passo)
+    return resultado
+
+@medido('exportacao')
+def salvar_tamanho_minimo(resultado: dict, pasta_saida, nome, lang='pt'):
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    if lang == 'en':
+        cabecalhos = ['Sample size', 'Iterations', 'PRM Precision (%)', 'PRM Standard (%)',
+                      'Meets criterion', 'Significant']
+        sim, nao = 'yes', 'no'
+    else:
+        cabecalhos = ['Tamanho da amostra', 'Iterações', 'PRM Precisão (%)', 'PRM Norma (%)',
+                      'Atende', 'Significativo']
+        sim, nao = 'sim', 'não'
+
+    caminho_csv = os.path.join(pasta_saida, f"{nome}_tamanho_minimo.csv")
+    with open(caminho_csv, 'w', encoding='utf-8', newline='') as f:
+        f.write(",".join(cabecalhos) + "\n")
+        for a in resultado['avaliacoes']:
+            f.write(f"{a['tamanho']},{a['iteracoes']},{a['prm_precisao']:.2f},"
+                    f"{a['prm_norma']:.2f},{sim if a['atende'] else nao},"
+                    f"{sim if a['decidido'] else nao}\n")
+
+    caminho_json = os.path.join(pasta_saida, f"{nome}_tamanho_minimo.json")
+    with open(caminho_json, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    return caminho_csv, caminho_json
@@ -0,0 +1,189 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Threads do Numba disponíveis para a comparação entre números de threads:
+# precisa ser definido antes de importar o Numba. Mesmo numa máquina com
+# poucos núcleos, mais threads que núcleos exercitam outras divisões do
+# trabalho.
+os.environ.setdefault('NUMBA_NUM_THREADS', str(max(4, os.cpu_count() or 1)))
+
+import numba
+import numpy as np
+from scipy.stats import chi2
+
+from simulapec_backends import simular_lote
+from simulapec_cache import CheckpointSimulacao
+from simulapec_engine import (
+    _formatar_tempo,
+    _identidade_curva,
+    argumentos_grade,
+    contar_rejeicoes_grade,
+    executar_simulacao,
+    gerar_erros_normais,
+    id_curva,
+    normalizar_cenario,
+    normalizar_dados_reais,
+    planejar_simulacao,
+)
+from simulapec_shards import combinar_shards, dividir_cenario, executar_shard
+
+# Cenários pequenos, mas com todas as variantes que mudam os sorteios:
+# com e sem reposição, dados reais e números aleatórios comuns.
+CENARIO_VERIFICACAO = {'N': 120, 'erro_admissivel': 1.0, 'perc_base': 10.0,
+                       'intervalo_acima': 10.0, 'intervalo_abaixo': 5.0,
+                       'n_iter': 301, 'semente': 20240422}
+VARIANTES = (
+    {},
+    {'reposicao': False},
+    {'numeros_comuns': True},
+)
+# Iteração em que o checkpoint é interrompido: fora de qualquer fronteira
+# de lote (lotes padrão de 50 a 200 iterações, e lotes do ajuste).
+ITERACAO_INTERRUPCAO = 137
+# Divisão em shards: grupos de níveis, faixas de tamanhos e blocos de
+# iterações com tamanhos desiguais.
+DIVISAO_SHARDS = {'niveis_por_shard': 2, 'faixas_tamanho': 3, 'blocos_iteracao': 4}
+BACKENDS_VERIFICACAO = ('paralelo', 'serial', 'numpy', 'processos')
+
+
+def _curvas(resultado):
+    return (resultado['curvas_precisao'], resultado['curvas_norma'],
+            resultado['curva_precisao_R'], resultado['curva_norma_R'])
+
+def _comparar(falhas, descricao, referencia, obtido):
+    if _curvas(referencia) != _curvas(obtido):
+        falhas.append(descricao)
+
+def _simular(cenario, dados_reais, **opcoes):
+    return executar_simulacao(normalizar_cenario(dict(cenario, **opcoes)), dados_reais)
+
+def verificar_engines(cenario, dados_reais, falhas):
+    # batch, fused e nested sorteiam as mesmas amostras.
+    referencia = _simular(cenario, dados_reais, engine='fused')
+    for engine in ('nested', 'batch'):
+        _comparar(falhas, f"engine {engine} difere de fused",
+                  referencia, _simular(cenario, dados_reais, engine=engine))
+    return referencia
+
+def verificar_threads(cenario, dados_reais, referencia, falhas, threads):
+    original = numba.get_num_threads()
+    try:
+        for n_threads in threads:
+            numba.set_num_threads(n_threads)
+            for engine in ('fused', 'nested', 'batch'):
+                _comparar(falhas, f"engine {engine} com {n_threads} threads",
+                          referencia, _simular(cenario, dados_reais, engine=engine,
+                                               backend='paralelo'))
+    finally:
+        numba.set_num_threads(original)
+
+def verificar_backends(cenario, dados_reais, referencia, falhas):
+    normalizado = normalizar_cenario(cenario)
+    backends = [b for b in BACKENDS_VERIFICACAO
+                if normalizado['reposicao'] or b != 'numpy']
+    for backend in backends:
+        _comparar(falhas, f"engine batch com backend {backend}", referencia,
+                  _simular(cenario, dados_reais, engine='batch', backend=backend))
+
+    # Lote isolado que começa numa iteração qualquer: as contagens dependem
+    # só do índice de cada iteração, não do backend.
+    plano = planejar_simulacao(normalizado)
+    base = plano['erros_base']
+    n = plano['tamanhos_amostra'][len(plano['tamanhos_amostra']) // 2]
+    argumentos = (n, 97, 1 / 1.6449, 1.0, plano['percentuais'][0],
+                  chi2.ppf(1 - plano['percentuais'][0] / 100, df=n - 1),
+                  normalizado['reposicao'], normalizado['semente'],
+                  id_curva(plano['percentuais'][0]), ITERACAO_INTERRUPCAO,
+                  plano['fatores_escala'][0])
+    contagens = {backend: simular_lote(backend, base, *argumentos) for backend in backends}
+    if len(set(contagens.values())) != 1:
+        falhas.append(f"lote isolado difere entre backends: {contagens}")
+
+def verificar_shards(cenario, dados_reais, referencia, falhas):
+    shards = dividir_cenario(cenario, dados_reais, **DIVISAO_SHARDS)
+    _comparar(falhas, f"combinação de {len(shards)} shards", referencia,
+              combinar_shards([executar_shard(shard) for shard in shards]))
+
+def _checkpoint_interrompido(pasta, cenario, dados_reais):
+    # Grava o checkpoint que uma execução interrompida após
+    # ITERACAO_INTERRUPCAO iterações deixaria: todas as células parciais.
+    normalizado = normalizar_cenario(cenario)
+    plano = planejar_simulacao(normalizado)
+    base_real = normalizar_dados_reais(dados_reais, normalizado)
+    identidades = [_identidade_curva(normalizado, plano, perc) for perc in plano['percentuais']]
+    if base_real is not None:
+        identidades.append(_identidade_curva(normalizado, plano, normalizado['perc_base'],
+                                             base_real))
+    bases, limites, argumentos = argumentos_grade(normalizado, plano, base_real)
+    contagens = contar_rejeicoes_grade(bases, plano['tamanhos_amostra'],
+                                       ITERACAO_INTERRUPCAO, 1.0, limites, **argumentos)
+
+    checkpoint = CheckpointSimulacao(pasta)
+    checkpoint.abrir(identidades)
+    for identidade, linha in zip(identidades, contagens):
+        for n, (rejeicoes_p, rejeicoes_n) in zip(plano['tamanhos_amostra'], linha):
+            checkpoint.registrar(identidade, n, rejeicoes_p, rejeicoes_n,
+                                 ITERACAO_INTERRUPCAO, False)
+    checkpoint.salvar()
+
+def verificar_checkpoint(cenario, dados_reais, referencia, falhas):
+    for engine in ('batch', 'fused', 'nested'):
+        with tempfile.TemporaryDirectory() as pasta:
+            cenario_engine = dict(cenario, engine=engine)
+            _checkpoint_interrompido(pasta, cenario_engine, dados_reais)
+            checkpoint = CheckpointSimulacao(pasta)
+            resultado = executar_simulacao(normalizar_cenario(cenario_engine), dados_reais,
+                                           checkpoint=checkpoint)
+            if not resultado['checkpoint']['retomado']:
+                falhas.append(f"engine {engine}: checkpoint não foi retomado")
+            _comparar(falhas, f"engine {engine} retomada na iteração {ITERACAO_INTERRUPCAO}",
+                      referencia, resultado)
+
+def verificar(threads=None, progresso=None) -> list:
+    # Retorna a lista de igualdades violadas (vazia se tudo confere).
+    threads = threads or sorted({1, 2, numba.config.NUMBA_NUM_THREADS})
+    dados_reais = gerar_erros_normais(90, semente=7) * 0.7
+    falhas = []
+    for variante in VARIANTES:
+        cenario = dict(CENARIO_VERIFICACAO, **variante)
+        nome = ', '.join(f"{k}={v}" for k, v in variante.items()) or 'padrão'
+        antes = len(falhas)
+        referencia = verificar_engines(cenario, dados_reais, falhas)
+        verificar_threads(cenario, dados_reais, referencia, falhas, threads)
+        verificar_backends(cenario, dados_reais, referencia, falhas)
+        verificar_shards(cenario, dados_reais, referencia, falhas)
+        verificar_checkpoint(cenario, dados_reais, referencia, falhas)
+        falhas[antes:] = [f"[{nome}] {falha}" for falha in falhas[antes:]]
+        if progresso:
+            progresso(nome, falhas[antes:])
+    return falhas
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        prog='simulapec-verificacao',
+        description='Confere que os resultados são idênticos entre engines, números de '
+                    'threads, backends, shards combinados e execuções retomadas de um '
+                    'checkpoint.')
+    parser.add_argument('--threads', type=int, nargs='+', default=None,
+                        help='Números de threads do Numba comparados '
+                             '(padrão: 1, 2 e NUMBA_NUM_THREADS).')
+    return parser
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+    inicio = time.time()
+
+    def progresso(nome, falhas):
+        print(f"{nome}: {'OK' if not falhas else f'{len(falhas)} diferenças'}", flush=True)
+        for falha in falhas:
+            print(f"  {falha}")
+
+    falhas = verificar(args.threads, progresso)
+    print(f"Tempo total: {_formatar_tempo(time.time() - inicio)}")
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())